@@ -5,8 +5,8 @@
 
 
 import pandas as pd
-import os
 import matplotlib.pyplot as plt
+from storage import matching_columns, read_dataset, system_dataset_files
 
 # Define the preprocessed log directory
 preprocessed_dir = 'dataset/system-logs/multiple-system-log-dataset/preprocessed-data'
@@ -14,14 +14,11 @@ preprocessed_dir = 'dataset/system-logs/multiple-system-log-dataset/preprocessed
 # Create a dictionary to store dataframes for each system
 system_dfs = {}
 
-# Load the preprocessed log files
-for filename in os.listdir(preprocessed_dir):
-    if filename.endswith('.csv'):
-        filepath = os.path.join(preprocessed_dir, filename)
-        df = pd.read_csv(filepath)
-        df.columns = df.columns.str.lower()
-        system_name = os.path.splitext(filename)[0].replace("_preprocessed", "")
-        system_dfs[system_name] = df
+# Load the preprocessed log files (only the flag columns are used below, whatever the case of their headers)
+for system_name, filepath in system_dataset_files(preprocessed_dir, 'preprocessed').items():
+    df = read_dataset(filepath, columns=matching_columns(filepath, ['error', 'warning']))
+    df.columns = df.columns.str.lower()
+    system_dfs[system_name] = df
 
 # Data exploration to determine appropriate thresholds
 error_describe = pd.DataFrame({name: df['error'].describe() for name, df in system_dfs.items()})
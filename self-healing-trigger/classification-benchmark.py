@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import argparse
+import gc
+import time
+import tracemalloc
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
+from sparse_training import (DEFAULT_RANDOM_STATE, DEFAULT_TEST_SIZE, normalize_tokens, numeric_matrix,
+                             sparse_models, sparse_train_test)
+from storage import dataset_columns, read_dataset
+
+# Default datasets, those classification_analysis.py reads
+DEFAULT_LOG_FILES = [
+    'dataset/system-logs/multiple-system-log-dataset/extracted-data/Mac_extracted.csv',
+    'dataset/system-logs/multiple-system-log-dataset/extracted-data/Windows_extracted.csv',
+    'dataset/system-logs/multiple-system-log-dataset/extracted-data/Android_extracted.csv',
+    'dataset/system-logs/multiple-system-log-dataset/extracted-data/Linux_extracted.csv',
+]
+
+# Tokens, flags and system label of a sample of the rows of the datasets
+def load_sample(log_files, num_rows, random_state):
+    frames = []
+    for file in log_files:
+        columns = [column for column in ['tokens', 'error', 'warning'] if column in dataset_columns(file)]
+        df = read_dataset(file, columns=columns)
+        df['Label'] = file.split('/')[-1].split('_')[0]
+        frames.append(df)
+    df_logs = pd.concat(frames, ignore_index=True)
+    if num_rows < len(df_logs):
+        df_logs = df_logs.sample(n=num_rows, random_state=random_state).reset_index(drop=True)
+    df_logs['tokens'] = df_logs['tokens'].fillna('').map(normalize_tokens)
+    return df_logs
+
+# The previous path of classification_analysis.py: one dense float64 column per term, split and scaled as frames
+def dense_path(df_logs, model):
+    text_features = TfidfVectorizer().fit_transform(df_logs['tokens'])
+    text_features_df = pd.DataFrame(text_features.toarray(), columns=[f"term_{i}" for i in range(text_features.shape[1])])
+    df = pd.concat([df_logs.drop(columns=['tokens']), text_features_df], axis=1)
+    X_train, X_test, y_train, y_test = train_test_split(df.drop('Label', axis=1), df['Label'],
+                                                        test_size=DEFAULT_TEST_SIZE, random_state=DEFAULT_RANDOM_STATE)
+    numeric_columns = ['error', 'warning']
+    scaler = StandardScaler()
+    X_train = X_train.astype({column: float for column in numeric_columns})
+    X_test = X_test.astype({column: float for column in numeric_columns})
+    X_train[numeric_columns] = scaler.fit_transform(X_train[numeric_columns].fillna(0))
+    X_test[numeric_columns] = scaler.transform(X_test[numeric_columns].fillna(0))
+    fit_start = time.perf_counter()
+    model.fit(X_train, y_train)
+    return time.perf_counter() - fit_start
+
+# The sparse path classification_analysis.py takes now
+def sparse_path(df_logs, model):
+    text_features = TfidfVectorizer().fit_transform(df_logs['tokens'])
+    numeric, _ = numeric_matrix(df_logs, exclude=['tokens', 'Label'])
+    X_train, X_test, y_train, y_test = sparse_train_test(text_features, numeric, df_logs['Label'])
+    fit_start = time.perf_counter()
+    model.fit(X_train, y_train)
+    return time.perf_counter() - fit_start
+
+# Total and fit seconds of a path, and the peak memory it allocates (traced in a second run, as tracing slows it down)
+def measure(path, df_logs, model_id):
+    gc.collect()
+    start = time.perf_counter()
+    fit_seconds = path(df_logs, sparse_models()[model_id])
+    total_seconds = time.perf_counter() - start
+    gc.collect()
+    tracemalloc.start()
+    path(df_logs, sparse_models()[model_id])
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return total_seconds, fit_seconds, peak
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the memory and fit time of dense and sparse TF-IDF training")
+    parser.add_argument('log_files', nargs='*', default=DEFAULT_LOG_FILES,
+                        help="extracted datasets (default: those of classification_analysis.py)")
+    parser.add_argument('--rows', type=int, nargs='+', default=[5000, 20000],
+                        help="sample sizes to benchmark (default: %(default)s)")
+    parser.add_argument('--model', choices=sorted(sparse_models()), default='lr',
+                        help="classifier fitted by both paths (default: %(default)s)")
+    parser.add_argument('--skip-dense-above', type=int, default=50000,
+                        help="only run the sparse path on larger samples (default: %(default)s)")
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'terms':>7} {'path':<7} {'total s':>9} {'fit s':>8} {'peak MB':>10}")
+    for num_rows in args.rows:
+        df_logs = load_sample(args.log_files, num_rows, DEFAULT_RANDOM_STATE)
+        terms = len(TfidfVectorizer().fit(df_logs['tokens']).vocabulary_)
+        paths = [('sparse', sparse_path)]
+        if len(df_logs) <= args.skip_dense_above:
+            paths.insert(0, ('dense', dense_path))
+        for name, path in paths:
+            total_seconds, fit_seconds, peak = measure(path, df_logs, args.model)
+            print(f"{len(df_logs):>8} {terms:>7} {name:<7} {total_seconds:>9.2f} {fit_seconds:>8.2f} "
+                  f"{peak / 2 ** 20:>10,.1f}")
@@ -1,20 +1,47 @@
 #!/usr/bin/env python
 # coding: utf-8
 
-import pandas as pd
+import argparse
+import atexit
 import os
-import subprocess
-from flask import Flask
+import threading
+import time
+from flask import Flask, jsonify, request
 from prometheus_client import Counter, generate_latest, REGISTRY, make_wsgi_app
 from werkzeug.middleware.dispatcher import DispatcherMiddleware
+from dataset_follow import DATASET_CHECKPOINT_FILE_NAME, iter_appended_rows, skip_appended_rows
+from events import event_source, event_store_from_environment, format_epoch
+from extraction import DEFAULT_CHUNKSIZE, SYSTEM_LOG_FORMATS
+from inference import classify_chunk, scorers_from_environment, scoring_columns
+from ingest import DEFAULT_BATCH_SIZE, DEFAULT_MAX_BODY_BYTES, DEFAULT_MAX_DELAY, MicroBatcher, parse_ingest_body
+from instrumentation import STAGE_DURATION, consumed_bytes, cycle_completed, record_throughput, timed_chunks
+from log_follow import iter_appended_chunks, load_checkpoints, save_checkpoints, skip_to_end
+from playbooks import DEFAULT_PLAYBOOK_FILE, ToolTable, load_playbooks
+from rate_limit import RemediationLimiter
+from remediation import RemediationExecutor
+from service import (DEFAULT_DRAIN_SECONDS, DEFAULT_PORT, DEFAULT_THREADS, HTTPServer, ServiceState, add_health_routes,
+                     stop_on_signals)
+from sharding import ShardLabeledRegistry, coordinator_from_environment
+from sliding_window import DEFAULT_WINDOW_SECONDS, SystemWindows
+from storage import dataset_columns, read_dataset, system_dataset_files
 
 # Initialize Flask App for Prometheus Metrics
 app = Flask(__name__)
+# Larger /ingest bodies are answered with 413 before they are read
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('INGEST_MAX_BODY_BYTES', DEFAULT_MAX_BODY_BYTES))
+
+# Lifecycle of the service: the long-running modes poll until it is stopping
+SERVICE = ServiceState()
 
 # Define Prometheus Metrics
 ERRORS_DETECTED = Counter("errors_detected", "Number of errors detected", ["system"])
 WARNINGS_DETECTED = Counter("warnings_detected", "Number of warnings detected", ["system"])
 REMEDIAL_ACTIONS_TRIGGERED = Counter("remedial_actions_triggered", "Number of remedial actions taken", ["system"])
+REMEDIAL_ACTIONS_SUPPRESSED = Counter("remedial_actions_suppressed", "Number of remedial actions held back by the limits",
+                                      ["system", "action", "suppressed"])
+
+# Timer of the threshold decisions, bound once: decorators can only be dotted names and calls of them before Python 3.9
+DECISION_DURATION = STAGE_DURATION.labels(stage='decision')
 
 # OS-specific remedial action registry
 OS_REMEDIAL_ACTIONS = {}
@@ -26,123 +53,153 @@ def register_os_action(os_name):
         return func
     return decorator
 
+# Tool paths resolved once and cached, shared by the playbooks
+TOOLS = ToolTable()
+
 # Function to check if a tool exists
 def is_tool_available(tool_name):
     """Check if a tool is available in the environment."""
-    return subprocess.call(["which", tool_name], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) == 0
+    return TOOLS.available(tool_name)
 
-# Android-specific actions
-@register_os_action("Android")
-def remedial_actions_android(system_name):
-    print(f"Performing remedial actions for {system_name}...")
-    REMEDIAL_ACTIONS_TRIGGERED.labels(system=system_name).inc()
-    try:
-        if is_tool_available("adb"):
-            print("Clearing app data...")
-            result = subprocess.run(
-                ["adb", "shell", "pm", "clear", "com.example.app"],
-                check=True,
-                capture_output=True,
-                text=True
-            )
-            if "no devices/emulators found" in result.stderr:
-                raise Exception("No devices/emulators connected.")
-            print("Rebooting device...")
-            subprocess.run(["adb", "reboot"], check=True)
-        else:
-            raise Exception("adb tool not available.")
-    except Exception as e:
-        print(f"Error performing {system_name} remedial actions: {e}")
-        print("Simulated: adb shell pm clear com.example.app")
-        print("Simulated: adb reboot")
-
-# Linux-specific actions
-@register_os_action("Linux")
-def remedial_actions_linux(system_name):
-    print(f"Performing remedial actions for {system_name}...")
-    REMEDIAL_ACTIONS_TRIGGERED.labels(system=system_name).inc()
-    try:
-        print("Applying system updates...")
-        subprocess.run(["apt-get", "update", "-y"], check=True)
-        subprocess.run(["apt-get", "upgrade", "-y"], check=True)
-
-        print("Restarting SSH service...")
-        if is_tool_available("systemctl"):
-            subprocess.run(["systemctl", "restart", "ssh"], check=True)
-        elif is_tool_available("service"):
-            subprocess.run(["service", "ssh", "restart"], check=True)
-        else:
-            print("No suitable service manager found to restart SSH.")
-
-        print("Performing disk clean-up...")
-        if os.path.isdir("/var/tmp") and os.access("/var/tmp", os.W_OK):
-            subprocess.run(["rm", "-rf", "/var/tmp/*"], check=True)
-        else:
-            print("Skipped: /var/tmp is not available or writable.")
-
-        print(f"{system_name} remedial actions completed successfully.")
-    except Exception as e:
-        print(f"Error performing {system_name} remedial actions: {e}")
-# Mac-specific actions
-@register_os_action("Mac")
-def remedial_actions_mac(system_name):
-    print(f"Performing remedial actions for {system_name}...")
-    REMEDIAL_ACTIONS_TRIGGERED.labels(system=system_name).inc()
-    try:
-        print("Simulated: softwareupdate -i -a")
-        if is_tool_available("apachectl"):
-            print("Restarting services (example for Apache)...")
-            subprocess.run(["sudo", "apachectl", "restart"], check=True)
-        else:
-            print("Simulated: apachectl restart")
-        print("Performing disk clean-up...")
-        subprocess.run(["rm", "-rf", "/tmp/*"], check=True)
-
-        print(f"{system_name} remedial actions completed successfully.")
-    except Exception as e:
-        print(f"Error performing {system_name} remedial actions: {e}")
-
-# Windows-specific actions
-@register_os_action("Windows")
-def remedial_actions_windows(system_name):
-    print(f"Performing remedial actions for {system_name}...")
-    REMEDIAL_ACTIONS_TRIGGERED.labels(system=system_name).inc()
-    try:
-        if is_tool_available("powershell"):
-            # System Update
-            print("Applying updates...")
-            subprocess.run(["powershell", "-Command", "Install-WindowsUpdate -AcceptAll"], check=True)
-
-            # Service Restart
-            print("Restarting IIS service...")
-            subprocess.run(["powershell", "-Command", "Restart-Service -Name 'W3SVC'"], check=True)
-
-            # Disk Cleanup
-            print("Performing disk clean-up...")
-            subprocess.run(["powershell", "-Command", "cleanmgr /sagerun:1"], check=True)
-        else:
-            raise Exception("PowerShell not available.")
-    except Exception as e:
-        print(f"Error performing {system_name} remedial actions: {e}")
-        print("Simulated: Install-WindowsUpdate -AcceptAll")
-        print("Simulated: Restart-Service -Name 'W3SVC'")
-        print("Simulated: cleanmgr /sagerun:1")
+# Playbooks of the OS-specific actions, compiled once and recompiled when the tools change (see playbooks.json)
+PLAYBOOK_FILE = os.environ.get('REMEDIATION_PLAYBOOKS', DEFAULT_PLAYBOOK_FILE)
+PLAYBOOKS = load_playbooks(PLAYBOOK_FILE, TOOLS, dry_run=os.environ.get('REMEDIATION_DRY_RUN', '') not in ('', '0'))
+
+# Register each playbook as the remedial actions of its system
+def register_playbooks(playbooks):
+    for system_name, playbook in playbooks.items():
+        def remedial_actions(system_name, playbook=playbook):
+            REMEDIAL_ACTIONS_TRIGGERED.labels(system=system_name).inc()
+            return playbook.run(system_name)
+        # The name is the action the rate limiter keeps its state under
+        remedial_actions.__name__ = f"remedial_actions_{system_name.lower()}"
+        register_os_action(system_name)(remedial_actions)
+
+register_playbooks(PLAYBOOKS)
 
 # Fallback for unsupported systems
-def remedial_actions_fallback(system_name):
+async def remedial_actions_fallback(system_name):
     print(f"No specific remedial actions defined for {system_name}.")
 
-# Main remedial actions handler
+# Store of the detected events and the remediation history, None unless EVENT_DB (or --event-db) is set
+EVENTS = event_store_from_environment()
+
+# Name of the remedial actions of a system, which the rate limiter and the event store know them by
+def remedial_action_name(system_name):
+    return OS_REMEDIAL_ACTIONS.get(system_name, remedial_actions_fallback).__name__
+
+# Record a remediation attempt and its outcome in the event store
+def record_remediation(system_name, outcome, started, finished=None):
+    if EVENTS is not None:
+        EVENTS.record_remediation(system_name, remedial_action_name(system_name), outcome, started, finished)
+
+# Executor running the remedial actions concurrently, so detection goes on while they are in flight
+REMEDIATION_EXECUTOR = RemediationExecutor(OS_REMEDIAL_ACTIONS, remedial_actions_fallback, on_finished=record_remediation)
+
+# Shard of this replica when several replicas split the systems between them, None when this one handles all
+SHARDS = coordinator_from_environment()
+
+# Cooldowns and rate limits of the remedial actions, configured through the environment; replicas keep their own state
+REMEDIATION_LIMITER = RemediationLimiter.from_environment(None if SHARDS is None else SHARDS.replica_id)
+
+# Whether this replica handles a system
+def owns_system(system_name):
+    return SHARDS is None or SHARDS.owns(system_name)
+
+# Main remedial actions handler: queue the actions of a system and return at once,
+# unless the same actions ran too recently or too often, or another replica is remediating the system
 def perform_remedial_actions(system_name):
-    action_handler = OS_REMEDIAL_ACTIONS.get(system_name, remedial_actions_fallback)
-    action_handler(system_name)
+    action = remedial_action_name(system_name)
+    suppressed = REMEDIATION_LIMITER.acquire(system_name, action)
+    if suppressed is not None:
+        retry_after = REMEDIATION_LIMITER.retry_after(system_name, action)
+        print(f"Suppressed {action} for {system_name} ({suppressed}), allowed again in {retry_after:.1f} seconds.")
+    elif SHARDS is not None and not SHARDS.claim_remediation(system_name, REMEDIATION_LIMITER.cooldown_seconds):
+        # The claim lasts a cooldown, so replicas taking over the system in the meantime don't repeat the actions
+        suppressed = 'claimed'
+        print(f"Suppressed {action} for {system_name}: another replica claimed its remediation.")
+    if suppressed is not None:
+        REMEDIAL_ACTIONS_SUPPRESSED.labels(system=system_name, action=action, suppressed=suppressed).inc()
+        record_remediation(system_name, suppressed, time.time())
+        return
+    if not REMEDIATION_EXECUTOR.submit(system_name):
+        # The actions never ran, so they don't hold back the next trigger
+        REMEDIATION_LIMITER.refund(system_name, action)
+        record_remediation(system_name, 'dropped', time.time())
+
+# Classification models scoring the rows of each system, loaded once at startup; without them (INFERENCE_MODEL_DIR
+# unset) or for systems without a model, the errors and warnings are the sums of the rows' flags
+SYSTEM_SCORERS = scorers_from_environment(SYSTEM_LOG_FORMATS)
+
+# Errors and warnings of a chunk of a system's rows, recorded in the event store with the file or stream they came from
+def count_system_chunk(system_name, chunk, source='ingest'):
+    errors, warnings = classify_chunk(SYSTEM_SCORERS, system_name, chunk)
+    if EVENTS is not None:
+        EVENTS.add_events(system_name, chunk, errors, warnings, source)
+    return int(errors.sum()), int(warnings.sum())
+
+# Columns to read from a system's dataset: the flags, or what its models need, and the epochs the event store keeps
+def dataset_read_columns(system_name, filepath):
+    columns = scoring_columns(SYSTEM_SCORERS, system_name)
+    if columns is None:
+        return None
+    # Columns a model needs that the dataset lacks are left out; classify_chunk counts the flags for it then
+    available = dataset_columns(filepath)
+    columns = [column for column in columns if column in available]
+    if EVENTS is not None and 'epoch' in available:
+        columns = columns + ['epoch']
+    return columns
+
+# Thresholds above which remedial actions are triggered, set through the environment (see docker-compose.yaml)
+ERROR_THRESHOLD = int(os.environ.get('ERROR_THRESHOLD', 100))
+WARNING_THRESHOLD = int(os.environ.get('WARNING_THRESHOLD', 500))
+
+# Load the preprocessed log files (CSV or parquet) into a dataframe per system
+def load_preprocessed_logs(preprocessed_dir):
+    system_dfs = {}
+    for system_name, filepath in system_dataset_files(preprocessed_dir, 'preprocessed').items():
+        if not owns_system(system_name):
+            continue
+        print(f"Loading file: {filepath}")
+        try:
+            # Only the flag columns, or the columns of the system's models, are needed to decide on remedial actions
+            start = time.perf_counter()
+            system_dfs[system_name] = read_dataset(filepath, columns=dataset_read_columns(system_name, filepath))
+            system_dfs[system_name].attrs['source'] = event_source(filepath)
+            elapsed = time.perf_counter() - start
+            STAGE_DURATION.labels(stage='load').observe(elapsed)
+            record_throughput(system_name, len(system_dfs[system_name]), os.path.getsize(filepath), elapsed)
+            print(f"Loaded data for system: {system_name}")
+        except Exception as e:
+            print(f"Error loading {os.path.basename(filepath)}: {e}")
+    return system_dfs
+
+# Record the counts of a system and trigger self-healing when a threshold is exceeded
+@DECISION_DURATION.time()
+def evaluate_system(system_name, num_errors, num_warnings,
+                    error_threshold=ERROR_THRESHOLD, warning_threshold=WARNING_THRESHOLD):
+    ERRORS_DETECTED.labels(system=system_name).inc(num_errors)
+    WARNINGS_DETECTED.labels(system=system_name).inc(num_warnings)
+
+    print(f"Errors: {num_errors}, Warnings: {num_warnings}")
+    if num_errors > error_threshold:
+        print(f"Triggering self-healing for {system_name} due to high errors.")
+        perform_remedial_actions(system_name)
+    elif num_warnings > warning_threshold:
+        print(f"Triggering self-healing for {system_name} due to high warnings.")
+        perform_remedial_actions(system_name)
+    else:
+        print(f"No remedial actions required for {system_name}.")
+
+# Directory of the preprocessed datasets read by default
+PREPROCESSED_DIR = 'dataset/system-logs/multiple-system-log-dataset/preprocessed-data'
 
 # Load and process system logs
 def process_logs():
     print("Starting the self-healing application...")
 
     # Define the preprocessed log directory
-    preprocessed_dir = 'dataset/system-logs/multiple-system-log-dataset/preprocessed-data'
+    preprocessed_dir = PREPROCESSED_DIR
 
     # Check if the directory exists
     if not os.path.exists(preprocessed_dir):
@@ -151,53 +208,332 @@ def process_logs():
 
     print(f"Preprocessed directory found: {preprocessed_dir}")
 
-    # Create a dictionary to store dataframes for each system
-    system_dfs = {}
+    with STAGE_DURATION.labels(stage='cycle').time():
+        # Create a dictionary to store dataframes for each system
+        system_dfs = load_preprocessed_logs(preprocessed_dir)
 
-    # Load the preprocessed log files and create separate dataframes for each system
-    for filename in os.listdir(preprocessed_dir):
-        if filename.endswith('.csv'):
-            filepath = os.path.join(preprocessed_dir, filename)
-            print(f"Loading file: {filepath}")
+        # Process each system
+        for system_name, df in system_dfs.items():
+            print(f"\nProcessing data for {system_name}...")
             try:
-                df = pd.read_csv(filepath)
-                system_name = os.path.splitext(filename)[0].replace("_preprocessed", "")
-                system_dfs[system_name] = df
-                print(f"Loaded data for system: {system_name}")
+                if EVENTS is not None:
+                    # Each pass reads the whole dataset, so it replaces the events of the previous one
+                    EVENTS.clear_source(system_name, df.attrs['source'])
+                with STAGE_DURATION.labels(stage='aggregate').time():
+                    num_errors, num_warnings = count_system_chunk(system_name, df, df.attrs['source'])
+                evaluate_system(system_name, num_errors, num_warnings)
             except Exception as e:
-                print(f"Error loading {filename}: {e}")
+                print(f"Error processing data for {system_name}: {e}")
+        if EVENTS is not None:
+            EVENTS.flush()
+    cycle_completed()
 
-    # Define thresholds
-    error_threshold = 100
-    warning_threshold = 500
+    # The one-shot run is complete once the remedial actions it triggered have run
+    REMEDIATION_EXECUTOR.join()
+    print("Self-healing application completed successfully.")
 
-    # Process each system
-    for system_name, df in system_dfs.items():
-        print(f"\nProcessing data for {system_name}...")
-        try:
-            num_errors = df['error'].sum()
-            num_warnings = df['warning'].sum()
+# Count the errors and warnings of a system's chunks, observing the load and aggregate stages
+# and the throughput; the file's checkpoint before and after the read gives the bytes read
+def count_flagged_rows(system_name, chunks, checkpoints, path):
+    before = checkpoints.get(path)
+    start = time.perf_counter()
+    num_rows = num_errors = num_warnings = 0
+    aggregate_seconds = 0.0
+    for chunk in timed_chunks(chunks):
+        aggregate_start = time.perf_counter()
+        num_rows += len(chunk)
+        chunk_errors, chunk_warnings = count_system_chunk(system_name, chunk, event_source(path))
+        num_errors += chunk_errors
+        num_warnings += chunk_warnings
+        aggregate_seconds += time.perf_counter() - aggregate_start
+    if num_rows:
+        STAGE_DURATION.labels(stage='aggregate').observe(aggregate_seconds)
+        record_throughput(system_name, num_rows, consumed_bytes(before, checkpoints.get(path)),
+                          time.perf_counter() - start)
+    return num_errors, num_warnings
 
+# Drop the events recorded from a dataset, before it is read again from the start
+def clear_events(system_name, filepath):
+    if EVENTS is not None:
+        EVENTS.clear_source(system_name, event_source(filepath))
+
+# Read the rows appended to each preprocessed dataset since the last poll and add them to the system's totals
+# The totals and whether they already triggered are kept in the checkpoints, so a restart neither counts
+# rows twice nor triggers again for the same data; a replaced or rewritten dataset starts from zero
+# Returns whether every system was processed without error
+def ingest_preprocessed_updates(preprocessed_dir, checkpoints, error_threshold=ERROR_THRESHOLD,
+                                warning_threshold=WARNING_THRESHOLD, chunksize=DEFAULT_CHUNKSIZE):
+    succeeded = True
+    for system_name, filepath in system_dataset_files(preprocessed_dir, 'preprocessed').items():
+        if not owns_system(system_name):
+            # Move past the rows another replica counts, so they are not counted again if the system comes back
+            skip_appended_rows(filepath, checkpoints)
+            continue
+        try:
+            chunks = iter_appended_rows(filepath, checkpoints, dataset_read_columns(system_name, filepath), chunksize,
+                                        on_reset=lambda: clear_events(system_name, filepath))
+            num_errors, num_warnings = count_flagged_rows(system_name, chunks, checkpoints, filepath)
             ERRORS_DETECTED.labels(system=system_name).inc(num_errors)
             WARNINGS_DETECTED.labels(system=system_name).inc(num_warnings)
 
-            print(f"Errors: {num_errors}, Warnings: {num_warnings}")
-            if num_errors > error_threshold:
-                print(f"Triggering self-healing for {system_name} due to high errors.")
-                perform_remedial_actions(system_name)
-            elif num_warnings > warning_threshold:
-                print(f"Triggering self-healing for {system_name} due to high warnings.")
-                perform_remedial_actions(system_name)
-            else:
-                print(f"No remedial actions required for {system_name}.")
+            state = checkpoints[filepath]
+            state['errors'] = state.get('errors', 0) + num_errors
+            state['warnings'] = state.get('warnings', 0) + num_warnings
+            if num_errors or num_warnings:
+                print(f"{system_name}: {num_errors} new errors, {num_warnings} new warnings "
+                      f"({state['errors']} and {state['warnings']} in total)")
+            with DECISION_DURATION.time():
+                if (state['errors'] > error_threshold or state['warnings'] > warning_threshold) and not state.get('triggered'):
+                    state['triggered'] = True
+                    print(f"Triggering self-healing for {system_name}: {state['errors']} errors, {state['warnings']} warnings.")
+                    perform_remedial_actions(system_name)
         except Exception as e:
             print(f"Error processing data for {system_name}: {e}")
+            succeeded = False
+    return succeeded
 
-    print("Self-healing application completed successfully.")
+# Long-running mode: watch the preprocessed datasets, including ones that appear later, and ingest only new rows
+def watch_preprocessed_logs(preprocessed_dir=PREPROCESSED_DIR, checkpoint_file=None, interval=5,
+                            error_threshold=ERROR_THRESHOLD, warning_threshold=WARNING_THRESHOLD, chunksize=DEFAULT_CHUNKSIZE):
+    if checkpoint_file is None:
+        checkpoint_file = os.path.join(preprocessed_dir, DATASET_CHECKPOINT_FILE_NAME)
+        if SHARDS is not None:
+            # Replicas sharing the directory keep checkpoints of their own
+            base, extension = os.path.splitext(checkpoint_file)
+            checkpoint_file = f"{base}.{SHARDS.replica_id}{extension}"
+    print(f"Watching {preprocessed_dir}, checkpoints in {checkpoint_file}")
+    checkpoints = load_checkpoints(checkpoint_file)
+    while True:
+        if os.path.isdir(preprocessed_dir):
+            with STAGE_DURATION.labels(stage='cycle').time():
+                succeeded = ingest_preprocessed_updates(preprocessed_dir, checkpoints, error_threshold,
+                                                        warning_threshold, chunksize)
+                if EVENTS is not None:
+                    # Written before the checkpoints, so a crash repeats events rather than losing them
+                    EVENTS.flush()
+                save_checkpoints(checkpoints, checkpoint_file)
+            if succeeded:
+                cycle_completed()
+        if SERVICE.wait(interval):
+            break
+
+# Sliding windows of the systems, fed by daemon mode and the ingest endpoint; --window sets their length
+SYSTEM_WINDOWS = SystemWindows(DEFAULT_WINDOW_SECONDS)
+
+# Add counts to a system's window, and trigger once when the window crosses a threshold
+@DECISION_DURATION.time()
+def record_window_counts(system_name, num_errors, num_warnings,
+                         error_threshold=ERROR_THRESHOLD, warning_threshold=WARNING_THRESHOLD):
+    now = time.time()
+    SYSTEM_WINDOWS.add(system_name, now, num_errors, num_warnings)
+    ERRORS_DETECTED.labels(system=system_name).inc(num_errors)
+    WARNINGS_DETECTED.labels(system=system_name).inc(num_warnings)
+    crossed = SYSTEM_WINDOWS.crossed(system_name, now, error_threshold, warning_threshold)
+    if EVENTS is not None:
+        EVENTS.flush()
+    if crossed is not None:
+        print(f"Triggering self-healing for {system_name}: {crossed[0]} errors, "
+              f"{crossed[1]} warnings in the last {SYSTEM_WINDOWS.window_seconds} seconds.")
+        perform_remedial_actions(system_name)
+
+# Long-running mode: follow the raw logs and trigger on the errors and warnings of a sliding window
+# Only lines written after the daemon started count, so a large history never triggers by itself
+def run_daemon(log_dir='dataset/system-logs', interval=5,
+               error_threshold=ERROR_THRESHOLD, warning_threshold=WARNING_THRESHOLD, chunksize=DEFAULT_CHUNKSIZE):
+    print(f"Following the system logs in {log_dir}: triggering on more than {error_threshold} errors "
+          f"or {warning_threshold} warnings within {SYSTEM_WINDOWS.window_seconds} seconds")
+    checkpoints = {}
+    while True:
+        cycle_start = time.perf_counter()
+        succeeded = True
+        for system_name, log_format in SYSTEM_LOG_FORMATS.items():
+            log_file = os.path.join(log_dir, f"{system_name}.log")
+            if not os.path.exists(log_file):
+                continue
+            if not owns_system(system_name):
+                # Forget the position, so the lines another replica handled meanwhile are not counted on return
+                checkpoints.pop(log_file, None)
+                continue
+            try:
+                if log_file not in checkpoints:
+                    skip_to_end(log_file, checkpoints)
+                chunks = iter_appended_chunks(log_file, checkpoints, chunksize, log_format)
+                num_errors, num_warnings = count_flagged_rows(system_name, chunks, checkpoints, log_file)
+                # Also called without new lines, so a window that emptied re-arms its trigger
+                record_window_counts(system_name, num_errors, num_warnings, error_threshold, warning_threshold)
+            except Exception as e:
+                print(f"Error processing data for {system_name}: {e}")
+                succeeded = False
+        STAGE_DURATION.labels(stage='cycle').observe(time.perf_counter() - cycle_start)
+        if succeeded:
+            cycle_completed()
+        if SERVICE.wait(interval):
+            break
+
+# Micro-batches of the lines posted to /ingest, classified off the request threads; a batch is flushed at
+# INFERENCE_BATCH_SIZE lines or after INFERENCE_FLUSH_SECONDS
+INGEST_BATCHER = MicroBatcher(record_window_counts, int(os.environ.get('INFERENCE_BATCH_SIZE', DEFAULT_BATCH_SIZE)),
+                              float(os.environ.get('INFERENCE_FLUSH_SECONDS', DEFAULT_MAX_DELAY)),
+                              count_chunk=count_system_chunk)
+
+# Accept batched log lines of a system, as plain text or NDJSON, for classification
+@app.route('/ingest', methods=['POST'])
+def ingest():
+    if SERVICE.stopping.is_set():
+        response = jsonify(error="Shutting down")
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+        return response
+    try:
+        lines = parse_ingest_body(request.get_data(as_text=True), request.content_type, request.args.get('system'))
+        for system_name in lines:
+            if system_name not in SYSTEM_LOG_FORMATS:
+                raise ValueError(f"Unknown system: {system_name}")
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    # Lines of systems owned by another replica are sent back, naming it
+    for system_name in lines:
+        if not owns_system(system_name):
+            return jsonify(error=f"{system_name} is handled by another replica", owner=SHARDS.owner(system_name)), 421
+    # A body that can never fit is refused for good; otherwise all of its lines are queued, or none of them
+    accepted = sum(len(system_lines) for system_lines in lines.values())
+    if not INGEST_BATCHER.fits(accepted):
+        return jsonify(error=f"{accepted} lines are more than the {INGEST_BATCHER.max_pending_lines} "
+                             "a request can hold; split them"), 413
+    if not INGEST_BATCHER.submit(lines):
+        response = jsonify(error="Ingest queue is full", accepted=0)
+        response.status_code = 429
+        response.headers['Retry-After'] = str(INGEST_BATCHER.retry_after())
+        return response
+    return jsonify(accepted=accepted), 202
+
+# Errors and warnings of each system between the epochs start and end (default: the last hour), and its last
+# completed remediation, from the event store
+@app.route('/events')
+def events():
+    if EVENTS is None:
+        return jsonify(error="The event store is off; set EVENT_DB or --event-db"), 404
+    try:
+        end = float(request.args.get('end', time.time()))
+        start = float(request.args.get('start', end - 3600))
+    except ValueError:
+        return jsonify(error="start and end are epochs in seconds"), 400
+    systems = {}
+    for system_name, (num_errors, num_warnings) in EVENTS.counts(request.args.get('system'), start, end).items():
+        last = EVENTS.last_remediation(system_name)
+        systems[system_name] = {'errors': num_errors, 'warnings': num_warnings,
+                                'last_remediation': None if last is None else format_epoch(last[3])}
+    return jsonify(start=start, end=end, systems=systems)
+
+# Liveness and readiness probes
+add_health_routes(app, SERVICE)
+
+# Stop a running service: let the follow loops finish their poll, classify the lines already accepted,
+# and give the queued and running remediations up to drain_seconds before cancelling the rest
+def shutdown(server, workers, drain_seconds=DEFAULT_DRAIN_SECONDS):
+    SERVICE.stop()
+    for worker in workers:
+        worker.join()
+    INGEST_BATCHER.join(drain_seconds)
+    print("Waiting for the remedial actions in progress...")
+    if not REMEDIATION_EXECUTOR.join(drain_seconds):
+        print(f"Remedial actions still running after {drain_seconds:g} seconds, cancelling them.")
+        REMEDIATION_EXECUTOR.cancel()
+        REMEDIATION_EXECUTOR.join()
+    server.stop()
+    if EVENTS is not None:
+        EVENTS.close()
+    print("Self-healing service stopped.")
 
 # Expose Prometheus Metrics Endpoint
-app.wsgi_app = DispatcherMiddleware(app, {"/metrics": make_wsgi_app()})
+app.wsgi_app = DispatcherMiddleware(app.wsgi_app, {"/metrics": make_wsgi_app()})
 
 if __name__ == "__main__":
-    process_logs()
-    app.run(host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Command line options
+    parser = argparse.ArgumentParser(description="Trigger self-healing on the errors and warnings of each system")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--daemon', action='store_true',
+                      help="follow the raw logs and trigger on a sliding window instead of the preprocessed totals")
+    mode.add_argument('--watch', action='store_true',
+                      help="keep ingesting the rows appended to the preprocessed datasets instead of reading them once")
+    parser.add_argument('--log-dir', default='dataset/system-logs',
+                        help="directory of the raw logs followed in daemon mode (default: %(default)s)")
+    parser.add_argument('--window', type=int, default=DEFAULT_WINDOW_SECONDS,
+                        help="seconds of history the thresholds apply to in daemon mode and for /ingest (default: %(default)s)")
+    parser.add_argument('--interval', type=float, default=5,
+                        help="seconds between polls of the logs in daemon and watch mode (default: %(default)s)")
+    parser.add_argument('--checkpoint-file', default=None,
+                        help=f"row-offset checkpoints of watch mode; keep it on persistent storage "
+                             f"(default: {DATASET_CHECKPOINT_FILE_NAME} in the preprocessed directory)")
+    parser.add_argument('--shard-db', default=None,
+                        help="share the systems with other replicas through this SQLite database (default: $SHARD_DB)")
+    parser.add_argument('--shard-id', default=None,
+                        help="name of this replica among the shards (default: $SHARD_ID or the host name)")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="print the commands of the remedial actions instead of running them")
+    parser.add_argument('--event-db', default=None,
+                        help="record the events and remediations in this SQLite database (default: $EVENT_DB)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help="port of the metrics, health and ingest endpoints (default: %(default)s)")
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS,
+                        help="HTTP requests handled at once (default: %(default)s)")
+    parser.add_argument('--drain-seconds', type=float, default=DEFAULT_DRAIN_SECONDS,
+                        help="how long a shutdown waits for running remedial actions before cancelling them "
+                             "(default: %(default)s)")
+    parser.add_argument('--model-dir', default=None,
+                        help="count errors and warnings with the <system>_<error|warning>_model.pkl pipelines "
+                             "in this directory instead of the flags (default: $INFERENCE_MODEL_DIR)")
+    parser.add_argument('--cutoff', type=float, default=None,
+                        help="probability above which a row counts as an error or warning (default: $INFERENCE_CUTOFF or 0.5)")
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help="rows scored per model call and lines per /ingest micro-batch (default: $INFERENCE_BATCH_SIZE)")
+    parser.add_argument('--flush-interval', type=float, default=None,
+                        help="seconds an /ingest micro-batch waits before it is scored (default: $INFERENCE_FLUSH_SECONDS or 1)")
+    args = parser.parse_args()
+
+    if args.dry_run:
+        for playbook in PLAYBOOKS.values():
+            playbook.dry_run = True
+
+    if args.shard_db is not None or args.shard_id is not None:
+        SHARDS = coordinator_from_environment(args.shard_db, args.shard_id)
+        if SHARDS is None:
+            parser.error("--shard-id needs --shard-db or SHARD_DB")
+    if SHARDS is not None:
+        SHARDS.start()
+        atexit.register(SHARDS.stop)
+        # Every metric of this replica carries its shard
+        app.wsgi_app.mounts['/metrics'] = make_wsgi_app(ShardLabeledRegistry(REGISTRY, SHARDS.replica_id))
+        print(f"Running as shard {SHARDS.replica_id}")
+        REMEDIATION_LIMITER = RemediationLimiter.from_environment(SHARDS.replica_id)
+
+    if args.model_dir is not None or args.cutoff is not None or args.batch_size is not None:
+        SYSTEM_SCORERS = scorers_from_environment(SYSTEM_LOG_FORMATS, args.model_dir, args.cutoff, args.batch_size)
+    if args.batch_size is not None or args.flush_interval is not None:
+        INGEST_BATCHER = MicroBatcher(record_window_counts, args.batch_size or INGEST_BATCHER.batch_size,
+                                      args.flush_interval or INGEST_BATCHER.max_delay, count_chunk=count_system_chunk)
+
+    if args.event_db is not None:
+        EVENTS = event_store_from_environment(args.event_db)
+
+    SYSTEM_WINDOWS = SystemWindows(args.window)
+
+    # The HTTP server runs from the start, so metrics are scraped while the logs are processed
+    stop_on_signals(SERVICE)
+    server = HTTPServer(app, port=args.port, threads=args.threads)
+    server.start()
+    workers = []
+    if args.daemon:
+        workers.append(threading.Thread(target=run_daemon, args=(args.log_dir, args.interval), daemon=True))
+    elif args.watch:
+        workers.append(threading.Thread(target=watch_preprocessed_logs,
+                                        args=(PREPROCESSED_DIR, args.checkpoint_file, args.interval), daemon=True))
+    for worker in workers:
+        worker.start()
+    SERVICE.ready.set()
+    if not workers:
+        process_logs()
+
+    # Keep serving until SIGTERM or Ctrl+C, then drain
+    SERVICE.stopping.wait()
+    shutdown(server, workers, args.drain_seconds)
\ No newline at end of file
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import io
+import os
+import pandas as pd
+from extraction import ByteRangeReader
+from log_follow import SCAN_BLOCK_SIZE, head_digest, last_line_end
+from storage import COLUMN_DTYPES, DEFAULT_READ_CHUNKSIZE, data_format_of, dataset_columns, require_pyarrow
+
+# Name of the row-offset checkpoints kept next to the followed datasets
+DATASET_CHECKPOINT_FILE_NAME = '.ingestion-checkpoints.json'
+
+# Position checkpoint of a dataset file consumed up to a byte offset (CSV) and a number of rows
+def make_dataset_checkpoint(path, stat, offset, rows):
+    return {
+        'inode': stat.st_ino,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'offset': offset,
+        'rows': rows,
+        'head': head_digest(path, offset) if offset else None,
+    }
+
+# The checkpoint of a dataset file when its consumed part is unchanged, or None when it must be read from the start
+def still_valid(path, stat, checkpoint):
+    if checkpoint is None:
+        return None
+    if checkpoint['inode'] != stat.st_ino or stat.st_size < checkpoint['size']:
+        print(f"{path} was replaced or truncated, reading it from the start")
+        return None
+    if checkpoint['offset'] and head_digest(path, checkpoint['offset']) != checkpoint['head']:
+        print(f"{path} was rewritten, reading it from the start")
+        return None
+    return checkpoint
+
+# Number of lines ending in the byte range [start, end) of a file
+def count_lines(path, start, end):
+    count = 0
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while start < end:
+            block = f.read(min(SCAN_BLOCK_SIZE, end - start))
+            if not block:
+                break
+            count += block.count(b'\n')
+            start += len(block)
+    return count
+
+# Rows of a CSV dataset in the byte range [start, end); the header is only in the range when it starts at 0
+def iter_csv_range(path, start, end, columns, chunksize):
+    names = None if start == 0 else dataset_columns(path)
+    with io.BufferedReader(ByteRangeReader(open(path, 'rb'), start, end)) as f:
+        yield from pd.read_csv(f, header=0 if start == 0 else None, names=names, usecols=columns,
+                               dtype=COLUMN_DTYPES, chunksize=chunksize)
+
+# Rows of a parquet dataset from row `skip` on; whole row groups before it are never read
+def iter_parquet_rows(path, skip, columns, chunksize):
+    parquet_file = require_pyarrow().parquet.ParquetFile(path)
+    row_groups, first_row = [], 0
+    for i in range(parquet_file.num_row_groups):
+        num_rows = parquet_file.metadata.row_group(i).num_rows
+        if first_row + num_rows > skip:
+            row_groups.append(i)
+        else:
+            first_row += num_rows
+    if not row_groups:
+        return
+    for batch in parquet_file.iter_batches(batch_size=chunksize, row_groups=row_groups, columns=columns):
+        # The skip point can lie several batches into the first row group read
+        num_rows = len(batch)
+        if first_row < skip:
+            batch = batch.slice(min(skip - first_row, num_rows))
+        first_row += num_rows
+        if len(batch):
+            yield batch.to_pandas()
+
+# Chunks of the rows added to a dataset file since its checkpoint, moving the checkpoint past them.
+# Other keys a caller keeps in the checkpoint (e.g. running totals) survive as long as the file is only
+# appended to, and are dropped when it is replaced, truncated or rewritten.
+# CSV files are read from the byte offset after the last consumed row, and only up to the last complete row.
+# Parquet files can't be appended to in place, so a rewritten file with more rows is read from the row offset.
+# on_reset() is called before a file that had a checkpoint is read again from the start.
+def iter_appended_rows(path, checkpoints, columns=None, chunksize=DEFAULT_READ_CHUNKSIZE, on_reset=None):
+    stat = os.stat(path)
+    checkpoint = checkpoints.get(path)
+    if checkpoint is not None and (checkpoint['size'], checkpoint['mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+        return
+
+    rows = 0
+    if data_format_of(path) == 'parquet':
+        total_rows = require_pyarrow().parquet.ParquetFile(path).metadata.num_rows
+        if checkpoint is not None and (checkpoint['inode'] != stat.st_ino or total_rows < checkpoint['rows']):
+            print(f"{path} was replaced with fewer rows, reading it from the start")
+            checkpoint = None
+        if checkpoint is None and path in checkpoints and on_reset is not None:
+            on_reset()
+        start = 0 if checkpoint is None else checkpoint['rows']
+        for chunk in iter_parquet_rows(path, start, columns, chunksize):
+            rows += len(chunk)
+            yield chunk
+        offset = 0
+    else:
+        checkpoint = still_valid(path, stat, checkpoint)
+        if checkpoint is None and path in checkpoints and on_reset is not None:
+            on_reset()
+        start = 0 if checkpoint is None else checkpoint['offset']
+        offset = last_line_end(path, start, stat.st_size)
+        if offset > start:
+            for chunk in iter_csv_range(path, start, offset, columns, chunksize):
+                rows += len(chunk)
+                yield chunk
+
+    previous_rows = 0 if checkpoint is None else checkpoint['rows']
+    checkpoints[path] = {**(checkpoint or {}), **make_dataset_checkpoint(path, stat, offset, previous_rows + rows)}
+
+# Move the checkpoint of a dataset file past all of its rows without reading them, as iter_appended_rows would
+# once they were all consumed; used for the datasets another replica handles
+def skip_appended_rows(path, checkpoints):
+    stat = os.stat(path)
+    checkpoint = checkpoints.get(path)
+    if checkpoint is not None and (checkpoint['size'], checkpoint['mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+        return
+    if data_format_of(path) == 'parquet':
+        rows = require_pyarrow().parquet.ParquetFile(path).metadata.num_rows
+        if checkpoint is not None and (checkpoint['inode'] != stat.st_ino or rows < checkpoint['rows']):
+            checkpoint = None
+        offset = 0
+    else:
+        checkpoint = still_valid(path, stat, checkpoint)
+        start = 0 if checkpoint is None else checkpoint['offset']
+        offset = last_line_end(path, start, stat.st_size)
+        rows = (0 if checkpoint is None else checkpoint['rows']) + count_lines(path, start, offset)
+        if start == 0 and offset > 0:
+            # The header line is not a row
+            rows -= 1
+    checkpoints[path] = {**(checkpoint or {}), **make_dataset_checkpoint(path, stat, offset, rows)}
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from extraction import COMPRESSED_OPENERS, DEFAULT_CHUNKSIZE, detect_compression, extract_log_files, find_log_segments
+
+# Decompress every compressed segment to a plain file on disk, the way it is done by hand today
+def decompress_to_disk(log_file_paths, output_dir):
+    plain_paths = []
+    for i, log_file_path in enumerate(log_file_paths):
+        compression = detect_compression(log_file_path)
+        if compression is None:
+            plain_paths.append(log_file_path)
+            continue
+        plain_path = os.path.join(output_dir, f"{i:05d}.log")
+        with COMPRESSED_OPENERS[compression](log_file_path, 'rb') as source, open(plain_path, 'wb') as target:
+            shutil.copyfileobj(source, target, 1 << 20)
+        plain_paths.append(plain_path)
+    return plain_paths
+
+# Total size of the files written into a directory
+def disk_bytes(directory):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare streaming decompression with decompress-then-parse")
+    parser.add_argument('log_file', help="live log whose rotated segments (e.g. Linux.log.1.gz) are benchmarked")
+    parser.add_argument('--log-format', choices=['marker', 'syslog'], default='marker')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    args = parser.parse_args()
+
+    log_segments = find_log_segments(args.log_file)
+    compressed_bytes = sum(os.path.getsize(path) for path in log_segments)
+    print(f"{len(log_segments)} segments, {compressed_bytes} bytes on disk, {args.workers} workers")
+    print(f"{'method':<28} {'seconds':>10} {'entries':>10} {'disk bytes written':>20}")
+
+    for method in ['decompress then parse', 'streaming decompression']:
+        with tempfile.TemporaryDirectory() as work_dir:
+            output_file_name = os.path.join(work_dir, 'benchmark_extracted.csv')
+            start = time.perf_counter()
+            if method == 'decompress then parse':
+                segments = decompress_to_disk(log_segments, work_dir)
+            else:
+                segments = log_segments
+            num_entries = extract_log_files(segments, output_file_name, args.workers,
+                                            chunksize=args.chunksize, log_format=args.log_format)
+            elapsed = time.perf_counter() - start
+            print(f"{method:<28} {elapsed:>10.3f} {num_entries:>10} {disk_bytes(work_dir):>20}")
@@ -4,16 +4,18 @@
 # In[2]:
 
 
-import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 from tabulate import tabulate
+from events import event_source, event_store_from_environment
+from storage import read_dataset, system_dataset_files
 
-# Read in the log files for extracted data
-df_mac = pd.read_csv('dataset/system-logs/multiple-system-log-dataset/extracted-data/Mac_extracted.csv')
-df_win = pd.read_csv('dataset/system-logs/multiple-system-log-dataset/extracted-data/Windows_extracted.csv')
-df_android = pd.read_csv('dataset/system-logs/multiple-system-log-dataset/extracted-data/Android_extracted.csv')
-df_linux = pd.read_csv('dataset/system-logs/multiple-system-log-dataset/extracted-data/Linux_extracted.csv')
+# Read in the log files for extracted data (only the flag columns are needed for the counts)
+flag_columns = ['error', 'warning']
+df_mac = read_dataset('dataset/system-logs/multiple-system-log-dataset/extracted-data/Mac_extracted.csv', flag_columns)
+df_win = read_dataset('dataset/system-logs/multiple-system-log-dataset/extracted-data/Windows_extracted.csv', flag_columns)
+df_android = read_dataset('dataset/system-logs/multiple-system-log-dataset/extracted-data/Android_extracted.csv', flag_columns)
+df_linux = read_dataset('dataset/system-logs/multiple-system-log-dataset/extracted-data/Linux_extracted.csv', flag_columns)
 
 # Extract the error and warning count in each dataset for extracted data
 error_counts_extracted = [df_android['error'].count(), df_linux['error'].count(), df_mac['error'].count(), df_win['error'].count()]
@@ -58,21 +60,37 @@ table_extracted_warnings = {
 print("\nExtracted Data Warning Count")
 print(tabulate(table_extracted_warnings, headers='keys', tablefmt='grid'))
 
-# Read in the preprocessed data
-df_mac_preprocessed = pd.read_csv('dataset/system-logs/multiple-system-log-dataset/preprocessed-data/Mac_preprocessed.csv')
-df_win_preprocessed = pd.read_csv('dataset/system-logs/multiple-system-log-dataset/preprocessed-data/Windows_preprocessed.csv')
-df_android_preprocessed = pd.read_csv('dataset/system-logs/multiple-system-log-dataset/preprocessed-data/Android_preprocessed.csv')
-df_linux_preprocessed = pd.read_csv('dataset/system-logs/multiple-system-log-dataset/preprocessed-data/Linux_preprocessed.csv')
-
-# Calculate the error and warning count for each dataset in the preprocessed data
-error_counts_preprocessed = [df_android_preprocessed['error'].sum(), df_linux_preprocessed['error'].sum(),
-                            df_mac_preprocessed['error'].sum(), df_win_preprocessed['error'].sum()]
-warning_counts_preprocessed = [df_android_preprocessed['warning'].sum(), df_linux_preprocessed['warning'].sum(),
-                               df_mac_preprocessed['warning'].sum(), df_win_preprocessed['warning'].sum()]
-
 # Define the dataset names for preprocessed data
 datasets_preprocessed = ['Android', 'Linux', 'Mac', 'Windows']
 
+# With the event store of the trigger service (EVENT_DB), the counts it recorded from each preprocessed dataset
+# are queried from its index instead of reading the datasets again. Only the events of those files count, not
+# those of raw logs or /ingest; with --model-dir, the service recorded what its models flagged
+event_store = event_store_from_environment()
+if event_store is not None:
+    # The files the service reads, CSV or parquet
+    preprocessed_files = system_dataset_files('dataset/system-logs/multiple-system-log-dataset/preprocessed-data',
+                                              'preprocessed')
+    error_counts_preprocessed, warning_counts_preprocessed = [], []
+    for name in datasets_preprocessed:
+        source = event_source(preprocessed_files[name]) if name in preprocessed_files else None
+        counts = event_store.counts(name, source=source) if source is not None else {}
+        num_errors, num_warnings = counts.get(name, (0, 0))
+        error_counts_preprocessed.append(num_errors)
+        warning_counts_preprocessed.append(num_warnings)
+else:
+    # Read in the preprocessed data
+    df_mac_preprocessed = read_dataset('dataset/system-logs/multiple-system-log-dataset/preprocessed-data/Mac_preprocessed.csv', flag_columns)
+    df_win_preprocessed = read_dataset('dataset/system-logs/multiple-system-log-dataset/preprocessed-data/Windows_preprocessed.csv', flag_columns)
+    df_android_preprocessed = read_dataset('dataset/system-logs/multiple-system-log-dataset/preprocessed-data/Android_preprocessed.csv', flag_columns)
+    df_linux_preprocessed = read_dataset('dataset/system-logs/multiple-system-log-dataset/preprocessed-data/Linux_preprocessed.csv', flag_columns)
+
+    # Calculate the error and warning count for each dataset in the preprocessed data
+    error_counts_preprocessed = [df_android_preprocessed['error'].sum(), df_linux_preprocessed['error'].sum(),
+                                df_mac_preprocessed['error'].sum(), df_win_preprocessed['error'].sum()]
+    warning_counts_preprocessed = [df_android_preprocessed['warning'].sum(), df_linux_preprocessed['warning'].sum(),
+                                   df_mac_preprocessed['warning'].sum(), df_win_preprocessed['warning'].sum()]
+
 # Create subplots for preprocessed data
 fig, axes = plt.subplots(1, 2, figsize=(14, 6), dpi=600)
 
@@ -7,6 +7,8 @@
 import pandas as pd
 from datetime import datetime
 import re
+from storage import dataset_columns, read_dataset
+from timestamps import dataset_datetimes
 
 # Define the log file paths
 log_files = ['dataset/system-logs/multiple-system-log-dataset/extracted-data/Mac_extracted.csv', 
@@ -15,23 +17,20 @@ log_files = ['dataset/system-logs/multiple-system-log-dataset/extracted-data/Mac
              'dataset/system-logs/multiple-system-log-dataset/extracted-data/Linux_extracted.csv',
             ]
 
-# Define the timestamp regex pattern
-timestamp_regex = r'(?:\d{4}-\d{2}-\d{2}\s\d{2}:\d{2}:\d{2})|(?:\w{3}\s+\d{1,2}\s\d{2}:\d{2}:\d{2})|(?:\d{2}-\d{2}\s\d{2}:\d{2}:\d{2}\.\d{3})'
-
 # Load preprocessed log data
 df_logs = pd.DataFrame()
 for file in log_files:
     try:
-        df = pd.read_csv(file, usecols=['timestamp', 'tokens', 'error', 'warning'])
+        columns = [column for column in ['timestamp', 'tokens', 'error', 'warning', 'epoch'] if column in dataset_columns(file)]
+        df = read_dataset(file, columns=columns)
+        # Normalize the timestamps of each source on its own, reusing the epoch stored at extraction
+        df['timestamp'] = dataset_datetimes(df)
+        df = df.drop(columns=['epoch'], errors='ignore')
         df['Label'] = file.split('/')[-1].split('_')[0]
         df_logs = pd.concat([df_logs, df])
     except ValueError as e:
         print(f"Error: {e}. Skipping this file.")
 
-# Extract timestamp from the tokens column and convert to datetime object
-df_logs['timestamp'] = df_logs['tokens'].str.extract(f'({timestamp_regex})', expand=False)
-df_logs['timestamp'] = pd.to_datetime(df_logs['timestamp'], errors='coerce')
-
 # Summarize the log data
 for system, df in df_logs.groupby('Label'):
     num_errors = df['error'].sum()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import argparse
+import datetime
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+
+# Default location of the event database
+DEFAULT_EVENT_DB = 'events.sqlite'
+
+# Events buffered before they are written in one transaction, and the longest they wait
+DEFAULT_INSERT_BATCH = 5000
+DEFAULT_FLUSH_SECONDS = 1.0
+
+# Tables of the store. The indexes lead with (system, time), and the events one also covers the flags,
+# so counting a system's errors over a time range only reads the index. Events have no other index:
+# each one slows every insert down, and clearing a source only happens before a full re-read
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (system TEXT NOT NULL, epoch REAL, error INTEGER NOT NULL,
+                                   warning INTEGER NOT NULL, source TEXT);
+CREATE INDEX IF NOT EXISTS events_system_epoch ON events (system, epoch, error, warning);
+CREATE TABLE IF NOT EXISTS remediations (system TEXT NOT NULL, action TEXT, outcome TEXT NOT NULL,
+                                         started REAL NOT NULL, finished REAL, detail TEXT);
+CREATE INDEX IF NOT EXISTS remediations_system_started ON remediations (system, started);
+"""
+
+# Conditions and parameters of a query on a system and a time column between start and end
+def time_range(column, system_name=None, start=None, end=None):
+    conditions, parameters = [], []
+    for condition, value in (("system = ?", system_name), (f"{column} >= ?", start), (f"{column} < ?", end)):
+        if value is not None:
+            conditions.append(condition)
+            parameters.append(value)
+    return (" WHERE " + " AND ".join(conditions)) if conditions else "", parameters
+
+# Embedded store of the detected events and the remediation history
+class EventStore:
+    """Append classified events and remediation attempts to SQLite.
+
+    The database runs in WAL mode, so queries, e.g. from the HTTP threads
+    or another process, read while events are being written. Only the rows
+    flagged as an error or a warning are kept, with the system, the epoch of
+    their timestamp and the file or stream they came from. They are
+    buffered and inserted batch_size at a time, or once the oldest waited
+    flush_seconds, in a single transaction; flush writes the rest.
+    """
+
+    def __init__(self, path=DEFAULT_EVENT_DB, batch_size=DEFAULT_INSERT_BATCH, flush_seconds=DEFAULT_FLUSH_SECONDS):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.pending = []
+        self.pending_since = None
+        self.lock = threading.Lock()
+        self.connection = self.connect()
+        with self.lock:
+            self.connection.executescript(SCHEMA)
+
+    def connect(self):
+        connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        # Durable at checkpoints rather than every commit, which WAL keeps consistent
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    # Buffer the flagged rows of a chunk; errors and warnings are boolean arrays over its rows
+    def add_events(self, system_name, chunk, errors, warnings, source=None):
+        flagged = np.asarray(errors, dtype=bool) | np.asarray(warnings, dtype=bool)
+        if not flagged.any():
+            return
+        if 'epoch' in chunk:
+            values = chunk['epoch'].to_numpy(dtype=float, na_value=np.nan)[flagged]
+            epochs = values.astype(object)
+            # Unparsed timestamps are stored as NULL
+            epochs[np.isnan(values)] = None
+            epochs = epochs.tolist()
+        else:
+            epochs = [None] * int(flagged.sum())
+        rows = zip([system_name] * len(epochs), epochs, np.asarray(errors, dtype=int)[flagged].tolist(),
+                   np.asarray(warnings, dtype=int)[flagged].tolist(), [source] * len(epochs))
+        with self.lock:
+            self.pending.extend(rows)
+            if self.pending_since is None:
+                self.pending_since = time.monotonic()
+            due = len(self.pending) >= self.batch_size or time.monotonic() - self.pending_since >= self.flush_seconds
+        if due:
+            self.flush()
+
+    # Write the buffered events
+    def flush(self):
+        with self.lock:
+            if not self.pending:
+                return
+            with self.connection:
+                self.connection.executemany("INSERT INTO events VALUES (?, ?, ?, ?, ?)", self.pending)
+            self.pending = []
+            self.pending_since = None
+
+    # Drop the events of a system read from a source, before the source is read again from the start
+    def clear_source(self, system_name, source):
+        self.flush()
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM events WHERE system = ? AND source = ?", (system_name, source))
+
+    def record_remediation(self, system_name, action, outcome, started, finished=None, detail=None):
+        with self.lock, self.connection:
+            self.connection.execute("INSERT INTO remediations VALUES (?, ?, ?, ?, ?, ?)",
+                                    (system_name, action, outcome, started, finished, detail))
+
+    # Rows of a read-only query, on a connection of its own so readers never wait for the writer's lock
+    def query(self, sql, parameters=()):
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            return connection.execute(sql, parameters).fetchall()
+        finally:
+            connection.close()
+
+    # Errors and warnings of each system between the epochs start and end, {system: (errors, warnings)};
+    # with a source, only its events, e.g. those of one dataset file
+    def counts(self, system_name=None, start=None, end=None, source=None):
+        where, parameters = time_range('epoch', system_name, start, end)
+        if source is not None:
+            where += (" AND" if where else " WHERE") + " source = ?"
+            parameters.append(source)
+        rows = self.query(f"SELECT system, SUM(error), SUM(warning) FROM events{where} GROUP BY system", parameters)
+        return {system: (errors, warnings) for system, errors, warnings in rows}
+
+    # Events of a system between start and end, oldest first: (epoch, error, warning, source)
+    def events(self, system_name, start=None, end=None, limit=1000):
+        where, parameters = time_range('epoch', system_name, start, end)
+        return self.query(f"SELECT epoch, error, warning, source FROM events{where} ORDER BY epoch LIMIT ?",
+                          parameters + [limit])
+
+    # Remediation attempts started between start and end, newest first:
+    # (system, action, outcome, started, finished, detail)
+    def remediations(self, system_name=None, start=None, end=None, outcome=None, limit=100):
+        where, parameters = time_range('started', system_name, start, end)
+        if outcome is not None:
+            where += (" AND" if where else " WHERE") + " outcome = ?"
+            parameters.append(outcome)
+        return self.query(f"SELECT system, action, outcome, started, finished, detail FROM remediations{where} "
+                          f"ORDER BY started DESC LIMIT ?", parameters + [limit])
+
+    # The latest remediation of a system with the given outcome, or None
+    def last_remediation(self, system_name, outcome='completed'):
+        rows = self.remediations(system_name, outcome=outcome, limit=1)
+        return rows[0] if rows else None
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            self.connection.close()
+
+# Store at the given path or EVENT_DB, or None when recording is off (neither is set)
+def event_store_from_environment(path=None):
+    path = path or os.environ.get('EVENT_DB')
+    return EventStore(path) if path else None
+
+# Source of the events read from a file: its absolute path, so they can be queried from any directory
+def event_source(path):
+    return os.path.abspath(path)
+
+# Readable time of an epoch
+def format_epoch(epoch):
+    return '-' if epoch is None else datetime.datetime.fromtimestamp(epoch).isoformat(sep=' ', timespec='seconds')
+
+if __name__ == "__main__":
+    # Query the store from the command line, e.g. the errors of Linux in the last hour
+    parser = argparse.ArgumentParser(description="Query the event store of the trigger service")
+    parser.add_argument('--db', default=os.environ.get('EVENT_DB', DEFAULT_EVENT_DB),
+                        help="event database (default: $EVENT_DB or %(default)s)")
+    parser.add_argument('query', choices=['counts', 'events', 'remediations'])
+    parser.add_argument('--system', default=None)
+    parser.add_argument('--last', type=float, default=None, help="only the last this many seconds")
+    parser.add_argument('--outcome', default=None, help="only remediations with this outcome, e.g. completed")
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    store = EventStore(args.db)
+    start = None if args.last is None else time.time() - args.last
+    query_start = time.perf_counter()
+    if args.query == 'counts':
+        results = [(system, errors, warnings) for system, (errors, warnings) in sorted(store.counts(args.system, start).items())]
+        print(f"{'system':<10} {'errors':>10} {'warnings':>10}")
+        lines = [f"{system:<10} {errors:>10} {warnings:>10}" for system, errors, warnings in results]
+    elif args.query == 'events':
+        if args.system is None:
+            parser.error("events needs --system")
+        results = store.events(args.system, start, limit=args.limit)
+        lines = [f"{format_epoch(epoch)}  error={error} warning={warning}  {source}"
+                 for epoch, error, warning, source in results]
+    else:
+        results = store.remediations(args.system, start, outcome=args.outcome, limit=args.limit)
+        lines = [f"{format_epoch(started)}  {system:<8} {action or '-':<28} {outcome:<10} {detail or ''}"
+                 for system, action, outcome, started, finished, detail in results]
+    elapsed = time.perf_counter() - query_start
+    print('\n'.join(lines))
+    print(f"({len(results)} rows in {elapsed * 1000:.1f} ms)")
@@ -4,15 +4,24 @@
 # In[11]:
 
 
+import argparse
 import pandas as pd
 import os
 import matplotlib.pyplot as plt
+from storage import DATA_FORMATS, DEFAULT_DATA_FORMAT, dataset_file, read_dataset, write_dataset
+
+# Command line options
+parser = argparse.ArgumentParser(description="Preprocess the extracted log data and plot error and warning counts")
+parser.add_argument('--format', choices=list(DATA_FORMATS), default=DEFAULT_DATA_FORMAT,
+                    help="format of the extracted input and preprocessed output (default: %(default)s)")
+args = parser.parse_args()
 
 # Read in the log files
-df_mac = pd.read_csv('dataset/system-logs/multiple-system-log-dataset/extracted-data/Mac_extracted.csv')
-df_win = pd.read_csv('dataset/system-logs/multiple-system-log-dataset/extracted-data/Windows_extracted.csv')
-df_android = pd.read_csv('dataset/system-logs/multiple-system-log-dataset/extracted-data/Android_extracted.csv')
-df_linux = pd.read_csv('dataset/system-logs/multiple-system-log-dataset/extracted-data/Linux_extracted.csv')
+extracted_dir = 'dataset/system-logs/multiple-system-log-dataset/extracted-data'
+df_mac = read_dataset(dataset_file(extracted_dir, 'Mac', 'extracted', args.format))
+df_win = read_dataset(dataset_file(extracted_dir, 'Windows', 'extracted', args.format))
+df_android = read_dataset(dataset_file(extracted_dir, 'Android', 'extracted', args.format))
+df_linux = read_dataset(dataset_file(extracted_dir, 'Linux', 'extracted', args.format))
 
 # Concatenate the dataframes into a single dataframe
 df_logs = pd.concat([df_mac, df_win, df_android, df_linux])
@@ -21,23 +30,25 @@ df_logs = pd.concat([df_mac, df_win, df_android, df_linux])
 df_logs = df_logs.dropna(subset=['timestamp', 'tokens'])
 
 # Convert tokens column to string type
-df_logs['tokens'] = df_logs['tokens'].astype(str)
+# (the columnar format keeps tokens as real lists of strings)
+if args.format == 'csv':
+    df_logs['tokens'] = df_logs['tokens'].astype(str)
 
 # Fill missing error and warning values using forward fill
-df_logs['error'] = df_logs['error'].fillna(method='ffill')
-df_logs['warning'] = df_logs['warning'].fillna(method='ffill')
+df_logs['error'] = df_logs['error'].ffill()
+df_logs['warning'] = df_logs['warning'].ffill()
 
-# Extract only the columns we need
-df_logs = df_logs[['timestamp', 'tokens', 'error', 'warning']]
+# Extract only the columns we need (epoch is kept when extraction stored it)
+df_logs = df_logs[df_logs.columns.intersection(['timestamp', 'tokens', 'error', 'warning', 'epoch'])]
 
-# Save preprocessed data to CSV files for each system
+# Save preprocessed data for each system
 preprocessed_dir = 'dataset/system-logs/multiple-system-log-dataset/preprocessed-data'
 os.makedirs(preprocessed_dir, exist_ok=True)
 
-df_android.to_csv(os.path.join(preprocessed_dir, 'Android_preprocessed.csv'), index=False)
-df_linux.to_csv(os.path.join(preprocessed_dir, 'Linux_preprocessed.csv'), index=False)
-df_mac.to_csv(os.path.join(preprocessed_dir, 'Mac_preprocessed.csv'), index=False)
-df_win.to_csv(os.path.join(preprocessed_dir, 'Windows_preprocessed.csv'), index=False)
+write_dataset(df_android, dataset_file(preprocessed_dir, 'Android', 'preprocessed', args.format))
+write_dataset(df_linux, dataset_file(preprocessed_dir, 'Linux', 'preprocessed', args.format))
+write_dataset(df_mac, dataset_file(preprocessed_dir, 'Mac', 'preprocessed', args.format))
+write_dataset(df_win, dataset_file(preprocessed_dir, 'Windows', 'preprocessed', args.format))
 
 # Define the bar chart data for the extracted data
 systems_extracted = ['Android', 'Linux', 'Mac', 'Windows']
@@ -63,11 +74,12 @@ ax.set_xlabel('System')
 ax.set_ylabel('Number of Errors and Warnings (log scale)')
 ax.legend(loc='upper right', bbox_to_anchor=(1.20, 1))
 
-# Read in the preprocessed data
-df_android_preprocessed = pd.read_csv(os.path.join(preprocessed_dir, 'Android_preprocessed.csv'))
-df_linux_preprocessed = pd.read_csv(os.path.join(preprocessed_dir, 'Linux_preprocessed.csv'))
-df_mac_preprocessed = pd.read_csv(os.path.join(preprocessed_dir, 'Mac_preprocessed.csv'))
-df_win_preprocessed = pd.read_csv(os.path.join(preprocessed_dir, 'Windows_preprocessed.csv'))
+# Read in the preprocessed data (only the flag columns are needed for the counts)
+flag_columns = ['error', 'warning']
+df_android_preprocessed = read_dataset(dataset_file(preprocessed_dir, 'Android', 'preprocessed', args.format), flag_columns)
+df_linux_preprocessed = read_dataset(dataset_file(preprocessed_dir, 'Linux', 'preprocessed', args.format), flag_columns)
+df_mac_preprocessed = read_dataset(dataset_file(preprocessed_dir, 'Mac', 'preprocessed', args.format), flag_columns)
+df_win_preprocessed = read_dataset(dataset_file(preprocessed_dir, 'Windows', 'preprocessed', args.format), flag_columns)
 
 # Calculate the number of errors and warnings for each system in the preprocessed data
 num_errors_preprocessed = [df_android_preprocessed['error'].sum(),
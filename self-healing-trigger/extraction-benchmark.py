@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import argparse
+import os
+import tempfile
+import time
+from extraction import DEFAULT_CHUNKSIZE, extract_log_file_parallel
+
+# Count the lines of a log file so throughput can be reported in lines/sec
+def count_lines(log_file_path):
+    with open(log_file_path, 'rb') as f:
+        return sum(block.count(b'\n') for block in iter(lambda: f.read(1 << 20), b''))
+
+# Default worker counts: powers of two up to the number of CPU cores
+def default_worker_counts():
+    cpu_count = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= cpu_count:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cpu_count:
+        counts.append(cpu_count)
+    return counts
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure extraction throughput for different worker counts")
+    parser.add_argument('log_file', help="log file to extract, e.g. dataset/system-logs/Windows.log")
+    parser.add_argument('--workers', type=int, nargs='+', default=default_worker_counts(),
+                        help="worker counts to benchmark (default: powers of two up to the CPU count)")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument('--repeat', type=int, default=3, help="runs per worker count, the best one is reported")
+    args = parser.parse_args()
+
+    num_lines = count_lines(args.log_file)
+    print(f"{args.log_file}: {num_lines} lines, {os.path.getsize(args.log_file)} bytes")
+    print(f"{'workers':>8} {'seconds':>10} {'lines/sec':>14} {'speedup':>8}")
+
+    baseline = None
+    with tempfile.TemporaryDirectory() as output_dir:
+        output_file_name = os.path.join(output_dir, 'benchmark_extracted.csv')
+        for workers in args.workers:
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                extract_log_file_parallel(args.log_file, output_file_name, workers, chunksize=args.chunksize)
+                timings.append(time.perf_counter() - start)
+            elapsed = min(timings)
+            baseline = baseline or elapsed
+            print(f"{workers:>8} {elapsed:>10.3f} {num_lines / elapsed:>14,.0f} {baseline / elapsed:>7.2f}x")
@@ -0,0 +1,390 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import bz2
+import glob
+import gzip
+import io
+import lzma
+import os
+import pandas as pd
+import re
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from severity import DEFAULT_MATCHER, SEVERITY_LEVELS, WARNING_TOKENS
+from storage import DatasetWriter
+from templates import TemplateMiner
+from timestamps import TimestampParser
+from vocabulary import TokenArrays, TokenVocabulary, load_token_index, save_token_index, token_index_files
+
+# Timestamp formats found in the Mac, Windows and Android logs, compiled once
+TIMESTAMP_REGEX = re.compile(r'(?:\d{4}-\d{2}-\d{2}\s\d{2}:\d{2}:\d{2})|(?:\w{3}\s+\d{1,2}\s\d{2}:\d{2}:\d{2})|(?:\d{2}-\d{2}\s\d{2}:\d{2}:\d{2}\.\d{3})')
+
+# Syslog timestamp followed by the message, as found in the Linux log
+SYSLOG_ENTRY_REGEX = re.compile(r'(\w{3}\s+\d{1,2}\s\d{2}:\d{2}:\d{2}) ')
+
+# Strips everything up to the first "<something>: " prefix of a log line
+MESSAGE_PREFIX_REGEX = re.compile(r'^.*?:\s')
+
+# Columns written to every *_extracted.csv file; epoch holds the parsed timestamp in seconds
+EXTRACTED_COLUMNS = ['timestamp', 'tokens', 'error', 'warning', 'epoch']
+
+# Columns added when log templates are mined: the template id and the parameter tokens of each line
+TEMPLATE_COLUMNS = ['template_id', 'parameters']
+
+# Log format of each system's log: Linux logs carry syslog severities instead of ERROR/WARNING markers
+SYSTEM_LOG_FORMATS = {
+    'Mac': 'marker',
+    'Windows': 'marker',
+    'Android': 'marker',
+    'Linux': 'syslog',
+}
+
+# Number of log entries held in memory before a chunk is written out
+DEFAULT_CHUNKSIZE = 100000
+
+# Shards handed to each worker so that uneven shards still balance out
+SHARDS_PER_WORKER = 4
+
+# Magic bytes of the compression formats handled by the standard library
+COMPRESSION_MAGIC = {
+    'gzip': b'\x1f\x8b',
+    'bz2': b'BZh',
+    'xz': b'\xfd7zXZ\x00',
+}
+COMPRESSED_OPENERS = {'gzip': gzip.open, 'bz2': bz2.open, 'xz': lzma.open}
+
+# Suffix of a rotated segment: .N or -DATE, optionally followed by a compression extension
+ROTATED_SUFFIX_REGEX = re.compile(r'^(?:\.(\d+)|-([\d-]+))(?:\.gz|\.bz2|\.xz)?$')
+
+# Generator yielding (timestamp, log_message) for every error or warning line
+def iter_log_entries(lines):
+    for line in lines:
+        # Skip lines that don't contain errors or warnings
+        if 'ERROR' not in line and 'WARNING' not in line:
+            continue
+
+        # Extract timestamp and log message
+        timestamp = TIMESTAMP_REGEX.search(line)
+        if not timestamp:
+            continue
+
+        yield timestamp.group(0), MESSAGE_PREFIX_REGEX.sub('', line.strip())
+
+# Function to parse a syslog line into (timestamp, log_message, error, warning), or None
+def parse_syslog_line(line, matcher=DEFAULT_MATCHER):
+    log_match = SYSLOG_ENTRY_REGEX.search(line)
+    if not log_match:
+        return None
+    log_message = line[log_match.end(1):].strip()
+    error, warning = matcher.classify(log_message)
+    return log_match.group(1), log_message, error, warning
+
+# Generator yielding (timestamp, log_message, error, warning) for every syslog line
+def iter_syslog_entries(lines, matcher=DEFAULT_MATCHER):
+    for line in lines:
+        entry = parse_syslog_line(line, matcher)
+        if entry is not None:
+            yield entry
+
+# Group log entries into DataFrames of at most chunksize rows
+def chunk_log_entries(entries, chunksize=DEFAULT_CHUNKSIZE, columns=('timestamp', 'log_message')):
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= chunksize:
+            yield pd.DataFrame(batch, columns=list(columns))
+            batch = []
+    if batch:
+        yield pd.DataFrame(batch, columns=list(columns))
+
+# Raw stream over the byte range [start, end) of an open binary file
+class ByteRangeReader(io.RawIOBase):
+    def __init__(self, raw, start, end):
+        self.raw = raw
+        self.remaining = end - start
+        self.raw.seek(start)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.remaining <= 0:
+            return 0
+        data = self.raw.read(min(len(buffer), self.remaining))
+        buffer[:len(data)] = data
+        self.remaining -= len(data)
+        return len(data)
+
+    def close(self):
+        self.raw.close()
+        super().close()
+
+# Detect the compression of a file from its magic bytes, or None for plain text
+def detect_compression(log_file_path):
+    with open(log_file_path, 'rb') as f:
+        head = f.read(max(len(magic) for magic in COMPRESSION_MAGIC.values()))
+    for compression, magic in COMPRESSION_MAGIC.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+# Open a byte range of a log file as text, decoded the same way as a full read
+# Compressed files are stream-decompressed and can only be read as a whole
+def open_log_range(log_file_path, start=0, end=None):
+    compression = detect_compression(log_file_path)
+    if compression is not None:
+        if start != 0 or end is not None:
+            raise ValueError(f"{log_file_path} is {compression}-compressed and can't be read by byte range")
+        raw = COMPRESSED_OPENERS[compression](log_file_path, 'rb')
+        return io.TextIOWrapper(raw, encoding="utf8", errors='ignore')
+    if end is None:
+        end = os.path.getsize(log_file_path)
+    reader = ByteRangeReader(open(log_file_path, 'rb'), start, end)
+    return io.TextIOWrapper(io.BufferedReader(reader), encoding="utf8", errors='ignore')
+
+# Stream a log file as fixed-size DataFrame chunks of (timestamp, log_message)
+def iter_log_chunks(log_file_path, chunksize=DEFAULT_CHUNKSIZE, start=0, end=None):
+    with open_log_range(log_file_path, start, end) as f:
+        yield from chunk_log_entries(iter_log_entries(f), chunksize)
+
+# Function to parse a whole log file into a single DataFrame
+def parse_log_file(log_file_path):
+    with open_log_range(log_file_path) as f:
+        log_entries = list(iter_log_entries(f))
+    return pd.DataFrame(log_entries, columns=['timestamp', 'log_message'])
+
+# Token column of a series of log messages. Without a vocabulary, the list of each message's tokens.
+# With one, each message is split once and its tokens encoded into it: their id arrays are appended to
+# token_parts and the column only holds each list's string form, as stored in CSV files, so no per-row
+# lists are kept
+def tokenize_messages(messages, vocabulary=None, token_parts=None):
+    if vocabulary is None:
+        return messages.str.split()
+    token_strings = []
+    token_parts.append(vocabulary.encode_texts(messages, token_strings))
+    return pd.Series(token_strings, index=messages.index)
+
+# Replace the messages of parsed syslog entries, already flagged, by their tokens
+def tokenize_syslog(log_df, vocabulary=None, token_parts=None):
+    log_df.insert(1, 'tokens', tokenize_messages(log_df.pop('log_message'), vocabulary, token_parts))
+    return log_df
+
+# Function to preprocess log data for machine learning classification
+def preprocess_logs(log_df, vocabulary=None, token_parts=None):
+    # Tokenize log messages
+    log_df['tokens'] = tokenize_messages(log_df['log_message'], vocabulary, token_parts)
+
+    # Extract relevant features
+    log_df['error'] = log_df['log_message'].apply(lambda x: 1 if 'ERROR' in x else 0)
+    log_df['warning'] = log_df['log_message'].apply(lambda x: 1 if 'WARNING' in x else 0)
+
+    # Drop irrelevant columns
+    log_df = log_df.drop(columns=['log_message'])
+
+    return log_df
+
+# Columns of an extracted dataset, with or without mined templates
+def extracted_columns(templates=False):
+    return EXTRACTED_COLUMNS + TEMPLATE_COLUMNS if templates else EXTRACTED_COLUMNS
+
+# Append extracted chunks to a CSV or parquet file, writing the header only once
+def write_chunks(chunks, output_file_name, columns=EXTRACTED_COLUMNS):
+    num_entries = 0
+    writer = DatasetWriter(output_file_name)
+    try:
+        for chunk in chunks:
+            writer.write(chunk)
+            num_entries += len(chunk)
+    finally:
+        # Keep the header-only output of an empty extraction
+        writer.close(columns)
+
+    return num_entries
+
+# Extracted DataFrame chunks of an iterable of log lines in the given log format
+# 'marker': lines flagged by ERROR/WARNING markers (Mac, Windows, Android)
+# 'syslog': every syslog line, flagged by the severity matcher (Linux)
+# Timestamps are normalized once here into the epoch column, assuming year when they carry none
+# With a TemplateMiner, each line also gets its template id and parameters
+# With a TokenVocabulary, the tokens are encoded as they are parsed and their arrays collected in token_parts
+def iter_extracted_line_chunks(lines, log_format='marker', chunksize=DEFAULT_CHUNKSIZE, year=None, miner=None,
+                               timestamp_parser=None, vocabulary=None, token_parts=None):
+    if log_format == 'syslog':
+        chunks = (tokenize_syslog(chunk, vocabulary, token_parts)
+                  for chunk in chunk_log_entries(iter_syslog_entries(lines), chunksize,
+                                                 ['timestamp', 'log_message', 'error', 'warning']))
+    elif log_format == 'marker':
+        chunks = (preprocess_logs(chunk, vocabulary, token_parts)
+                  for chunk in chunk_log_entries(iter_log_entries(lines), chunksize))
+    else:
+        raise ValueError(f"Unknown log format: {log_format}")
+
+    if timestamp_parser is None:
+        timestamp_parser = TimestampParser(year)
+    for chunk in chunks:
+        chunk['epoch'] = timestamp_parser.epochs(chunk['timestamp'])
+        if miner is not None:
+            # Encoded chunks only hold the tokens' string form; the miner gets them back from the ids, row by row
+            token_lists = chunk['tokens'] if vocabulary is None else \
+                (token_parts[-1].decode(vocabulary, i) for i in range(len(chunk)))
+            chunk['template_id'], chunk['parameters'] = miner.add_all(token_lists)
+        yield chunk
+
+# Stream extracted DataFrame chunks of (a byte range of) a log file in the given log format
+def iter_extracted_chunks(log_file_path, log_format='marker', chunksize=DEFAULT_CHUNKSIZE, start=0, end=None, year=None,
+                          miner=None, vocabulary=None, token_parts=None):
+    if log_format not in ('syslog', 'marker'):
+        raise ValueError(f"Unknown log format: {log_format}")
+    with open_log_range(log_file_path, start, end) as f:
+        yield from iter_extracted_line_chunks(f, log_format, chunksize, year, miner, vocabulary=vocabulary,
+                                              token_parts=token_parts)
+
+# Everything besides the input files that the extracted output of a log format depends on,
+# used to tell whether a cached extraction is still valid
+def extraction_parameters(log_format, year=None, templates=False, index_tokens=False):
+    parameters = {
+        'log_format': log_format,
+        'columns': extracted_columns(templates),
+        'year': datetime.now().year if year is None else year,
+        'index_tokens': index_tokens,
+    }
+    if log_format == 'syslog':
+        parameters.update(entry_regex=SYSLOG_ENTRY_REGEX.pattern,
+                          severity_levels=SEVERITY_LEVELS, warning_tokens=list(WARNING_TOKENS))
+    else:
+        parameters.update(timestamp_regex=TIMESTAMP_REGEX.pattern, message_prefix_regex=MESSAGE_PREFIX_REGEX.pattern)
+    return parameters
+
+# Extract a log file chunk by chunk so memory depends on chunksize, not file size
+def extract_log_file(log_file_path, output_file_name, chunksize=DEFAULT_CHUNKSIZE, log_format='marker', year=None,
+                     template_file=None, index_tokens=False):
+    return extract_log_files([log_file_path], output_file_name, 1, chunksize, log_format, year, template_file,
+                             index_tokens)
+
+# Rotated segments of a log, oldest first: numbered ones (Linux.log.3.gz, Linux.log.2, ...),
+# then dated ones (Linux.log-20240101.gz, ...), then the live log itself
+def find_log_segments(log_file_path):
+    segments = []
+    for path in glob.glob(glob.escape(log_file_path) + '[.-]*'):
+        rotation = ROTATED_SUFFIX_REGEX.match(path[len(log_file_path):])
+        if rotation and os.path.isfile(path):
+            number, date = rotation.groups()
+            segments.append(((0, -int(number), '') if number else (1, 0, date), path))
+    segments = [path for _, path in sorted(segments)]
+    if os.path.exists(log_file_path):
+        segments.append(log_file_path)
+    return segments
+
+# Split a file into num_shards byte ranges that start right after a newline
+# A compressed file is a single shard (start 0, end None) that is decompressed as a stream
+def find_shard_boundaries(log_file_path, num_shards):
+    if detect_compression(log_file_path) is not None:
+        return [(0, None)]
+    file_size = os.path.getsize(log_file_path)
+    boundaries = [0]
+    with open(log_file_path, 'rb') as f:
+        for i in range(1, num_shards):
+            # Move to the first line that starts at or after the even split point
+            f.seek(max(file_size * i // num_shards - 1, boundaries[-1]))
+            f.readline()
+            position = f.tell()
+            if position >= file_size:
+                break
+            if position > boundaries[-1]:
+                boundaries.append(position)
+    boundaries.append(file_size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+# Worker: extract one byte range of a log file into a part file
+# Templates and token ids start from copies of the saved tables; the shard's own are saved next to the part
+def extract_shard(log_file_path, start, end, part_file_name, chunksize=DEFAULT_CHUNKSIZE, log_format='marker', year=None,
+                  template_file=None, vocabulary_file=None):
+    miner = None
+    if template_file is not None:
+        miner = TemplateMiner.load(template_file)
+        miner.reset_counts()
+    vocabulary, token_parts = None, []
+    if vocabulary_file is not None:
+        vocabulary = TokenVocabulary.load(vocabulary_file)
+    chunks = iter_extracted_chunks(log_file_path, log_format, chunksize, start, end, year, miner, vocabulary, token_parts)
+    num_entries = write_chunks(chunks, part_file_name, extracted_columns(miner is not None))
+    if miner is not None:
+        miner.save(f"{part_file_name}.templates.json")
+    if vocabulary_file is not None:
+        save_token_index(part_file_name, TokenArrays.concatenate(token_parts), vocabulary)
+    return num_entries
+
+# Extract one or more log files (e.g. the rotated segments of one source, oldest first)
+# into a single output. With several workers, plain files are split into byte-range shards and
+# compressed segments are decompressed one per worker; the parts are merged in their original order.
+# With a template_file, log templates are mined into that table, which keeps its ids across runs.
+# With index_tokens, the token ids of every row and the vocabulary are saved next to the output.
+def extract_log_files(log_file_paths, output_file_name, workers=1, chunksize=DEFAULT_CHUNKSIZE, log_format='marker', year=None,
+                      template_file=None, index_tokens=False):
+    columns = extracted_columns(template_file is not None)
+    miner = None
+    if template_file is not None:
+        # Ids of known templates are kept, their counts restart with the rebuilt output
+        miner = TemplateMiner.load(template_file)
+        miner.reset_counts()
+    vocabulary_file = token_index_files(output_file_name)[1] if index_tokens else None
+    # Known tokens keep their ids too
+    vocabulary, token_parts = TokenVocabulary.load(vocabulary_file), []
+
+    if workers <= 1:
+        chunks = (chunk for log_file_path in log_file_paths
+                  for chunk in iter_extracted_chunks(log_file_path, log_format, chunksize, year=year, miner=miner,
+                                                     vocabulary=vocabulary if index_tokens else None,
+                                                     token_parts=token_parts))
+        num_entries = write_chunks(chunks, output_file_name, columns)
+        if miner is not None:
+            miner.save(template_file)
+        if index_tokens:
+            save_token_index(output_file_name, TokenArrays.concatenate(token_parts), vocabulary)
+        return num_entries
+
+    shards = [(log_file_path, start, end) for log_file_path in log_file_paths
+              for start, end in find_shard_boundaries(log_file_path, workers * SHARDS_PER_WORKER)]
+    output_dir = os.path.dirname(output_file_name) or '.'
+    parts_dir = tempfile.mkdtemp(prefix='.shards-', dir=output_dir)
+    try:
+        extension = os.path.splitext(output_file_name)[1]
+        part_file_names = [os.path.join(parts_dir, f"{i:05d}{extension}") for i in range(len(shards))]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(extract_shard, log_file_path, start, end, part_file_name, chunksize, log_format, year,
+                                       template_file, vocabulary_file)
+                       for (log_file_path, start, end), part_file_name in zip(shards, part_file_names)]
+            num_entries = sum(future.result() for future in futures)
+
+        # Write the header once and append the parts in shard order,
+        # renumbering the templates each shard found into the shared table
+        known = 0 if miner is None else len(miner.templates)
+        writer = DatasetWriter(output_file_name)
+        try:
+            for part_file_name in part_file_names:
+                id_map = {}
+                if miner is not None:
+                    id_map = miner.merge(TemplateMiner.load(f"{part_file_name}.templates.json"), known)
+                writer.append_file(part_file_name, {'template_id': id_map} if id_map else None)
+                if index_tokens:
+                    part_arrays, part_vocabulary = load_token_index(part_file_name)
+                    token_parts.append(part_arrays.remap(vocabulary.mapping(part_vocabulary)))
+        finally:
+            writer.close(columns)
+        if miner is not None:
+            miner.save(template_file)
+        if index_tokens:
+            save_token_index(output_file_name, TokenArrays.concatenate(token_parts), vocabulary)
+    finally:
+        shutil.rmtree(parts_dir, ignore_errors=True)
+
+    return num_entries
+
+# Extract a log file in parallel shards and merge them back in their original order
+def extract_log_file_parallel(log_file_path, output_file_name, workers, chunksize=DEFAULT_CHUNKSIZE, log_format='marker', year=None,
+                              template_file=None, index_tokens=False):
+    return extract_log_files([log_file_path], output_file_name, workers, chunksize, log_format, year, template_file,
+                             index_tokens)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+
+# One core: numerical libraries would otherwise spread a batch over every core
+for variable in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+    os.environ.setdefault(variable, '1')
+
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from inference import (DEFAULT_INFERENCE_BATCH_SIZE, DEFAULT_PROBABILITY_CUTOFF, TARGET_BATCH_P50_SECONDS,
+                       TARGET_BATCH_P99_SECONDS, ModelScorer, load_model)
+from storage import read_dataset
+
+# Rows per second a single core should score
+TARGET_ROWS_PER_SECOND = 100000
+
+# Repeat the rows of a dataset until it has at least num_rows of them
+def repeat_rows(df, num_rows):
+    copies = -(-num_rows // max(len(df), 1))
+    return pd.concat([df] * copies, ignore_index=True) if copies > 1 else df
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the scoring throughput and per-batch latency of a model")
+    parser.add_argument('model_file', help="persisted pipeline, e.g. models/Linux_error_model.pkl")
+    parser.add_argument('dataset', help="rows to score, e.g. dataset/system-logs/multiple-system-log-dataset/"
+                                        "preprocessed-data/Linux_preprocessed.csv")
+    parser.add_argument('--target', default='error', help="column the model predicts (default: %(default)s)")
+    parser.add_argument('--batch-size', type=int, nargs='+', default=[1000, DEFAULT_INFERENCE_BATCH_SIZE, 50000],
+                        help="batch sizes to benchmark (default: %(default)s)")
+    parser.add_argument('--rows', type=int, default=200000, help="rows scored per run (default: %(default)s)")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per batch size, the best one is reported")
+    args = parser.parse_args()
+
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, {min(os.sched_getaffinity(0))})
+    model = load_model(args.model_file)
+    df = repeat_rows(read_dataset(args.dataset), args.rows).iloc[:args.rows]
+    print(f"{args.model_file}: {len(df)} rows of {args.dataset} on one core")
+    print(f"{'batch':>8} {'rows/sec':>12} {'p50 ms':>9} {'p99 ms':>9}  targets")
+
+    for batch_size in args.batch_size:
+        scorer = ModelScorer(model, 'benchmark', args.target, DEFAULT_PROBABILITY_CUTOFF, batch_size)
+        best, latencies = None, []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            for batch_start in range(0, len(df), batch_size):
+                batch_time = time.perf_counter()
+                scorer.count(df.iloc[batch_start:batch_start + batch_size])
+                latencies.append(time.perf_counter() - batch_time)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        rows_per_second = len(df) / best
+        p50, p99 = np.percentile(latencies, [50, 99])
+        # Latency targets apply to batches of the default size; smaller or larger ones only report theirs
+        met = [rows_per_second >= TARGET_ROWS_PER_SECOND]
+        if batch_size <= DEFAULT_INFERENCE_BATCH_SIZE:
+            met += [p50 <= TARGET_BATCH_P50_SECONDS, p99 <= TARGET_BATCH_P99_SECONDS]
+        print(f"{batch_size:>8} {rows_per_second:>12,.0f} {p50 * 1000:>9.1f} {p99 * 1000:>9.1f}  "
+              f"{'met' if all(met) else 'missed'}")
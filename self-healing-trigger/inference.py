@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import numpy as np
+import os
+import time
+from prometheus_client import Counter, Histogram
+
+# Directory of the persisted classification pipelines, e.g. models/Linux_error_model.pkl as saved by
+# pycaret's save_model in the *-data-classification-model-analysis.py scripts
+DEFAULT_MODEL_DIR = 'models'
+
+# Targets a system can have a model of; a target without one falls back to summing its flag column
+MODEL_TARGETS = ('error', 'warning')
+
+# Columns every mode provides for a row: daemon mode and /ingest extract rows themselves, so the models
+# the trigger service loads should be trained on these alone
+MODEL_INPUT_COLUMNS = ('tokens',) + MODEL_TARGETS
+
+# Rows scored per call of the model, and seconds received rows wait before a partial batch is scored
+DEFAULT_INFERENCE_BATCH_SIZE = 10000
+DEFAULT_FLUSH_SECONDS = 1.0
+
+# Probability above which a row counts as an error (or warning)
+DEFAULT_PROBABILITY_CUTOFF = 0.5
+
+# Per-batch latency the scoring of a batch of the default size should stay within, i.e. 100,000 rows per second
+# on one core, checked by inference-benchmark.py
+TARGET_BATCH_P50_SECONDS = 0.1
+TARGET_BATCH_P99_SECONDS = 0.25
+
+# Metrics of the scoring
+INFERENCE_BATCH_LATENCY = Histogram("inference_batch_latency_seconds", "Time to score one batch of rows",
+                                    ["system", "target"],
+                                    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.2, 0.5, 1, 2.5))
+INFERENCE_ROWS = Counter("inference_rows", "Number of rows scored by a model", ["system", "target"])
+
+# Name of the model of a system's target, as passed to pycaret's save_model, which adds the .pkl
+def model_name(model_dir, system_name, target):
+    return os.path.join(model_dir, f"{system_name}_{target}_model")
+
+def model_file(model_dir, system_name, target):
+    return f"{model_name(model_dir, system_name, target)}.pkl"
+
+# Load a persisted pipeline; pycaret pipelines need pycaret installed to be unpickled
+def load_model(path):
+    try:
+        import joblib
+    except ImportError:
+        raise ImportError("Loading models needs joblib: pip install scikit-learn")
+    return joblib.load(path)
+
+# Columns of a chunk in the form the models were trained on: token lists are stored as their
+# string form in the preprocessed datasets, so freshly extracted lists are converted the same way
+def model_features(chunk, columns):
+    features = chunk[columns] if columns is not None else chunk
+    if 'tokens' in features and len(features) and isinstance(features['tokens'].iloc[0], (list, tuple)):
+        features = features.assign(tokens=features['tokens'].map(str))
+    return features
+
+# Scores rows with a loaded model in vectorized batches
+class ModelScorer:
+    """Count the rows a classification pipeline predicts as positive.
+
+    The model is loaded once; rows are scored batch_size at a time with a
+    single predict_proba call per batch, and a row counts when the predicted
+    probability of the positive class is above cutoff. Only the columns the
+    model was fitted on are passed to it, so the target and other columns of
+    a chunk can stay in place.
+    """
+
+    def __init__(self, model, system_name, target, cutoff=DEFAULT_PROBABILITY_CUTOFF,
+                 batch_size=DEFAULT_INFERENCE_BATCH_SIZE):
+        self.model = model
+        self.system_name = system_name
+        self.target = target
+        self.cutoff = cutoff
+        self.batch_size = batch_size
+        names = getattr(model, 'feature_names_in_', None)
+        self.columns = None if names is None else list(names)
+        classes = list(getattr(model, 'classes_', [0, 1]))
+        self.positive = classes.index(1) if 1 in classes else len(classes) - 1
+        self.reported_missing = False
+        self.latency = INFERENCE_BATCH_LATENCY.labels(system=system_name, target=target)
+        self.rows = INFERENCE_ROWS.labels(system=system_name, target=target)
+
+    # Columns a chunk needs for this model, None when the model doesn't tell
+    def required_columns(self):
+        return self.columns
+
+    # Whether a chunk has every column the model was fitted on; the first chunk without them is reported
+    def can_score(self, chunk):
+        missing = [column for column in self.columns or () if column not in chunk]
+        if missing and not self.reported_missing:
+            print(f"Rows of {self.system_name} lack {missing}, which its {self.target} model needs; "
+                  f"counting their {self.target} flags instead")
+            self.reported_missing = True
+        return not missing
+
+    # Probability of the positive class for every row of a chunk
+    def probabilities(self, chunk):
+        features = model_features(chunk, self.columns)
+        if self.columns is None:
+            features = features.drop(columns=[self.target], errors='ignore')
+        results = [np.empty(0)]
+        for start in range(0, len(features), self.batch_size):
+            batch = features.iloc[start:start + self.batch_size]
+            batch_start = time.perf_counter()
+            results.append(self.model.predict_proba(batch)[:, self.positive])
+            self.latency.observe(time.perf_counter() - batch_start)
+            self.rows.inc(len(batch))
+        return np.concatenate(results)
+
+    # Whether each row of a chunk is predicted positive
+    def predict(self, chunk):
+        return self.probabilities(chunk) > self.cutoff
+
+    # Number of rows of a chunk predicted positive
+    def count(self, chunk):
+        return int(self.predict(chunk).sum())
+
+# Scorers of every model found in a directory, {system: {target: ModelScorer}}
+def load_scorers(model_dir, cutoff=DEFAULT_PROBABILITY_CUTOFF, batch_size=DEFAULT_INFERENCE_BATCH_SIZE, systems=()):
+    scorers = {}
+    for system_name in systems:
+        for target in MODEL_TARGETS:
+            path = model_file(model_dir, system_name, target)
+            if os.path.exists(path):
+                scorers.setdefault(system_name, {})[target] = ModelScorer(load_model(path), system_name, target,
+                                                                          cutoff, batch_size)
+                print(f"Loaded the {target} model of {system_name} from {path}")
+    return scorers
+
+# Error and warning masks over the rows of a chunk: predicted by the system's models where it has them and the chunk
+# has their columns, else the flags
+def classify_chunk(scorers, system_name, chunk):
+    models = scorers.get(system_name, {})
+    return tuple(models[target].predict(chunk) if target in models and models[target].can_score(chunk)
+                 else chunk[target].to_numpy(dtype=bool) for target in MODEL_TARGETS)
+
+# Error and warning counts of a chunk
+def count_chunk(scorers, system_name, chunk):
+    return tuple(int(mask.sum()) for mask in classify_chunk(scorers, system_name, chunk))
+
+# Columns to read from a dataset so the system's models can score it, None for all of them
+def scoring_columns(scorers, system_name):
+    models = scorers.get(system_name)
+    if not models:
+        return list(MODEL_TARGETS)
+    columns = set(MODEL_TARGETS)
+    for scorer in models.values():
+        if scorer.required_columns() is None:
+            return None
+        columns.update(scorer.required_columns())
+    return sorted(columns)
+
+# Scorers of the models in the given directory or INFERENCE_MODEL_DIR, {} when scoring is off (neither is set);
+# the cutoff and batch size default to INFERENCE_CUTOFF and INFERENCE_BATCH_SIZE
+def scorers_from_environment(systems, model_dir=None, cutoff=None, batch_size=None):
+    model_dir = model_dir or os.environ.get('INFERENCE_MODEL_DIR')
+    if not model_dir:
+        return {}
+    if cutoff is None:
+        cutoff = float(os.environ.get('INFERENCE_CUTOFF', DEFAULT_PROBABILITY_CUTOFF))
+    if batch_size is None:
+        batch_size = int(os.environ.get('INFERENCE_BATCH_SIZE', DEFAULT_INFERENCE_BATCH_SIZE))
+    scorers = load_scorers(model_dir, cutoff, batch_size, systems)
+    if not scorers:
+        print(f"No models found in {model_dir}, counting the error and warning flags")
+    return scorers
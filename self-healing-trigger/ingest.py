@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import json
+import math
+import threading
+import time
+from prometheus_client import Counter, Gauge, Histogram
+from extraction import SYSTEM_LOG_FORMATS, iter_extracted_line_chunks
+from timestamps import TimestampParser
+
+# A system's lines are handled once this many are waiting, or once the oldest waited DEFAULT_MAX_DELAY seconds
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_MAX_DELAY = 1.0
+
+# Lines accepted but not yet handled, beyond which requests are turned away
+DEFAULT_MAX_PENDING_LINES = 100000
+
+# Largest request body accepted, in bytes; larger ones are refused before they are read
+DEFAULT_MAX_BODY_BYTES = 64 * 1024 * 1024
+
+# Bounds of the Retry-After advertised when the queue is full, in seconds
+MIN_RETRY_AFTER = 1
+MAX_RETRY_AFTER = 60
+
+# Metrics of the ingest endpoint
+INGESTED_LINES = Counter("ingested_lines", "Number of log lines received through the ingest endpoint", ["system"])
+INGEST_REJECTED_LINES = Counter("ingest_rejected_lines", "Number of log lines turned away because the queue was full",
+                                ["system"])
+INGEST_PENDING_LINES = Gauge("ingest_pending_lines", "Number of log lines received but not yet classified")
+INGEST_BATCH_LATENCY = Histogram("ingest_batch_latency_seconds",
+                                 "Time from the first line of a batch being received to the batch being classified",
+                                 buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60))
+
+# Lines of an ingest request body, {system: [line, ...]}
+# NDJSON bodies hold one object per line, {"line": ..., "system": ...}, where the system defaults to default_system;
+# any other body is plain text with one log line per line, all of default_system
+def parse_ingest_body(body, content_type, default_system=None):
+    lines = {}
+    ndjson = content_type is not None and content_type.split(';')[0].strip() in ('application/x-ndjson',
+                                                                                 'application/jsonl')
+    for number, text in enumerate(body.splitlines(), 1):
+        if not text.strip():
+            continue
+        system_name = default_system
+        if ndjson:
+            try:
+                record = json.loads(text)
+            except ValueError:
+                raise ValueError(f"Line {number} is not valid JSON")
+            if not isinstance(record, dict) or not isinstance(record.get('line'), str):
+                raise ValueError(f"Line {number} has no \"line\" string")
+            system_name, text = record.get('system', default_system), record['line']
+        if system_name is None:
+            raise ValueError(f"Line {number} has no system; pass ?system= or a \"system\" field")
+        lines.setdefault(system_name, []).append(text)
+    return lines
+
+# Errors and warnings of an extracted chunk, from its flags
+def count_flags(system_name, chunk):
+    return int(chunk['error'].sum()), int(chunk['warning'].sum())
+
+# Groups received lines per system into micro-batches and classifies them off the request threads
+class MicroBatcher:
+    """Classify received log lines in micro-batches.
+
+    Request threads hand over lines and return at once; a background thread
+    flushes a system's lines when batch_size of them are waiting or the
+    oldest waited max_delay seconds, extracts them like log-extraction.py
+    does, counts the errors and warnings of the extracted rows with
+    count_chunk(system_name, chunk) (by default the sums of their flags) and
+    calls handle_counts(system_name, errors, warnings). At most
+    max_pending_lines wait at a time: submit refuses more, and retry_after
+    estimates when there will be room again from the recent throughput.
+    A request's lines are queued for all of its systems or for none.
+    """
+
+    def __init__(self, handle_counts, batch_size=DEFAULT_BATCH_SIZE, max_delay=DEFAULT_MAX_DELAY,
+                 max_pending_lines=DEFAULT_MAX_PENDING_LINES, system_log_formats=SYSTEM_LOG_FORMATS, year=None,
+                 count_chunk=None):
+        self.handle_counts = handle_counts
+        self.count_chunk = count_chunk or count_flags
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.max_pending_lines = max_pending_lines
+        self.system_log_formats = system_log_formats
+        self.timestamp_parser = TimestampParser(year)
+        self.batches = {}
+        self.num_pending = 0
+        self.lines_per_second = None
+        self.flushing = False
+        self.changed = threading.Condition()
+        self.thread = None
+
+    # Whether a request of num_lines lines can ever be queued, however empty the queue
+    def fits(self, num_lines):
+        return num_lines <= self.max_pending_lines
+
+    # Queue the lines of a request, {system: [line, ...]}, all at once; False when there is no room for all of them
+    def submit(self, lines):
+        for system_name in lines:
+            if system_name not in self.system_log_formats:
+                raise ValueError(f"Unknown system: {system_name}")
+        num_lines = sum(len(system_lines) for system_lines in lines.values())
+        with self.changed:
+            if self.num_pending + num_lines > self.max_pending_lines:
+                for system_name, system_lines in lines.items():
+                    INGEST_REJECTED_LINES.labels(system=system_name).inc(len(system_lines))
+                return False
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True, name="ingest")
+                self.thread.start()
+            now = time.monotonic()
+            for system_name, system_lines in lines.items():
+                batch = self.batches.setdefault(system_name, {'lines': [], 'since': now})
+                batch['lines'].extend(system_lines)
+                INGESTED_LINES.labels(system=system_name).inc(len(system_lines))
+            self.num_pending += num_lines
+            INGEST_PENDING_LINES.set(self.num_pending)
+            self.changed.notify()
+        return True
+
+    # Seconds after which a refused request is likely to fit
+    def retry_after(self):
+        with self.changed:
+            if not self.lines_per_second:
+                return MIN_RETRY_AFTER
+            excess = self.num_pending - self.max_pending_lines / 2
+            return min(MAX_RETRY_AFTER, max(MIN_RETRY_AFTER, math.ceil(excess / self.lines_per_second)))
+
+    # Wait until every accepted line has been classified; False when some are still waiting after timeout seconds
+    def join(self, timeout=None):
+        with self.changed:
+            # Flush the waiting batches now instead of after their delay
+            self.flushing = True
+            self.changed.notify_all()
+            return self.changed.wait_for(lambda: self.num_pending == 0, timeout)
+
+    # Batches due at time now, removed from the waiting ones, and the seconds until the next one is due
+    def take_due(self, now):
+        due, next_due = [], None
+        for system_name, batch in list(self.batches.items()):
+            deadline = batch['since'] + self.max_delay
+            if self.flushing or len(batch['lines']) >= self.batch_size or deadline <= now:
+                due.append((system_name, self.batches.pop(system_name)))
+            else:
+                next_due = deadline - now if next_due is None else min(next_due, deadline - now)
+        return due, next_due
+
+    def run(self):
+        while True:
+            with self.changed:
+                due, next_due = self.take_due(time.monotonic())
+                if not due:
+                    self.changed.wait(next_due)
+                    continue
+            for system_name, batch in due:
+                self.classify(system_name, batch)
+
+    # Extract a batch of one system and hand its counts on
+    def classify(self, system_name, batch):
+        start = time.monotonic()
+        num_errors = num_warnings = 0
+        try:
+            for chunk in iter_extracted_line_chunks(batch['lines'], self.system_log_formats[system_name],
+                                                    self.batch_size, timestamp_parser=self.timestamp_parser):
+                chunk_errors, chunk_warnings = self.count_chunk(system_name, chunk)
+                num_errors += chunk_errors
+                num_warnings += chunk_warnings
+            self.handle_counts(system_name, num_errors, num_warnings)
+        except Exception as e:
+            print(f"Error classifying ingested lines of {system_name}: {e}")
+        finally:
+            end = time.monotonic()
+            INGEST_BATCH_LATENCY.observe(end - batch['since'])
+            with self.changed:
+                self.num_pending -= len(batch['lines'])
+                INGEST_PENDING_LINES.set(self.num_pending)
+                self.changed.notify_all()
+                # Throughput of the recent batches, smoothed
+                rate = len(batch['lines']) / max(end - start, 1e-3)
+                self.lines_per_second = rate if self.lines_per_second is None else 0.8 * self.lines_per_second + 0.2 * rate
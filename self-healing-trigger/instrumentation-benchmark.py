@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from instrumentation import STAGE_DURATION, record_throughput, timed_chunks
+from storage import iter_dataset
+
+# Chunks of num_rows flagged rows each, like those the trigger service reads from a preprocessed dataset
+def synthetic_chunks(num_chunks, num_rows, seed=0):
+    generator = np.random.default_rng(seed)
+    return [pd.DataFrame({'error': pd.array(generator.integers(0, 2, num_rows), dtype='Int8'),
+                          'warning': pd.array(generator.integers(0, 2, num_rows), dtype='Int8')})
+            for _ in range(num_chunks)]
+
+# Sum the flags of every chunk, the aggregation the metrics are compared against
+def sum_chunks(chunks):
+    num_errors = num_warnings = 0
+    for chunk in chunks:
+        num_errors += int(chunk['error'].sum())
+        num_warnings += int(chunk['warning'].sum())
+    return num_errors, num_warnings
+
+# The same sums, observed the way count_flagged_rows observes them: the load stage through timed_chunks,
+# the aggregate stage once per pass and the throughput of the pass
+def sum_chunks_instrumented(chunks):
+    start = time.perf_counter()
+    num_rows = num_errors = num_warnings = 0
+    aggregate_seconds = 0.0
+    for chunk in timed_chunks(chunks):
+        aggregate_start = time.perf_counter()
+        num_rows += len(chunk)
+        num_errors += int(chunk['error'].sum())
+        num_warnings += int(chunk['warning'].sum())
+        aggregate_seconds += time.perf_counter() - aggregate_start
+    STAGE_DURATION.labels(stage='aggregate').observe(aggregate_seconds)
+    record_throughput('benchmark', num_rows, 0, time.perf_counter() - start)
+    return num_errors, num_warnings
+
+# Best of repeat runs of a function over the chunks, in seconds
+def best_time(function, chunks, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(chunks)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the overhead of the stage metrics on summing the flags")
+    parser.add_argument('dataset', nargs='?',
+                        help="preprocessed dataset whose chunks are summed (default: random flags)")
+    parser.add_argument('--chunksize', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="rows per chunk (default: %(default)s)")
+    parser.add_argument('--rows', type=int, default=1000000,
+                        help="rows of random flags summed per run without a dataset (default: %(default)s)")
+    parser.add_argument('--repeat', type=int, default=5, help="runs per chunk size, the best one is reported")
+    args = parser.parse_args()
+
+    print(f"{'chunk rows':>10} {'chunks':>8} {'plain ms':>10} {'metrics ms':>11} {'µs/chunk':>9} {'overhead':>9}")
+    for chunksize in args.chunksize:
+        if args.dataset is not None:
+            chunks = list(iter_dataset(args.dataset, columns=['error', 'warning'], chunksize=chunksize))
+        else:
+            chunks = synthetic_chunks(max(args.rows // chunksize, 1), chunksize)
+        plain = best_time(sum_chunks, chunks, args.repeat)
+        instrumented = best_time(sum_chunks_instrumented, chunks, args.repeat)
+        overhead = instrumented - plain
+        print(f"{chunksize:>10} {len(chunks):>8} {plain * 1000:>10.2f} {instrumented * 1000:>11.2f} "
+              f"{overhead / len(chunks) * 1e6:>9.1f} {overhead / plain:>9.1%}")
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import time
+from prometheus_client import Counter, Gauge, Histogram
+
+# Buckets of the stage durations, from a small appended chunk to a full reload of a large dataset
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Metrics of the detection stages. They are observed once per file or cycle, never per row,
+# so their cost doesn't grow with the size of the logs
+STAGE_DURATION = Histogram("stage_duration_seconds",
+                           "Duration of a detection stage: load, aggregate and decision per system, cycle per pass",
+                           ["stage"], buckets=STAGE_BUCKETS)
+ROWS_PER_SECOND = Gauge("rows_processed_per_second", "Rows read and aggregated per second in the last pass of a system",
+                        ["system"])
+BYTES_READ = Counter("bytes_read", "Bytes of log and dataset files read", ["system"])
+LAST_SUCCESSFUL_CYCLE = Gauge("last_successful_cycle_timestamp_seconds",
+                              "Unix time at which the last detection cycle completed")
+
+# Pass the chunks through, observing the time spent producing them as one run of the stage
+# Polls that find nothing new aren't observed, so they don't drown the durations of actual loads
+def timed_chunks(chunks, stage='load'):
+    elapsed = 0.0
+    produced = False
+    iterator = iter(chunks)
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                chunk = next(iterator)
+            finally:
+                elapsed += time.perf_counter() - start
+            produced = True
+            yield chunk
+    except StopIteration:
+        return
+    finally:
+        if produced:
+            STAGE_DURATION.labels(stage=stage).observe(elapsed)
+
+# Bytes a follower read between two checkpoints of a file: the advance of the byte offset, or everything up to
+# the new offset when the file was replaced or truncated. Parquet checkpoints keep a row offset instead, so the
+# bytes of the rows read are estimated from their share of the file
+def consumed_bytes(before, after):
+    if after is None:
+        return 0
+    replaced = before is None or before['inode'] != after['inode']
+    if not after['offset'] and after.get('rows'):
+        previous_rows = 0 if replaced or before['rows'] > after['rows'] else before['rows']
+        return after['size'] * (after['rows'] - previous_rows) // after['rows']
+    if replaced or after['offset'] < before['offset']:
+        return after['offset']
+    return after['offset'] - before['offset']
+
+# Record the rows, bytes and time of loading and aggregating one system
+def record_throughput(system_name, num_rows, num_bytes, seconds):
+    BYTES_READ.labels(system=system_name).inc(num_bytes)
+    if seconds > 0:
+        ROWS_PER_SECOND.labels(system=system_name).set(num_rows / seconds)
+
+# Mark a detection cycle as completed
+def cycle_completed():
+    LAST_SUCCESSFUL_CYCLE.set_to_current_time()
@@ -4,160 +4,123 @@
 # In[1]:
 
 
-import pandas as pd
+import argparse
 import os
-import re
+import time
+from extraction import DEFAULT_CHUNKSIZE, SYSTEM_LOG_FORMATS, extract_log_files, extraction_parameters, find_log_segments
+from log_follow import DEFAULT_CHECKPOINT_FILE, extract_log_file_incremental, load_checkpoints, save_checkpoints
+from storage import DATA_FORMATS, DEFAULT_DATA_FORMAT, dataset_file
+from stage_cache import CACHE_FILE_NAME, StageCache
+from templates import template_file_for
+from vocabulary import token_index_files
+
+if __name__ == "__main__":
+    # Command line options
+    parser = argparse.ArgumentParser(description="Extract errors and warnings from the system logs")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE,
+                        help="number of log entries held in memory per chunk (default: %(default)s)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="processes used to extract shards of each log file in parallel (default: %(default)s)")
+    parser.add_argument('--follow', action='store_true',
+                        help="only parse bytes appended since the last run, tracked in a checkpoint file")
+    parser.add_argument('--interval', type=float, default=5,
+                        help="seconds between polls in follow mode, 0 to poll once and exit (default: %(default)s)")
+    parser.add_argument('--checkpoint-file', default=DEFAULT_CHECKPOINT_FILE,
+                        help="where follow mode keeps the byte offset and inode of each log (default: %(default)s)")
+    parser.add_argument('--include-rotated', action='store_true',
+                        help="also extract rotated segments such as Linux.log.1 or Linux.log.2.gz, oldest first")
+    parser.add_argument('--format', choices=list(DATA_FORMATS), default=DEFAULT_DATA_FORMAT,
+                        help="output format of the extracted data (default: %(default)s)")
+    parser.add_argument('--year', type=int, default=None,
+                        help="year assumed for syslog and Android timestamps, which carry none (default: current year)")
+    parser.add_argument('--templates', action='store_true',
+                        help="mine log templates: add template_id and parameters columns and keep *.templates.json tables")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="extract every log even when its segments and the extraction settings are unchanged")
+    parser.add_argument('--token-index', action='store_true',
+                        help="also save the token ids of every row (*.tokens.npz) and the token vocabulary (*.vocabulary.json)")
+    args = parser.parse_args()
+    if args.follow and args.format != 'csv':
+        parser.error("--follow appends rows to existing files and needs --format csv")
+    if args.follow and args.include_rotated:
+        parser.error("--follow only tracks the live log files, drop --include-rotated")
+    if args.follow and args.token_index:
+        parser.error("--token-index is built by full runs, drop --follow")
+
+    # Define log files to process and the format each one is written in
+    log_files = {f'dataset/system-logs/{system_name}.log': log_format
+                 for system_name, log_format in SYSTEM_LOG_FORMATS.items()}
+
+    output_directory = "dataset/system-logs/multiple-system-log-dataset/extracted-data/"
+    os.makedirs(output_directory, exist_ok=True)  # Create output directory if it doesn't exist
 
-# Function to parse log file and extract relevant information
-def parse_log_file(log_file_path):
-    # Open log file
-    with open(log_file_path, 'r', encoding="utf8", errors='ignore') as f:
-        log_lines = f.readlines()
-
-    # Extract relevant information from log lines
-    log_entries = []
-    for line in log_lines:
-        # Skip lines that don't contain errors or warnings
-        if 'ERROR' not in line and 'WARNING' not in line:
-            continue
-
-        # Extract timestamp and log message
-        timestamp_regex = r'(?:\d{4}-\d{2}-\d{2}\s\d{2}:\d{2}:\d{2})|(?:\w{3}\s+\d{1,2}\s\d{2}:\d{2}:\d{2})|(?:\d{2}-\d{2}\s\d{2}:\d{2}:\d{2}\.\d{3})'
-        timestamp = re.search(timestamp_regex, line)
-        if not timestamp:
-            continue
-        timestamp = timestamp.group(0)
-
-        log_message = re.sub(r'^.*?:\s', '', line.strip())
-
-        # Add log entry to list
-        log_entries.append((timestamp, log_message))
-
-    # Convert log entries into a Pandas DataFrame
-    log_df = pd.DataFrame(log_entries, columns=['timestamp', 'log_message'])
-
-    return log_df
-
-# Function to preprocess log data for machine learning classification
-def preprocess_logs(log_df):
-    # Tokenize log messages
-    log_df['tokens'] = log_df['log_message'].str.split()
-
-    # Extract relevant features
-    log_df['error'] = log_df['log_message'].apply(lambda x: 1 if 'ERROR' in x else 0)
-    log_df['warning'] = log_df['log_message'].apply(lambda x: 1 if 'WARNING' in x else 0)
-
-    # Drop irrelevant columns
-    log_df = log_df.drop(columns=['log_message'])
-
-    return log_df
-
-# Define log files to process
-log_files = ['dataset/system-logs/Mac.log', 'dataset/system-logs/Windows.log', 'dataset/system-logs/Android.log']
-
-# Process each log file and save results as CSV file
-for log_file in log_files:
     # Determine output file name based on input file name
-    file_name = os.path.basename(log_file)
-    output_file_name = f"dataset/system-logs/multiple-system-log-dataset/extracted-data/{os.path.splitext(file_name)[0]}_extracted.csv"
-
-    # Parse log file and preprocess data
-    log_df = parse_log_file(log_file)
-    processed_df = preprocess_logs(log_df)
-
-    # Save processed data as CSV file
-    processed_df.to_csv(output_file_name, index=False)
-
-    # Print information about the generated dataset
-    print(f"{output_file_name} generated with {len(processed_df)} entries")
-    
-# For Linux extraction
-# Function to parse log entry and extract relevant information
-def parse_log_entry(log_entry, severity_levels):
-    timestamp_regex = r'(\w{3}\s+\d{1,2}\s\d{2}:\d{2}:\d{2})'
-    log_match = re.search(timestamp_regex, log_entry)
-    if log_match:
-        timestamp = log_match.group(1)
-        log_message = log_entry[log_match.end():].strip()
-        tokens = log_message.split()  # Tokenize the log_message
-
-        # Set initial error and warning values to 0
-        error = 0
-        warning = 0
-
-        # Check for severity levels and assign labels
-        for pattern, label in severity_levels.items():
-            if re.search(pattern, log_message, re.IGNORECASE):  # Make the search case-insensitive
-                if label in ['error', 'emergency', 'critical']:
-                    error = 1
-                elif label == 'warning':
-                    warning = 1
-                elif label == 'alert':
-                    warning = 1
-                break
-
-        return timestamp, tokens, error, warning
+    def output_file_for(log_file):
+        file_name = os.path.basename(log_file)
+        return dataset_file(output_directory, os.path.splitext(file_name)[0], 'extracted', args.format)
+
+    if args.follow:
+        # Follow mode: append the rows of newly written lines on every poll
+        checkpoints = load_checkpoints(args.checkpoint_file)
+        try:
+            while True:
+                for log_file, log_format in log_files.items():
+                    if not os.path.exists(log_file):
+                        continue
+                    output_file_name = output_file_for(log_file)
+                    template_file = template_file_for(output_file_name) if args.templates else None
+                    num_entries = extract_log_file_incremental(log_file, output_file_name, checkpoints,
+                                                               chunksize=args.chunksize, log_format=log_format,
+                                                               year=args.year, template_file=template_file)
+                    save_checkpoints(checkpoints, args.checkpoint_file)
+                    if num_entries:
+                        print(f"{output_file_name} appended with {num_entries} entries")
+                if args.interval <= 0:
+                    break
+                time.sleep(args.interval)
+        except KeyboardInterrupt:
+            print("Stopped following the system logs.")
     else:
-        return None, None, None, None
-
-# Define the severity level keywords and their corresponding labels
-severity_levels = {
-    r'(EMERG|PANIC)': 'emergency',
-    r'\b(ALERT|alert)\b': 'alert',           # Make 'ALERT' a whole word match (case-insensitive)
-    r'(CRIT|CRITICAL)': 'critical',
-    r'(ERR|ERROR|FAILED)': 'error', # Make 'FAILED' case-sensitive
-    r'(WARNING|WARN)': 'warning',
-    r'NOTICE': 'notice',
-    r'(INFO|INFORMATIONAL)': 'info',
-    r'DEBUG': 'debug',
-}
-
-# Define log file to process - make sure it points to the correct file path
-log_file = 'dataset/system-logs/Linux.log'
-
-# Read log entries from the file using a regex pattern
-with open(log_file, 'r', encoding='utf8', errors='ignore') as f:
-    log_content = f.read()
-    log_entries = re.findall(r'\w{3}\s+\d{1,2}\s\d{2}:\d{2}:\d{2} .*', log_content)
-
-# Create a list to store all log entries
-all_log_entries = []
-
-# Process each log entry and store results in the list
-for log_entry in log_entries:
-    # Parse log entry and extract relevant information
-    timestamp, tokens, error, warning = parse_log_entry(log_entry, severity_levels)
-
-    # Check if timestamp and tokens are None (no relevant data found in the log entry)
-    if timestamp is None or tokens is None:
-        continue  # Skip processing this log entry
-
-    # Find 'ALERT' in tokens and set the corresponding warning flag to 1
-    if 'ALERT' in tokens:
-        warning = 1
-
-    # Append the log entry to the list
-    all_log_entries.append({
-        'timestamp': timestamp,
-        'tokens': tokens,
-        'error': error,
-        'warning': warning
-    })
-
-# Convert the list of log entries into a DataFrame
-all_log_entries_df = pd.DataFrame(all_log_entries, columns=['timestamp', 'tokens', 'error', 'warning'])
-
-# Determine output file name based on input file name
-file_name = os.path.basename(log_file)
-output_directory = "dataset/system-logs/multiple-system-log-dataset/extracted-data/"
-os.makedirs(output_directory, exist_ok=True)  # Create output directory if it doesn't exist
-output_file_name = os.path.join(output_directory, f"{os.path.splitext(file_name)[0]}_extracted.csv")
-
-# Save all log entries as CSV file
-all_log_entries_df.to_csv(output_file_name, index=False)
-
-# Print information about the generated dataset
-print(f"{output_file_name} generated with {len(all_log_entries_df)} entries")
+        # A full rebuild invalidates any follow mode checkpoints for these logs
+        checkpoints = load_checkpoints(args.checkpoint_file)
+        if [checkpoints.pop(log_file) for log_file in log_files if log_file in checkpoints]:
+            save_checkpoints(checkpoints, args.checkpoint_file)
+
+        # Outputs whose logs and extraction settings are unchanged since they were written are reused
+        stage_cache = StageCache(os.path.join(output_directory, CACHE_FILE_NAME))
+
+        # Process each log file chunk by chunk and stream the results to a CSV file
+        for log_file, log_format in log_files.items():
+            output_file_name = output_file_for(log_file)
+
+            # Plain or compressed (gzip, bz2, xz) segments of the log, oldest first
+            log_segments = find_log_segments(log_file) if args.include_rotated else [log_file]
+            log_segments = [log_segment for log_segment in log_segments if os.path.exists(log_segment)]
+            if not log_segments:
+                print(f"Skipped: {log_file} not found")
+                continue
+
+            template_file = template_file_for(output_file_name) if args.templates else None
+            output_files = [output_file_name]
+            if template_file is not None:
+                output_files.append(template_file)
+            if args.token_index:
+                output_files.extend(token_index_files(output_file_name))
+            cache_key = stage_cache.key('extract', log_segments,
+                                        extraction_parameters(log_format, args.year, args.templates, args.token_index))
+            if not args.no_cache and stage_cache.is_fresh(output_files, cache_key):
+                print(f"{output_file_name} is up to date")
+                continue
+
+            # Parse, preprocess and save the log file, split across the requested number of workers
+            num_entries = extract_log_files(log_segments, output_file_name, args.workers,
+                                            chunksize=args.chunksize, log_format=log_format, year=args.year,
+                                            template_file=template_file, index_tokens=args.token_index)
+            stage_cache.record(output_files, cache_key)
+            stage_cache.save()
+
+            # Print information about the generated dataset
+            print(f"{output_file_name} generated with {num_entries} entries")
 
 
 # In[ ]:
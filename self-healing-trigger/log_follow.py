@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import pandas as pd
+import hashlib
+import json
+import os
+from extraction import DEFAULT_CHUNKSIZE, detect_compression, extracted_columns, find_log_segments, iter_extracted_chunks
+from storage import dataset_columns
+from templates import TemplateMiner
+
+# Default location of the byte-offset checkpoints, next to the extracted data
+DEFAULT_CHECKPOINT_FILE = 'dataset/system-logs/multiple-system-log-dataset/extracted-data/.extraction-checkpoints.json'
+
+# Leading bytes hashed to recognise a file that was replaced or truncated and regrown
+HEAD_BYTES = 1024
+
+# Block size used when scanning backwards for the last complete line
+SCAN_BLOCK_SIZE = 1 << 16
+
+# Load the per-source checkpoints, or start with none
+def load_checkpoints(checkpoint_file):
+    if not os.path.exists(checkpoint_file):
+        return {}
+    with open(checkpoint_file, 'r', encoding='utf8') as f:
+        return json.load(f)
+
+# Save the checkpoints atomically so a crash never leaves a half-written file
+def save_checkpoints(checkpoints, checkpoint_file):
+    temp_file = f"{checkpoint_file}.tmp"
+    with open(temp_file, 'w', encoding='utf8') as f:
+        json.dump(checkpoints, f, indent=2, sort_keys=True)
+    os.replace(temp_file, checkpoint_file)
+
+# Hash of the first bytes of a file, used to tell an appended file from a new one
+def head_digest(log_file_path, length):
+    with open(log_file_path, 'rb') as f:
+        return hashlib.sha1(f.read(min(length, HEAD_BYTES))).hexdigest()
+
+# Offset just past the last newline in [start, end), or start when there is no complete line
+def last_line_end(log_file_path, start, end):
+    with open(log_file_path, 'rb') as f:
+        position = end
+        while position > start:
+            block_start = max(start, position - SCAN_BLOCK_SIZE)
+            f.seek(block_start)
+            index = f.read(position - block_start).rfind(b'\n')
+            if index >= 0:
+                return block_start + index + 1
+            position = block_start
+    return start
+
+# Decide where to resume reading a source, detecting rotation and truncation
+def resume_offset(log_file_path, stat, checkpoint):
+    if checkpoint is None:
+        return 0
+    if checkpoint['inode'] != stat.st_ino or stat.st_size < checkpoint['offset']:
+        print(f"{log_file_path} was rotated or truncated, reading it from the start")
+        return 0
+    if checkpoint['offset'] and head_digest(log_file_path, checkpoint['offset']) != checkpoint['head']:
+        print(f"{log_file_path} was replaced, reading it from the start")
+        return 0
+    return checkpoint['offset']
+
+# Byte range (segment, start, end) of the lines a log got after its checkpoint and before it was rotated away,
+# or None. A log rotated by renaming keeps its inode, so the segment holding them is the rotated one with the
+# checkpointed inode; a segment that was compressed since is a new file, and those lines are lost
+def rotated_remainder(log_file_path, stat, checkpoint):
+    if checkpoint is None or checkpoint['inode'] == stat.st_ino:
+        return None
+    for segment in find_log_segments(log_file_path):
+        if segment == log_file_path:
+            continue
+        segment_stat = os.stat(segment)
+        if segment_stat.st_ino != checkpoint['inode'] or segment_stat.st_size < checkpoint['offset']:
+            continue
+        if checkpoint['offset'] and head_digest(segment, checkpoint['offset']) != checkpoint['head']:
+            continue
+        if segment_stat.st_size > checkpoint['offset']:
+            print(f"{log_file_path} was rotated, reading the rest of {segment} before the new log")
+            return segment, checkpoint['offset'], segment_stat.st_size
+        return None
+    print(f"{log_file_path} was rotated and its old segment is gone or compressed; lines written to it after "
+          f"the checkpoint are skipped")
+    return None
+
+# Checkpoint of a log read up to a byte offset
+def make_checkpoint(log_file_path, stat, offset):
+    return {
+        'inode': stat.st_ino,
+        'offset': offset,
+        'head': head_digest(log_file_path, offset),
+    }
+
+# Checkpoint a log at its last complete line without reading it, so only lines written later are followed
+def skip_to_end(log_file_path, checkpoints):
+    stat = os.stat(log_file_path)
+    checkpoints[log_file_path] = make_checkpoint(log_file_path, stat, last_line_end(log_file_path, 0, stat.st_size))
+
+# Extracted chunks of the complete lines appended since the last checkpoint, moving the checkpoint past them
+def iter_appended_chunks(log_file_path, checkpoints, chunksize=DEFAULT_CHUNKSIZE, log_format='marker', year=None):
+    if detect_compression(log_file_path) is not None:
+        raise ValueError(f"{log_file_path} is compressed; follow mode needs the live, uncompressed log")
+    stat = os.stat(log_file_path)
+    checkpoint = checkpoints.get(log_file_path)
+    remainder = rotated_remainder(log_file_path, stat, checkpoint)
+    if remainder is not None:
+        segment, segment_start, segment_end = remainder
+        yield from iter_extracted_chunks(segment, log_format, chunksize, segment_start, segment_end, year)
+    start = resume_offset(log_file_path, stat, checkpoint)
+    end = last_line_end(log_file_path, start, stat.st_size)
+    if end > start:
+        yield from iter_extracted_chunks(log_file_path, log_format, chunksize, start, end, year)
+    checkpoints[log_file_path] = make_checkpoint(log_file_path, stat, end)
+
+# Extract only the complete lines appended since the last checkpoint
+def extract_log_file_incremental(log_file_path, output_file_name, checkpoints,
+                                 chunksize=DEFAULT_CHUNKSIZE, log_format='marker', year=None, template_file=None):
+    if detect_compression(log_file_path) is not None:
+        raise ValueError(f"{log_file_path} is compressed; follow mode needs the live, uncompressed log")
+    stat = os.stat(log_file_path)
+    columns = extracted_columns(template_file is not None)
+    checkpoint = checkpoints.get(log_file_path)
+    # An output that is gone or was written with other columns is rebuilt from the start
+    if checkpoint is not None and (not os.path.exists(output_file_name) or dataset_columns(output_file_name) != columns):
+        print(f"{output_file_name} is missing or has other columns than {columns}, rebuilding it")
+        checkpoint = None
+    remainder = rotated_remainder(log_file_path, stat, checkpoint)
+    start = resume_offset(log_file_path, stat, checkpoint)
+    end = last_line_end(log_file_path, start, stat.st_size)
+
+    # A source seen for the first time starts a fresh output file
+    if checkpoint is None or not os.path.exists(output_file_name):
+        pd.DataFrame(columns=columns).to_csv(output_file_name, index=False)
+
+    # Lines the log got before it was rotated come first, then those of the new log
+    ranges = [] if remainder is None else [remainder]
+    if end > start:
+        ranges.append((log_file_path, start, end))
+
+    num_entries = 0
+    if ranges:
+        miner = None if template_file is None else TemplateMiner.load(template_file)
+        for path, range_start, range_end in ranges:
+            for chunk in iter_extracted_chunks(path, log_format, chunksize, range_start, range_end, year, miner):
+                chunk.to_csv(output_file_name, mode='a', header=False, index=False)
+                num_entries += len(chunk)
+        # The table is saved before the checkpoint moves on, so every appended id is in it
+        if miner is not None:
+            miner.save(template_file)
+
+    checkpoints[log_file_path] = make_checkpoint(log_file_path, stat, end)
+    return num_entries
@@ -10,12 +10,15 @@
 # In[1]:
 
 
-import pandas as pd
-from pycaret.classification import setup, compare_models, tune_model, finalize_model, predict_model
+import os
+from inference import DEFAULT_MODEL_DIR, MODEL_INPUT_COLUMNS, model_name
+from storage import read_dataset
+from pycaret.classification import setup, compare_models, tune_model, finalize_model, predict_model, save_model
 
-# Load Mac dataset
+# Load Mac dataset: only the columns the trigger service has in every mode, so the saved model can score
+# rows from daemon mode and /ingest too
 file_path = 'dataset/system-logs/multiple-system-log-dataset/preprocessed-data/Mac_preprocessed.csv'
-df = pd.read_csv(file_path)
+df = read_dataset(file_path, columns=list(MODEL_INPUT_COLUMNS))
 
 # Check class distribution
 print("Class distribution in Mac:")
@@ -33,6 +36,10 @@ final_model = finalize_model(tuned_best_model)
 print("Final tuned model performance for Mac:")
 predict_model(final_model)
 
+# Persist the pipeline, so the trigger service can score rows with it (--model-dir models)
+os.makedirs(DEFAULT_MODEL_DIR, exist_ok=True)
+save_model(final_model, model_name(DEFAULT_MODEL_DIR, 'Mac', 'error'))
+
 
 # In[ ]:
 
@@ -5,7 +5,6 @@
 
 
 import numpy as np
-import pandas as pd
 import matplotlib.pyplot as plt
 from sklearn.naive_bayes import MultinomialNB
 from sklearn.preprocessing import MinMaxScaler
@@ -14,6 +13,7 @@ from sklearn.discriminant_analysis import LinearDiscriminantAnalysis
 from sklearn.ensemble import GradientBoostingClassifier
 from sklearn.metrics import accuracy_score
 from pycaret.classification import setup, compare_models, evaluate_model, pull
+from storage import read_dataset
 
 # Function to perform analysis with Multinomial Naive Bayes
 def mnb_self_healing(data, labels, system_name):
@@ -75,7 +75,7 @@ datasets = {
 # Assuming the CSV files are structured with 'Error', 'Warning', and 'Label' columns
 for system_name, csv_file in datasets.items():
     print(f"\nRunning analysis for {system_name}")
-    df = pd.read_csv(csv_file)  # Load your dataset here
+    df = read_dataset(csv_file)  # Load your dataset here
     
     # Check class distribution before filtering
     print(f"Class distribution for {system_name} before filtering:")
@@ -85,7 +85,8 @@ for system_name, csv_file in datasets.items():
     min_class_count = 2
     value_counts = df['Label'].value_counts()
     to_replace = value_counts[value_counts < min_class_count].index
-    df['Label'] = df['Label'].replace(to_replace, 'Other')
+    # (Label is loaded as a category, which only takes values it already knows)
+    df['Label'] = df['Label'].astype(object).replace(to_replace, 'Other')
     
     # Check class distribution after handling infrequent classes
     print(f"Class distribution for {system_name} after handling infrequent classes:")
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import argparse
+import importlib.util
+import os
+import sys
+from extraction import DEFAULT_CHUNKSIZE, EXTRACTED_COLUMNS, SYSTEM_LOG_FORMATS, find_log_segments, iter_extracted_chunks
+from service import HTTPServer, stop_on_signals
+from storage import DATA_FORMATS, DEFAULT_DATA_FORMAT, FLAG_COLUMNS, DatasetWriter, dataset_file
+
+# Default locations, relative to the self-healing-trigger directory like the other scripts
+DEFAULT_LOG_DIR = 'dataset/system-logs'
+
+# Columns kept by the preprocessing stage
+PREPROCESSED_COLUMNS = ['timestamp', 'tokens', 'error', 'warning', 'epoch']
+
+# The trigger service is a script with a hyphenated name, so it is loaded from its path
+TRIGGER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'classify-errors-and-trigger-self-healing.py')
+TRIGGER_MODULE = 'self_healing_trigger'
+
+# Load the trigger service once; its Prometheus metrics are registered on import
+def load_trigger_module():
+    if TRIGGER_MODULE not in sys.modules:
+        spec = importlib.util.spec_from_file_location(TRIGGER_MODULE, TRIGGER_SCRIPT)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[TRIGGER_MODULE] = module
+        spec.loader.exec_module(module)
+    return sys.modules[TRIGGER_MODULE]
+
+# Stage 1: extracted chunks of one system's log, oldest rotated segment first
+def extract_stage(log_file, log_format, chunksize=DEFAULT_CHUNKSIZE, year=None, include_rotated=False):
+    log_segments = find_log_segments(log_file) if include_rotated else [log_file]
+    for log_segment in log_segments:
+        yield from iter_extracted_chunks(log_segment, log_format, chunksize, year=year)
+
+# Stage 2: the steps of preprocessing.py applied chunk by chunk
+def preprocess_stage(chunks):
+    last_flags = {}
+    for chunk in chunks:
+        # Drop any rows with missing timestamps or tokens
+        chunk = chunk.dropna(subset=['timestamp', 'tokens'])
+
+        # Fill missing error and warning values forward, carrying the last value over from the previous chunk
+        for column in FLAG_COLUMNS:
+            values = chunk[column].ffill()
+            if column in last_flags:
+                values = values.fillna(last_flags[column])
+            if values.notna().any():
+                last_flags[column] = values[values.notna()].iloc[-1]
+            chunk[column] = values
+
+        # Extract only the columns we need
+        yield chunk[chunk.columns.intersection(PREPROCESSED_COLUMNS)]
+
+# Optional stage: write the chunks passing through to a dataset file, without holding them back
+def save_stage(chunks, output_file_name, columns):
+    writer = DatasetWriter(output_file_name)
+    try:
+        for chunk in chunks:
+            writer.write(chunk)
+            yield chunk
+    finally:
+        # Keep the header-only output of an empty stage
+        writer.close(columns)
+
+# Errors and warnings of a chunk, from its flags
+def count_flags(chunk):
+    return tuple(int(chunk[column].sum()) for column in FLAG_COLUMNS)
+
+# Stage 3: number of entries, errors and warnings of a system, counted by count_chunk(chunk) (by default the
+# sums of the flags)
+def aggregate_stage(chunks, count_chunk=count_flags):
+    totals = {'entries': 0, **dict.fromkeys(FLAG_COLUMNS, 0)}
+    for chunk in chunks:
+        totals['entries'] += len(chunk)
+        for column, count in zip(FLAG_COLUMNS, count_chunk(chunk)):
+            totals[column] += count
+    return totals
+
+# Run extract -> preprocess -> aggregate -> trigger for every system in one process.
+# Chunks flow between the stages in memory; the extracted and preprocessed datasets
+# are only written when a directory is given for them.
+def run_pipeline(log_dir=DEFAULT_LOG_DIR, system_log_formats=SYSTEM_LOG_FORMATS, chunksize=DEFAULT_CHUNKSIZE, year=None,
+                 include_rotated=False, extracted_dir=None, preprocessed_dir=None, data_format=DEFAULT_DATA_FORMAT,
+                 trigger=True, error_threshold=None, warning_threshold=None):
+    trigger_module = load_trigger_module() if trigger else None
+    system_totals = {}
+    for system_name, log_format in system_log_formats.items():
+        log_file = os.path.join(log_dir, f"{system_name}.log")
+        if not (find_log_segments(log_file) if include_rotated else os.path.exists(log_file)):
+            print(f"Skipped: {log_file} not found")
+            continue
+
+        chunks = extract_stage(log_file, log_format, chunksize, year, include_rotated)
+        if extracted_dir is not None:
+            chunks = save_stage(chunks, dataset_file(extracted_dir, system_name, 'extracted', data_format), EXTRACTED_COLUMNS)
+        chunks = preprocess_stage(chunks)
+        if preprocessed_dir is not None:
+            chunks = save_stage(chunks, dataset_file(preprocessed_dir, system_name, 'preprocessed', data_format),
+                                PREPROCESSED_COLUMNS)
+        count_chunk = count_flags
+        if trigger_module is not None:
+            # Counted like the trigger service counts: with the system's models when it has them, recording
+            # the events; each run reads the whole log, so it replaces the events of the previous one
+            source = trigger_module.event_source(log_file)
+            if trigger_module.EVENTS is not None:
+                trigger_module.EVENTS.clear_source(system_name, source)
+            count_chunk = lambda chunk: trigger_module.count_system_chunk(system_name, chunk, source)
+        totals = system_totals[system_name] = aggregate_stage(chunks, count_chunk)
+        if trigger_module is not None and trigger_module.EVENTS is not None:
+            trigger_module.EVENTS.flush()
+
+        print(f"\nProcessing data for {system_name}...")
+        print(f"Entries: {totals['entries']}")
+        if trigger_module is None:
+            print(f"Errors: {totals['error']}, Warnings: {totals['warning']}")
+        else:
+            try:
+                trigger_module.evaluate_system(
+                    system_name, totals['error'], totals['warning'],
+                    trigger_module.ERROR_THRESHOLD if error_threshold is None else error_threshold,
+                    trigger_module.WARNING_THRESHOLD if warning_threshold is None else warning_threshold)
+            except Exception as e:
+                print(f"Error processing data for {system_name}: {e}")
+    if trigger_module is not None:
+        trigger_module.REMEDIATION_EXECUTOR.join()
+    return system_totals
+
+if __name__ == "__main__":
+    # Command line options
+    parser = argparse.ArgumentParser(description="Extract, preprocess, aggregate and trigger self-healing in one process")
+    parser.add_argument('--log-dir', default=DEFAULT_LOG_DIR,
+                        help="directory holding Mac.log, Windows.log, Android.log and Linux.log (default: %(default)s)")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE,
+                        help="number of log entries held in memory per chunk (default: %(default)s)")
+    parser.add_argument('--year', type=int, default=None,
+                        help="year assumed for syslog and Android timestamps, which carry none (default: current year)")
+    parser.add_argument('--include-rotated', action='store_true',
+                        help="also read rotated segments such as Linux.log.1 or Linux.log.2.gz, oldest first")
+    parser.add_argument('--save-extracted', metavar='DIR',
+                        help="also write the extracted datasets to DIR")
+    parser.add_argument('--save-preprocessed', metavar='DIR',
+                        help="also write the preprocessed datasets to DIR, e.g. for the standalone trigger service")
+    parser.add_argument('--format', choices=list(DATA_FORMATS), default=DEFAULT_DATA_FORMAT,
+                        help="format of the datasets written with --save-* (default: %(default)s)")
+    parser.add_argument('--error-threshold', type=int, default=None,
+                        help="errors above which self-healing is triggered (default: the trigger service's)")
+    parser.add_argument('--warning-threshold', type=int, default=None,
+                        help="warnings above which self-healing is triggered (default: the trigger service's)")
+    parser.add_argument('--no-trigger', action='store_true',
+                        help="only report the counts, don't trigger remedial actions")
+    parser.add_argument('--serve', action='store_true',
+                        help="serve the Prometheus metrics on port 8000 while running and afterwards, like the trigger service")
+    args = parser.parse_args()
+    if args.serve and args.no_trigger:
+        parser.error("--serve exposes the trigger service's metrics, drop --no-trigger")
+
+    for directory in [args.save_extracted, args.save_preprocessed]:
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    if args.serve:
+        # Served from the start, so the metrics can be scraped while the pipeline runs
+        trigger_module = load_trigger_module()
+        stop_on_signals(trigger_module.SERVICE)
+        server = HTTPServer(trigger_module.app)
+        server.start()
+        trigger_module.SERVICE.ready.set()
+
+    run_pipeline(args.log_dir, chunksize=args.chunksize, year=args.year, include_rotated=args.include_rotated,
+                 extracted_dir=args.save_extracted, preprocessed_dir=args.save_preprocessed, data_format=args.format,
+                 trigger=not args.no_trigger, error_threshold=args.error_threshold, warning_threshold=args.warning_threshold)
+
+    if args.serve:
+        trigger_module.SERVICE.stopping.wait()
+        trigger_module.shutdown(server, [])
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import json
+import os
+import shlex
+import shutil
+import sys
+import threading
+import time
+from remediation import DEFAULT_STEP_TIMEOUT, run_step
+
+# Playbooks shipped with the service, next to this file
+DEFAULT_PLAYBOOK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'playbooks.json')
+
+# Seconds after which resolved tool paths are looked up again, even when PATH didn't change
+DEFAULT_TOOL_REFRESH_SECONDS = 300
+
+# Keys a playbook and its steps may use; anything else is reported when the playbook is loaded
+PLAYBOOK_KEYS = {'requires', 'steps', 'on_success', 'on_failure'}
+STEP_KEYS = {'message', 'run', 'tool', 'timeout', 'fail_if_stderr', 'error', 'first_of', 'if_writable', 'otherwise'}
+
+# Cached tool lookups, so checking for a tool doesn't search PATH (or fork) on every trigger
+class ToolTable:
+    """Resolve tool names to their paths once and remember them.
+
+    The table is cleared when PATH changes or refresh_seconds have passed,
+    and its generation goes up, so plans compiled against an older generation
+    know they have to be compiled again.
+    """
+
+    def __init__(self, refresh_seconds=DEFAULT_TOOL_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.paths = {}
+        self.generation = 0
+        self.search_path = os.environ.get('PATH')
+        self.resolved_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    # Clear the table when PATH changed or it is older than refresh_seconds
+    def refresh_if_stale(self):
+        with self.lock:
+            search_path = os.environ.get('PATH')
+            if search_path == self.search_path and time.monotonic() - self.resolved_at < self.refresh_seconds:
+                return False
+            self.paths = {}
+            self.generation += 1
+            self.search_path = search_path
+            self.resolved_at = time.monotonic()
+            return True
+
+    # Path of a tool, or None when it is not installed
+    def resolve(self, tool_name):
+        self.refresh_if_stale()
+        with self.lock:
+            if tool_name not in self.paths:
+                self.paths[tool_name] = shutil.which(tool_name)
+            return self.paths[tool_name]
+
+    def available(self, tool_name):
+        return self.resolve(tool_name) is not None
+
+# A playbook step compiled against the tool table: the message and resolved command it runs
+class PlanStep:
+    def __init__(self, message=None, argv=None, timeout=DEFAULT_STEP_TIMEOUT, fail_if_stderr=None, error=None,
+                 if_writable=None, otherwise=None, missing_tool=None):
+        self.message = message
+        self.argv = argv
+        self.timeout = timeout
+        self.fail_if_stderr = fail_if_stderr
+        self.error = error
+        self.if_writable = if_writable
+        self.otherwise = otherwise
+        self.missing_tool = missing_tool
+
+    async def execute(self, dry_run=False):
+        if self.message is not None:
+            print(self.message)
+        if self.missing_tool is not None:
+            raise Exception(f"{self.missing_tool} tool not available.")
+        writable = self.if_writable is None or (os.path.isdir(self.if_writable) and os.access(self.if_writable, os.W_OK))
+        if self.argv is None or not writable:
+            if self.otherwise is not None:
+                print(self.otherwise)
+            return
+        if dry_run:
+            print(f"Dry run: {shlex.join(self.argv)}")
+            return
+        result = await run_step(self.argv, timeout=self.timeout, check=True,
+                                capture_output=self.fail_if_stderr is not None)
+        if self.fail_if_stderr is not None and self.fail_if_stderr in result.stderr:
+            raise Exception(self.error or result.stderr.strip())
+
+    def describe(self):
+        if self.missing_tool is not None:
+            return f"fail: {self.missing_tool} tool not available"
+        if self.argv is None:
+            return f"print {self.otherwise if self.otherwise is not None else self.message!r}"
+        condition = f"if {self.if_writable} is writable: " if self.if_writable is not None else ''
+        return f"{condition}{shlex.join(self.argv)} (timeout {self.timeout}s)"
+
+# A remediation playbook of one system, compiled into a plan of steps and recompiled when the tools change
+class Playbook:
+    def __init__(self, spec, tools, dry_run=False):
+        unknown = set(spec) - PLAYBOOK_KEYS
+        if unknown:
+            raise ValueError(f"Unknown playbook keys: {sorted(unknown)}")
+        for step in spec.get('steps', []):
+            for part in [step] + step.get('first_of', []):
+                unknown = set(part) - STEP_KEYS
+                if unknown:
+                    raise ValueError(f"Unknown playbook step keys: {sorted(unknown)}")
+                if 'run' in part and not part['run']:
+                    raise ValueError("A playbook step has an empty command")
+        self.spec = spec
+        self.tools = tools
+        self.dry_run = dry_run
+        self.steps = None
+        self.generation = None
+
+    # (compiled step, None) of a step with a command, or (None, tool) when one of its tools is missing
+    def compile_command(self, step):
+        tool_names = ([step['tool']] if 'tool' in step else []) + [step['run'][0]]
+        for tool_name in tool_names:
+            if not self.tools.available(tool_name):
+                return None, tool_name
+        argv = [self.tools.resolve(step['run'][0])] + list(step['run'][1:])
+        return PlanStep(step.get('message'), argv, step.get('timeout', DEFAULT_STEP_TIMEOUT), step.get('fail_if_stderr'),
+                        step.get('error'), step.get('if_writable'), step.get('otherwise')), None
+
+    def compile(self):
+        steps = []
+        for tool_name in self.spec.get('requires', []):
+            if not self.tools.available(tool_name):
+                # Like a handler checking for its tool first: nothing else runs
+                self.steps = [PlanStep(missing_tool=tool_name)]
+                return self.steps
+        for step in self.spec.get('steps', []):
+            if 'first_of' in step:
+                # The first alternative whose tools are installed, else the fallback message
+                if step.get('message') is not None:
+                    steps.append(PlanStep(step['message']))
+                for candidate in step['first_of']:
+                    compiled, _ = self.compile_command(candidate)
+                    if compiled is not None:
+                        steps.append(compiled)
+                        break
+                else:
+                    steps.append(PlanStep(otherwise=step.get('otherwise')))
+            elif 'run' in step:
+                compiled, missing_tool = self.compile_command(step)
+                if compiled is None:
+                    if 'otherwise' in step:
+                        compiled = PlanStep(step.get('message'), otherwise=step['otherwise'])
+                    else:
+                        compiled = PlanStep(step.get('message'), missing_tool=missing_tool)
+                steps.append(compiled)
+            else:
+                steps.append(PlanStep(step.get('message'), otherwise=step.get('otherwise')))
+        self.steps = steps
+        return steps
+
+    # The compiled plan, compiled again only when the tool table was refreshed
+    def plan(self):
+        self.tools.refresh_if_stale()
+        if self.steps is None or self.generation != self.tools.generation:
+            self.generation = self.tools.generation
+            self.compile()
+        return self.steps
+
+    # Run the plan, printing the outcome like the hand-written handlers did; False when a step failed
+    async def run(self, system_name):
+        print(f"Performing remedial actions for {system_name}...")
+        try:
+            for step in self.plan():
+                await step.execute(self.dry_run)
+            if self.spec.get('on_success') is not None:
+                print(self.spec['on_success'])
+        except Exception as e:
+            print(f"Error performing {system_name} remedial actions: {e}")
+            for line in self.spec.get('on_failure', []):
+                print(line)
+            return False
+        return True
+
+# Load the playbooks of a file, {system name: Playbook}; YAML files need PyYAML
+def load_playbooks(playbook_file, tools, dry_run=False):
+    with open(playbook_file, 'r', encoding='utf8') as f:
+        if os.path.splitext(playbook_file)[1] in ('.yaml', '.yml'):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("YAML playbooks need PyYAML: pip install pyyaml")
+            specs = yaml.safe_load(f)
+        else:
+            specs = json.load(f)
+    return {system_name: Playbook(spec, tools, dry_run) for system_name, spec in specs.items()}
+
+if __name__ == "__main__":
+    # Print the plans the playbooks compile to on this machine
+    playbooks = load_playbooks(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PLAYBOOK_FILE, ToolTable())
+    for system_name, playbook in playbooks.items():
+        print(f"{system_name}:")
+        for step in playbook.plan():
+            print(f"  {step.describe()}")
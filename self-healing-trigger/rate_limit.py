@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+# Defaults of the limits of each (system, action): no repeat within the cooldown, and at most
+# DEFAULT_BUCKET_CAPACITY runs in a burst, earning one more run every DEFAULT_REFILL_SECONDS
+DEFAULT_COOLDOWN_SECONDS = 900
+DEFAULT_BUCKET_CAPACITY = 3
+DEFAULT_REFILL_SECONDS = 3600
+
+# Default location of the persisted limiter state, next to the scripts like the other state files
+DEFAULT_STATE_FILE = '.remediation-state.json'
+
+# Cooldown and token bucket per (system, action), persisted so a restart doesn't reset them
+class RemediationLimiter:
+    """Decide whether a remedial action may run again.
+
+    Every (system, action) pair has a cooldown, the minimum time between two
+    runs, and a token bucket that allows short bursts but caps the long-run
+    rate. A run is allowed when the cooldown has passed and a token is left;
+    allowing it starts a new cooldown and takes the token, which refund gives
+    back when the run couldn't be started. The state is saved after every
+    change, so limits survive restarts of the service.
+    """
+
+    def __init__(self, state_file=DEFAULT_STATE_FILE, cooldown_seconds=DEFAULT_COOLDOWN_SECONDS,
+                 bucket_capacity=DEFAULT_BUCKET_CAPACITY, refill_seconds=DEFAULT_REFILL_SECONDS):
+        self.state_file = state_file
+        self.cooldown_seconds = cooldown_seconds
+        self.bucket_capacity = bucket_capacity
+        self.refill_seconds = refill_seconds
+        self.lock = threading.Lock()
+        self.state = {}
+        # Entry of each (system, action) before its last allowed run, for refund
+        self.previous = {}
+        if state_file is not None and os.path.exists(state_file):
+            with open(state_file, 'r', encoding='utf8') as f:
+                self.state = json.load(f)
+
+    # Limiter settings from the environment, falling back to the defaults above
+    # Replicas sharing a directory keep state files of their own, suffixed with their replica id
+    @classmethod
+    def from_environment(cls, replica_id=None):
+        state_file = os.environ.get('REMEDIATION_STATE_FILE', DEFAULT_STATE_FILE)
+        if replica_id is not None:
+            base, extension = os.path.splitext(state_file)
+            state_file = f"{base}.{replica_id}{extension}"
+        return cls(state_file,
+                   float(os.environ.get('REMEDIATION_COOLDOWN_SECONDS', DEFAULT_COOLDOWN_SECONDS)),
+                   float(os.environ.get('REMEDIATION_BUCKET_CAPACITY', DEFAULT_BUCKET_CAPACITY)),
+                   float(os.environ.get('REMEDIATION_REFILL_SECONDS', DEFAULT_REFILL_SECONDS)))
+
+    # Tokens of a bucket at time now, refilled since it was last updated
+    def tokens(self, entry, now):
+        refilled = (now - entry['updated']) / self.refill_seconds if self.refill_seconds > 0 else self.bucket_capacity
+        return min(self.bucket_capacity, entry['tokens'] + max(refilled, 0))
+
+    # None when the action may run (and is counted as run), else why it is suppressed: 'cooldown' or 'rate_limit'
+    def acquire(self, system_name, action, now=None):
+        now = time.time() if now is None else now
+        key = f"{system_name}/{action}"
+        with self.lock:
+            entry = self.state.get(key, {'last_run': None, 'tokens': self.bucket_capacity, 'updated': now})
+            if entry['last_run'] is not None and now - entry['last_run'] < self.cooldown_seconds:
+                return 'cooldown'
+            tokens = self.tokens(entry, now)
+            if tokens < 1:
+                return 'rate_limit'
+            self.previous[key] = self.state.get(key)
+            self.state[key] = {'last_run': now, 'tokens': tokens - 1, 'updated': now}
+            self.save()
+        return None
+
+    # Undo the last allowed run of an action that never ran after all, giving back its cooldown and token
+    def refund(self, system_name, action):
+        key = f"{system_name}/{action}"
+        with self.lock:
+            if key not in self.previous:
+                return
+            previous = self.previous.pop(key)
+            if previous is None:
+                self.state.pop(key, None)
+            else:
+                self.state[key] = previous
+            self.save()
+
+    # Seconds until an action may run again, 0 when it may run now
+    def retry_after(self, system_name, action, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            entry = self.state.get(f"{system_name}/{action}")
+            if entry is None:
+                return 0
+            cooldown = entry['last_run'] + self.cooldown_seconds - now if entry['last_run'] is not None else 0
+            refill = (1 - self.tokens(entry, now)) * self.refill_seconds
+            return max(cooldown, refill, 0)
+
+    # Save the state atomically, through a temporary file no other process writes to
+    def save(self):
+        if self.state_file is None:
+            return
+        directory, name = os.path.split(os.path.abspath(self.state_file))
+        fd, temp_file = tempfile.mkstemp(suffix='.tmp', prefix=f"{name}.", dir=directory)
+        with os.fdopen(fd, 'w', encoding='utf8') as f:
+            json.dump(self.state, f, indent=2, sort_keys=True)
+        os.replace(temp_file, self.state_file)
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import asyncio
+import os
+import subprocess
+import threading
+import time
+from prometheus_client import Counter, Gauge, Histogram
+
+# Seconds a single remediation step may run before it is killed
+DEFAULT_STEP_TIMEOUT = 300
+
+# Remediations waiting to run, beyond which new requests are dropped
+DEFAULT_QUEUE_SIZE = 100
+
+# Remediations running at once, in total and per system
+DEFAULT_WORKERS = 4
+DEFAULT_PER_SYSTEM_LIMIT = 1
+
+# Metrics of the executor
+REMEDIATION_QUEUE_DEPTH = Gauge("remediation_queue_depth", "Number of remedial actions waiting to run")
+REMEDIATION_IN_FLIGHT = Gauge("remediation_in_flight", "Number of remedial actions running", ["system"])
+REMEDIATION_DURATION = Histogram("remedial_action_duration_seconds", "Duration of remedial actions",
+                                 ["system", "outcome"], buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600))
+REMEDIATION_STEP_DURATION = Histogram("remediation_step_duration_seconds", "Duration of each remediation command",
+                                      ["command", "outcome"], buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1800))
+DETECTION_TO_REMEDIATION = Histogram("detection_to_remediation_seconds",
+                                     "Time from a threshold being crossed to its remedial actions having run",
+                                     ["system"], buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600))
+REMEDIATION_DROPPED = Counter("remediation_requests_dropped", "Remedial actions dropped because the queue was full",
+                              ["system"])
+
+# Run one remediation step as an async subprocess, like subprocess.run(args, check=check, text=True)
+# A step that outlives its timeout, or whose remediation is cancelled, is killed
+async def run_step(args, timeout=DEFAULT_STEP_TIMEOUT, check=True, capture_output=False):
+    pipe = subprocess.PIPE if capture_output else None
+    start = time.monotonic()
+    outcome = 'cancelled'
+    process = await asyncio.create_subprocess_exec(*args, stdout=pipe, stderr=pipe)
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+        outcome = 'completed' if process.returncode == 0 else 'failed'
+    except asyncio.TimeoutError:
+        outcome = 'timeout'
+        process.kill()
+        await process.wait()
+        raise subprocess.TimeoutExpired(args, timeout)
+    except asyncio.CancelledError:
+        process.kill()
+        await process.wait()
+        raise
+    finally:
+        # Labelled by the command's name, not its arguments, to keep the series few
+        REMEDIATION_STEP_DURATION.labels(command=os.path.basename(args[0]), outcome=outcome).observe(time.monotonic() - start)
+    if capture_output:
+        stdout, stderr = stdout.decode('utf8', errors='replace'), stderr.decode('utf8', errors='replace')
+    if check and process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, args, stdout, stderr)
+    return subprocess.CompletedProcess(args, process.returncode, stdout, stderr)
+
+# Runs the remedial actions of the systems on an event loop of its own
+class RemediationExecutor:
+    """Run remedial actions concurrently, away from detection.
+
+    Detection submits system names from any thread and returns at once; the
+    requests wait in a bounded queue and are picked up by a fixed number of
+    workers. A worker takes the oldest request of a system that has fewer
+    than per_system_limit remediations running, so a system with a slow
+    remediation never holds up the requests of the others. Handlers are
+    coroutines taking the system name, e.g. built from run_step; one that
+    raises or returns False has failed. on_finished, when given, is called
+    with the system name, the outcome and the start and end times of every
+    remediation. The loop runs in a daemon thread started on the first submit.
+    """
+
+    def __init__(self, handlers, fallback, workers=DEFAULT_WORKERS, per_system_limit=DEFAULT_PER_SYSTEM_LIMIT,
+                 queue_size=DEFAULT_QUEUE_SIZE, on_finished=None):
+        self.handlers = handlers
+        self.on_finished = on_finished
+        self.fallback = fallback
+        self.workers = workers
+        self.per_system_limit = per_system_limit
+        self.queue_size = queue_size
+        self.loop = None
+        self.queue = []
+        self.running = {}
+        self.changed = None
+        self.lock = threading.Lock()
+
+    # Start the event loop thread and its workers
+    def start(self):
+        with self.lock:
+            if self.loop is not None:
+                return
+            self.loop = asyncio.new_event_loop()
+            ready = threading.Event()
+            threading.Thread(target=self.run_loop, args=(ready,), daemon=True, name="remediation").start()
+            ready.wait()
+
+    def run_loop(self, ready):
+        asyncio.set_event_loop(self.loop)
+        self.changed = asyncio.Condition()
+        for _ in range(self.workers):
+            self.loop.create_task(self.worker())
+        self.loop.call_soon(ready.set)
+        self.loop.run_forever()
+
+    # Run a coroutine of the executor on its loop and wait for its result
+    def call(self, coroutine):
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    # Queue a remediation of a system detected at time.monotonic() detected_at (default now);
+    # returns False when the queue is full and the request was dropped
+    def submit(self, system_name, detected_at=None):
+        detected_at = time.monotonic() if detected_at is None else detected_at
+        return self.call(self.enqueue(system_name, detected_at))
+
+    async def enqueue(self, system_name, detected_at):
+        async with self.changed:
+            if len(self.queue) >= self.queue_size:
+                print(f"Remediation queue is full, dropped the remedial actions for {system_name}")
+                REMEDIATION_DROPPED.labels(system=system_name).inc()
+                return False
+            self.queue.append((system_name, detected_at))
+            REMEDIATION_QUEUE_DEPTH.set(len(self.queue))
+            self.changed.notify_all()
+        return True
+
+    # Index of the oldest queued request whose system can run one more remediation, or None
+    def next_request(self):
+        for i, (system_name, _) in enumerate(self.queue):
+            if len(self.running.get(system_name, ())) < self.per_system_limit:
+                return i
+        return None
+
+    async def worker(self):
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(lambda: self.next_request() is not None)
+                system_name, detected_at = self.queue.pop(self.next_request())
+                REMEDIATION_QUEUE_DEPTH.set(len(self.queue))
+                # The handler runs in a task of its own, so it can be cancelled without stopping the worker
+                task = asyncio.ensure_future(self.handlers.get(system_name, self.fallback)(system_name))
+                self.running.setdefault(system_name, set()).add(task)
+            try:
+                await self.remediate(system_name, task, detected_at)
+            finally:
+                async with self.changed:
+                    self.running[system_name].discard(task)
+                    self.changed.notify_all()
+
+    # Wait for the handler task of a system, recording how long it took and how it ended
+    async def remediate(self, system_name, task, detected_at):
+        REMEDIATION_IN_FLIGHT.labels(system=system_name).inc()
+        start, started_at, outcome = time.monotonic(), time.time(), 'completed'
+        try:
+            if await task is False:
+                outcome = 'failed'
+        except asyncio.CancelledError:
+            outcome = 'cancelled'
+            print(f"Remedial actions for {system_name} were cancelled")
+        except Exception as e:
+            outcome = 'failed'
+            print(f"Error performing {system_name} remedial actions: {e}")
+        finally:
+            REMEDIATION_IN_FLIGHT.labels(system=system_name).dec()
+            REMEDIATION_DURATION.labels(system=system_name, outcome=outcome).observe(time.monotonic() - start)
+            if outcome == 'completed':
+                DETECTION_TO_REMEDIATION.labels(system=system_name).observe(time.monotonic() - detected_at)
+            if self.on_finished is not None:
+                try:
+                    self.on_finished(system_name, outcome, started_at, time.time())
+                except Exception as e:
+                    print(f"Error recording the remediation of {system_name}: {e}")
+
+    # Drop the queued requests and cancel the running remediations of a system, or of every system
+    def cancel(self, system_name=None):
+        if self.loop is not None:
+            self.call(self.cancel_requests(system_name))
+
+    async def cancel_requests(self, system_name):
+        async with self.changed:
+            self.queue = [queued for queued in self.queue if system_name is not None and queued[0] != system_name]
+            REMEDIATION_QUEUE_DEPTH.set(len(self.queue))
+            for name, tasks in self.running.items():
+                if system_name is None or name == system_name:
+                    for task in tasks:
+                        task.cancel()
+            self.changed.notify_all()
+
+    # Wait until every queued remediation has run, e.g. before a one-shot run exits;
+    # False when some are still queued or running after timeout seconds
+    def join(self, timeout=None):
+        if self.loop is None:
+            return True
+        try:
+            self.call(asyncio.wait_for(self.idle(), timeout))
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def idle(self):
+        async with self.changed:
+            await self.changed.wait_for(lambda: not self.queue and not any(self.running.values()))
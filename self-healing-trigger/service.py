@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import signal
+import threading
+from flask import jsonify
+
+# Address the HTTP server listens on, and the requests it handles at once
+DEFAULT_HOST = '0.0.0.0'
+DEFAULT_PORT = 8000
+DEFAULT_THREADS = 8
+
+# Seconds a shutdown waits for in-flight remediations before cancelling them
+DEFAULT_DRAIN_SECONDS = 60
+
+# Lifecycle of the service, as reported by the health endpoints
+class ServiceState:
+    """Track whether the service is starting, ready or stopping.
+
+    Long-running loops wait on stopping instead of sleeping, so a shutdown
+    interrupts them between polls; readiness turns off as soon as it starts.
+    """
+
+    def __init__(self):
+        self.ready = threading.Event()
+        self.stopping = threading.Event()
+
+    def status(self):
+        if self.stopping.is_set():
+            return 'stopping'
+        return 'ready' if self.ready.is_set() else 'starting'
+
+    # Sleep for up to seconds; True when the service is stopping
+    def wait(self, seconds):
+        return self.stopping.wait(seconds)
+
+    def stop(self):
+        self.ready.clear()
+        self.stopping.set()
+
+# Liveness (/healthz) answers as long as the server does; readiness (/readyz) only once the service accepts work
+def add_health_routes(app, state):
+    @app.route('/healthz')
+    def healthz():
+        return jsonify(status='alive')
+
+    @app.route('/readyz')
+    def readyz():
+        status = state.status()
+        return jsonify(status=status), 200 if status == 'ready' else 503
+
+# Stop the service on SIGTERM (e.g. docker stop, a Kubernetes pod being deleted) and SIGINT
+def stop_on_signals(state):
+    def handle(signum, frame):
+        print(f"Received {signal.Signals(signum).name}, shutting down...")
+        state.stop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, handle)
+
+# Multi-threaded HTTP server running in a thread of its own
+class HTTPServer:
+    """Serve a WSGI app from a background thread.
+
+    Uses waitress, a production WSGI server with a pool of request threads,
+    so metric scrapes, health checks and ingest requests are handled
+    concurrently and while the logs are being processed. Without waitress
+    installed, falls back to werkzeug's threaded server.
+    """
+
+    def __init__(self, app, host=DEFAULT_HOST, port=DEFAULT_PORT, threads=DEFAULT_THREADS):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.threads = threads
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        try:
+            from waitress.server import create_server
+            self.server = create_server(self.app, host=self.host, port=self.port, threads=self.threads)
+            name = 'waitress'
+        except ImportError:
+            from werkzeug.serving import make_server
+            print("waitress is not installed (pip install waitress), serving with werkzeug's threaded server")
+            self.server = make_server(self.host, self.port, self.app, threaded=True)
+            name = 'werkzeug'
+        self.thread = threading.Thread(target=self.run, daemon=True, name="http")
+        self.thread.start()
+        print(f"Serving on http://{self.host}:{self.port} with {name}")
+
+    def run(self):
+        if hasattr(self.server, 'serve_forever'):
+            self.server.serve_forever()
+        else:
+            self.server.run()
+
+    # Stop accepting requests and let the ones in progress finish
+    def stop(self, timeout=10):
+        if self.server is None:
+            return
+        if hasattr(self.server, 'shutdown'):
+            self.server.shutdown()
+        else:
+            from waitress import wasyncore
+            self.server.task_dispatcher.shutdown(timeout=timeout)
+            wasyncore.close_all(self.server._map)
+        self.thread.join(timeout)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import abc
+import bisect
+import hashlib
+import os
+import socket
+import sqlite3
+import threading
+import time
+from prometheus_client.core import Metric
+
+# Points of each replica on the hash ring; more points spread the systems more evenly
+DEFAULT_VIRTUAL_NODES = 64
+
+# Seconds between heartbeats, and after which a replica that stopped sending them is considered gone
+DEFAULT_HEARTBEAT_SECONDS = 10
+DEFAULT_REPLICA_TTL = 30
+
+# Default location of the shared coordination database
+DEFAULT_SHARD_DB = 'shards.sqlite'
+
+# Position of a key on the ring
+def ring_position(key):
+    return int.from_bytes(hashlib.sha1(key.encode('utf8')).digest()[:8], 'big')
+
+# Consistent hash ring: a replica joining or leaving only moves the systems next to its points
+class HashRing:
+    def __init__(self, replicas=(), virtual_nodes=DEFAULT_VIRTUAL_NODES):
+        self.replicas = sorted(replicas)
+        points = sorted((ring_position(f"{replica}#{i}"), replica)
+                        for replica in self.replicas for i in range(virtual_nodes))
+        self.positions = [position for position, _ in points]
+        self.owners = [replica for _, replica in points]
+
+    # Replica owning a key: the first point at or after the key's position, wrapping around
+    def owner(self, key):
+        if not self.positions:
+            return None
+        index = bisect.bisect_left(self.positions, ring_position(key)) % len(self.positions)
+        return self.owners[index]
+
+# Interface of the shared state the replicas coordinate through
+class CoordinationBackend(abc.ABC):
+    """Where replicas announce themselves and claim remediations.
+
+    Subclasses keep a heartbeat per replica and exclusive, expiring claims
+    on names, atomically across every replica, e.g. in SQLite, a database
+    server or a key-value store. A subclass missing any of the methods
+    can't be instantiated.
+    """
+
+    @abc.abstractmethod
+    def heartbeat(self, replica_id, now):
+        pass
+
+    @abc.abstractmethod
+    def live_replicas(self, now, ttl):
+        pass
+
+    @abc.abstractmethod
+    def leave(self, replica_id):
+        pass
+
+    # True when owner now holds the claim on name until now + ttl; False when another owner holds it
+    @abc.abstractmethod
+    def claim(self, name, owner, now, ttl):
+        pass
+
+# Commit the transaction of a connection on success, roll it back on error, and close it either way
+class ClosingTransaction:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self.connection
+
+    def __exit__(self, exc_type, exc, traceback):
+        try:
+            self.connection.execute("ROLLBACK" if exc_type is not None else "COMMIT")
+        finally:
+            self.connection.close()
+
+# Coordination through an SQLite database on storage every replica can reach, e.g. a shared volume
+class SQLiteBackend(CoordinationBackend):
+    def __init__(self, path=DEFAULT_SHARD_DB, timeout=30):
+        self.path = path
+        self.timeout = timeout
+        with self.connect() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS replicas (replica_id TEXT PRIMARY KEY, heartbeat REAL)")
+            connection.execute("CREATE TABLE IF NOT EXISTS claims (name TEXT PRIMARY KEY, owner TEXT, expires REAL)")
+
+    # A connection per call, so the backend can be used from any thread
+    def connect(self):
+        connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        connection.execute("BEGIN IMMEDIATE")
+        return ClosingTransaction(connection)
+
+    def heartbeat(self, replica_id, now):
+        with self.connect() as connection:
+            connection.execute("INSERT OR REPLACE INTO replicas VALUES (?, ?)", (replica_id, now))
+
+    def live_replicas(self, now, ttl):
+        with self.connect() as connection:
+            rows = connection.execute("SELECT replica_id FROM replicas WHERE heartbeat >= ?", (now - ttl,))
+            return sorted(row[0] for row in rows)
+
+    def leave(self, replica_id):
+        with self.connect() as connection:
+            connection.execute("DELETE FROM replicas WHERE replica_id = ?", (replica_id,))
+
+    def claim(self, name, owner, now, ttl):
+        with self.connect() as connection:
+            row = connection.execute("SELECT owner, expires FROM claims WHERE name = ?", (name,)).fetchone()
+            if row is not None and row[0] != owner and row[1] > now:
+                return False
+            connection.execute("INSERT OR REPLACE INTO claims VALUES (?, ?, ?)", (name, owner, now + ttl))
+            return True
+
+# Membership of this replica and the systems it owns
+class ShardCoordinator:
+    """Split the monitored systems among the live replicas.
+
+    A background thread sends this replica's heartbeat and rebuilds the hash
+    ring whenever replicas join or leave, so ownership re-balances within a
+    heartbeat or, for a replica that died, within the TTL. Remediations are
+    claimed in the backend as well, so a system that changes owner while it
+    is being remediated is never remediated by both replicas.
+    """
+
+    def __init__(self, backend, replica_id=None, heartbeat_seconds=DEFAULT_HEARTBEAT_SECONDS,
+                 replica_ttl=DEFAULT_REPLICA_TTL, virtual_nodes=DEFAULT_VIRTUAL_NODES):
+        self.backend = backend
+        self.replica_id = replica_id or socket.gethostname()
+        self.heartbeat_seconds = heartbeat_seconds
+        self.replica_ttl = replica_ttl
+        self.virtual_nodes = virtual_nodes
+        self.ring = HashRing([self.replica_id], virtual_nodes)
+        self.stopped = threading.Event()
+        self.thread = None
+
+    # Join the replicas and keep the ring up to date in the background
+    def start(self):
+        self.refresh()
+        self.thread = threading.Thread(target=self.run, daemon=True, name="shard-heartbeat")
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(self.heartbeat_seconds):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Shard heartbeat failed: {e}")
+
+    # Send the heartbeat and rebuild the ring when the live replicas changed
+    def refresh(self):
+        now = time.time()
+        self.backend.heartbeat(self.replica_id, now)
+        replicas = self.backend.live_replicas(now, self.replica_ttl)
+        if self.replica_id not in replicas:
+            replicas.append(self.replica_id)
+        if sorted(replicas) != self.ring.replicas:
+            self.ring = HashRing(replicas, self.virtual_nodes)
+            print(f"Shard {self.replica_id}: replicas are now {', '.join(self.ring.replicas)}")
+
+    # Leave the ring, so the other replicas take over this one's systems at their next heartbeat
+    def stop(self):
+        self.stopped.set()
+        self.backend.leave(self.replica_id)
+
+    def owner(self, system_name):
+        return self.ring.owner(system_name)
+
+    def owns(self, system_name):
+        return self.ring.owner(system_name) == self.replica_id
+
+    # Claim the remediation of a system for ttl seconds; False when another replica holds it
+    def claim_remediation(self, system_name, ttl):
+        return self.backend.claim(f"remediation/{system_name}", self.replica_id, time.time(), ttl)
+
+# Registry view adding a shard label to every sample, for the metrics endpoint of a replica
+class ShardLabeledRegistry:
+    def __init__(self, registry, shard):
+        self.registry = registry
+        self.shard = shard
+
+    def collect(self):
+        for metric in self.registry.collect():
+            labeled = Metric(metric.name, metric.documentation, metric.type, metric.unit)
+            labeled.samples = [sample._replace(labels={**sample.labels, 'shard': self.shard})
+                               for sample in metric.samples]
+            yield labeled
+
+# Coordinator configured from the environment, or None when sharding is off (no database given and SHARD_DB unset)
+def coordinator_from_environment(shard_db=None, shard_id=None):
+    shard_db = shard_db or os.environ.get('SHARD_DB')
+    if not shard_db:
+        return None
+    return ShardCoordinator(SQLiteBackend(shard_db), shard_id or os.environ.get('SHARD_ID'),
+                            float(os.environ.get('SHARD_HEARTBEAT_SECONDS', DEFAULT_HEARTBEAT_SECONDS)),
+                            float(os.environ.get('SHARD_REPLICA_TTL', DEFAULT_REPLICA_TTL)))
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import math
+import threading
+
+# Default length of the window and of each of its buckets, in seconds
+DEFAULT_WINDOW_SECONDS = 300
+DEFAULT_BUCKET_SECONDS = 1
+
+# Error and warning counts over the last window_seconds, kept in a ring of time buckets
+class SlidingWindowCounter:
+    """Count errors and warnings over a sliding time window.
+
+    The window is a ring of fixed-width buckets, each remembering which
+    period it currently holds. Adding counts and reading the totals only
+    touch the buckets that expired since the last call, so both are O(1)
+    per event no matter how much history a log has.
+    """
+
+    def __init__(self, window_seconds=DEFAULT_WINDOW_SECONDS, bucket_seconds=DEFAULT_BUCKET_SECONDS):
+        self.window_seconds = window_seconds
+        self.bucket_seconds = bucket_seconds
+        self.num_buckets = max(1, math.ceil(window_seconds / bucket_seconds))
+        self.periods = [None] * self.num_buckets
+        self.errors = [0] * self.num_buckets
+        self.warnings = [0] * self.num_buckets
+        self.total_errors = 0
+        self.total_warnings = 0
+        self.latest_period = None
+
+    # Drop the buckets that fell out of the window by the given period
+    def expire(self, period):
+        if self.latest_period is not None and period <= self.latest_period:
+            return
+        first = period - self.num_buckets + 1
+        if self.latest_period is not None:
+            # Only the buckets between the last period seen and this one can have expired
+            first = max(first, self.latest_period + 1)
+        for expired in range(first, period + 1):
+            index = expired % self.num_buckets
+            if self.periods[index] is not None:
+                self.total_errors -= self.errors[index]
+                self.total_warnings -= self.warnings[index]
+            self.periods[index] = None
+            self.errors[index] = self.warnings[index] = 0
+        self.latest_period = period
+
+    # Count errors and warnings that happened at time now (seconds)
+    def add(self, now, errors=0, warnings=0):
+        period = int(now // self.bucket_seconds)
+        self.expire(period)
+        if self.latest_period - period >= self.num_buckets:
+            return
+        index = period % self.num_buckets
+        self.periods[index] = period
+        self.errors[index] += errors
+        self.warnings[index] += warnings
+        self.total_errors += errors
+        self.total_warnings += warnings
+
+    # (errors, warnings) within the window ending at time now
+    def totals(self, now):
+        self.expire(int(now // self.bucket_seconds))
+        return self.total_errors, self.total_warnings
+
+# Sliding windows of several systems, shared by the feeds that count their errors and warnings
+class SystemWindows:
+    """Per-system sliding windows with an edge-triggered threshold check.
+
+    Counts may come from several threads at once (e.g. a log follower and
+    the ingest endpoint). A system is reported once when its window goes
+    over a threshold, and again only after it dropped back below.
+    """
+
+    def __init__(self, window_seconds=DEFAULT_WINDOW_SECONDS, bucket_seconds=DEFAULT_BUCKET_SECONDS):
+        self.window_seconds = window_seconds
+        self.bucket_seconds = bucket_seconds
+        self.windows = {}
+        self.over_threshold = set()
+        self.lock = threading.Lock()
+
+    def add(self, system_name, now, errors=0, warnings=0):
+        with self.lock:
+            window = self.windows.get(system_name)
+            if window is None:
+                window = self.windows[system_name] = SlidingWindowCounter(self.window_seconds, self.bucket_seconds)
+            window.add(now, errors, warnings)
+
+    # (errors, warnings) of a system's window when it just went over a threshold, else None
+    def crossed(self, system_name, now, error_threshold, warning_threshold):
+        with self.lock:
+            window = self.windows.get(system_name)
+            if window is None:
+                return None
+            errors, warnings = window.totals(now)
+            if errors <= error_threshold and warnings <= warning_threshold:
+                self.over_threshold.discard(system_name)
+                return None
+            if system_name in self.over_threshold:
+                return None
+            self.over_threshold.add(system_name)
+            return errors, warnings
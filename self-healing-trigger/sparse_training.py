@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import re
+import time
+import numpy as np
+
+# Share of the rows held out to test the models, and the seed of the split
+DEFAULT_TEST_SIZE = 0.2
+DEFAULT_RANDOM_STATE = 123
+
+# Lowercase the tokens of a row and turn every run of non-word characters into one space
+def normalize_tokens(text):
+    return re.sub(r'\W+', ' ', text.lower())
+
+# Classifiers that fit a scipy sparse matrix as it is, by pycaret-like id. Tree ensembles, k-NN and the
+# discriminant analyses pycaret also compares densify their input, and naive Bayes can't take the scaled columns
+def sparse_models(random_state=DEFAULT_RANDOM_STATE):
+    from sklearn.linear_model import LogisticRegression, RidgeClassifier, SGDClassifier
+    from sklearn.svm import LinearSVC
+    return {
+        'lr': LogisticRegression(max_iter=1000, random_state=random_state),
+        'svm': LinearSVC(random_state=random_state),
+        'ridge': RidgeClassifier(random_state=random_state),
+        'sgd': SGDClassifier(random_state=random_state),
+    }
+
+# Numeric columns of a dataset as a float array, missing values as 0
+def numeric_matrix(df, exclude=()):
+    numeric = df.drop(columns=list(exclude), errors='ignore').select_dtypes(include=['number'])
+    return numeric.fillna(0).to_numpy(dtype=float), list(numeric.columns)
+
+# Training and test matrices in CSR layout: the numeric columns, standardized on the training rows,
+# next to the sparse text features. Rows are split by position, so nothing is densified on the way
+def sparse_train_test(text_features, numeric, labels, test_size=DEFAULT_TEST_SIZE, random_state=DEFAULT_RANDOM_STATE):
+    from scipy import sparse
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import StandardScaler
+    text_features = sparse.csr_matrix(text_features)
+    labels = np.asarray(labels)
+    train, test = train_test_split(np.arange(len(labels)), test_size=test_size, random_state=random_state)
+    scaler = StandardScaler().fit(numeric[train])
+
+    def rows(positions):
+        return sparse.hstack([sparse.csr_matrix(scaler.transform(numeric[positions])), text_features[positions]],
+                             format='csr')
+
+    return rows(train), rows(test), labels[train], labels[test]
+
+# Fit every model and score it on the test rows, best accuracy first:
+# [(model id, fitted model, accuracy, macro F1, fit seconds)]
+def compare_sparse_models(models, X_train, X_test, y_train, y_test):
+    from sklearn.metrics import accuracy_score, f1_score
+    results = []
+    for name, model in models.items():
+        start = time.perf_counter()
+        model.fit(X_train, y_train)
+        fit_seconds = time.perf_counter() - start
+        predictions = model.predict(X_test)
+        results.append((name, model, accuracy_score(y_test, predictions),
+                        f1_score(y_test, predictions, average='macro'), fit_seconds))
+    return sorted(results, key=lambda result: result[2], reverse=True)
+
+# Table of compared models
+def format_results(results):
+    lines = [f"{'model':<8} {'accuracy':>9} {'F1':>7} {'fit s':>8}"]
+    lines += [f"{name:<8} {accuracy:>9.4f} {f1:>7.4f} {fit_seconds:>8.2f}"
+              for name, model, accuracy, f1, fit_seconds in results]
+    return '\n'.join(lines)
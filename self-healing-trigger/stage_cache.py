@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import hashlib
+import json
+import os
+
+# Bumped when a stage's code changes the output for the same inputs and parameters
+CACHE_VERSION = 1
+
+# Name of the cache file kept in each output directory
+CACHE_FILE_NAME = '.stage-cache.json'
+
+# Files up to SAMPLE_BLOCKS * SAMPLE_BLOCK_SIZE bytes are hashed whole, larger ones at evenly spaced blocks
+SAMPLE_BLOCKS = 16
+SAMPLE_BLOCK_SIZE = 1 << 16
+
+# Fingerprint of an input file: size, modification time and a hash of sampled blocks
+def file_fingerprint(path):
+    stat = os.stat(path)
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        if stat.st_size <= SAMPLE_BLOCKS * SAMPLE_BLOCK_SIZE:
+            digest.update(f.read())
+        else:
+            step = (stat.st_size - SAMPLE_BLOCK_SIZE) // (SAMPLE_BLOCKS - 1)
+            for i in range(SAMPLE_BLOCKS):
+                f.seek(i * step)
+                digest.update(f.read(SAMPLE_BLOCK_SIZE))
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sample_sha1': digest.hexdigest()}
+
+# Cheap fingerprint of an output file, enough to notice it was rewritten or appended to
+def output_fingerprint(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+# Cache of stage outputs keyed on the fingerprints of their inputs and the stage's parameters
+class StageCache:
+    """Remember which inputs and parameters produced each stage output.
+
+    A stage asks for the key of its inputs and parameters first; when the
+    recorded entry of its outputs has the same key and the outputs are still
+    the files that were written, the stage can be skipped. Parameters should
+    only hold what the stage's output depends on, so that e.g. a change of
+    the severity table only invalidates the stages that use it.
+    """
+
+    def __init__(self, cache_file):
+        self.cache_file = cache_file
+        self.entries = {}
+        if os.path.exists(cache_file):
+            with open(cache_file, 'r', encoding='utf8') as f:
+                self.entries = json.load(f)
+
+    # Key of a stage run over some input files with some (JSON serializable) parameters
+    @staticmethod
+    def key(stage, input_files, parameters):
+        description = {
+            'version': CACHE_VERSION,
+            'stage': stage,
+            'inputs': [[os.path.abspath(path), file_fingerprint(path)] for path in input_files],
+            'parameters': parameters,
+        }
+        return hashlib.sha1(json.dumps(description, sort_keys=True).encode('utf8')).hexdigest()
+
+    # True when output_files were produced by a run with this key and haven't changed since
+    def is_fresh(self, output_files, key):
+        entry = self.entries.get(output_files[0])
+        if entry is None or entry['key'] != key or set(entry['outputs']) != set(output_files):
+            return False
+        return all(os.path.exists(path) and output_fingerprint(path) == fingerprint
+                   for path, fingerprint in entry['outputs'].items())
+
+    # Record that output_files were produced by a run with this key
+    def record(self, output_files, key):
+        self.entries[output_files[0]] = {
+            'key': key,
+            'outputs': {path: output_fingerprint(path) for path in output_files},
+        }
+
+    # Save the cache atomically
+    def save(self):
+        temp_file = f"{self.cache_file}.tmp"
+        with open(temp_file, 'w', encoding='utf8') as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+        os.replace(temp_file, self.cache_file)
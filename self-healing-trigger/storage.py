@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import pandas as pd
+import ast
+import os
+import shutil
+from timestamps import dataset_datetimes
+
+# Supported dataset formats and their file extensions; CSV stays the default
+DATA_FORMATS = {'csv': '.csv', 'parquet': '.parquet'}
+DEFAULT_DATA_FORMAT = 'csv'
+
+# Flag columns stored as (nullable) int8 in the columnar format
+FLAG_COLUMNS = ['error', 'warning']
+
+# Columns holding token lists, stored as strings in CSV files and as lists in the columnar format
+LIST_COLUMNS = ['tokens', 'parameters']
+
+# Rows read at a time when a file is rewritten while it is appended
+APPEND_CHUNKSIZE = 100000
+
+# Pandas types of the known columns when a CSV dataset is read; other columns keep pandas' defaults
+COLUMN_DTYPES = {
+    'error': 'Int8',
+    'warning': 'Int8',
+    'epoch': 'float64',
+    'template_id': 'Int32',
+    'Label': 'category',
+}
+
+# Rows per chunk when a dataset is iterated
+DEFAULT_READ_CHUNKSIZE = 100000
+
+# Path of a per-system dataset file, e.g. Mac_extracted.parquet
+def dataset_file(directory, system_name, stage, data_format=DEFAULT_DATA_FORMAT):
+    return os.path.join(directory, f"{system_name}_{stage}{DATA_FORMATS[data_format]}")
+
+# Dataset format of a file, taken from its extension
+def data_format_of(path):
+    extension = os.path.splitext(path)[1]
+    for data_format, format_extension in DATA_FORMATS.items():
+        if extension == format_extension:
+            return data_format
+    raise ValueError(f"Unsupported dataset file: {path}")
+
+# Import pyarrow only when the columnar format is actually used
+def require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("The parquet format needs pyarrow: pip install pyarrow")
+    return pyarrow
+
+# Arrow types of the known columns, fixed so every chunk and shard shares one schema
+def column_types():
+    pa = require_pyarrow()
+    return {
+        'timestamp': pa.timestamp('us'),
+        'tokens': pa.list_(pa.string()),
+        'error': pa.int8(),
+        'warning': pa.int8(),
+        'Label': pa.dictionary(pa.int32(), pa.string()),
+        'epoch': pa.float64(),
+        'template_id': pa.int32(),
+        'parameters': pa.list_(pa.string()),
+    }
+
+# Turn the string form of a token list, as stored in CSV files, back into a list
+def parse_tokens(tokens):
+    def parse(value):
+        if isinstance(value, str):
+            try:
+                value = ast.literal_eval(value)
+            except (ValueError, SyntaxError):
+                return value.split()
+        return None if value is None else list(value)
+    return tokens.map(parse, na_action='ignore')
+
+# Convert a dataset to the native types stored in the columnar format
+def to_columnar(df, year=None):
+    df = df.copy()
+    if 'timestamp' in df and not pd.api.types.is_datetime64_any_dtype(df['timestamp']):
+        df['timestamp'] = dataset_datetimes(df, year)
+    for column in LIST_COLUMNS:
+        if column in df:
+            df[column] = parse_tokens(df[column])
+    for column in FLAG_COLUMNS:
+        if column in df:
+            df[column] = df[column].astype('Int8')
+    if 'Label' in df:
+        df['Label'] = df['Label'].astype('category')
+    return df
+
+# Convert a DataFrame to an arrow table with the fixed types of the known columns
+def arrow_table(df, year=None):
+    pa = require_pyarrow()
+    table = pa.Table.from_pandas(to_columnar(df, year), preserve_index=False)
+    types = column_types()
+    schema = pa.schema([pa.field(field.name, types.get(field.name, field.type)) for field in table.schema],
+                       metadata=table.schema.metadata)
+    return table.cast(schema)
+
+# Column names of a dataset file, read from the CSV header or the parquet schema
+def dataset_columns(path):
+    if data_format_of(path) == 'parquet':
+        return require_pyarrow().parquet.ParquetFile(path).schema_arrow.names
+    return list(pd.read_csv(path, nrows=0).columns)
+
+# Columns of a dataset file named like the given ones regardless of case, e.g. ['Error', 'warning'] for
+# ['error', 'warning']; names the file lacks are left out
+def matching_columns(path, names):
+    columns = {column.lower(): column for column in dataset_columns(path)}
+    return [columns[name.lower()] for name in names if name.lower() in columns]
+
+# Per-system dataset files of a stage found in a directory, e.g. {'Mac': '.../Mac_preprocessed.csv'}
+def system_dataset_files(directory, stage):
+    files = {}
+    for filename in sorted(os.listdir(directory)):
+        name, extension = os.path.splitext(filename)
+        if extension in DATA_FORMATS.values() and name.endswith(f"_{stage}"):
+            files[name[:-len(stage) - 1]] = os.path.join(directory, filename)
+    return files
+
+# Read a dataset file with the known column types, optionally loading only some of its columns
+# Columns that are not asked for are never parsed
+def read_dataset(path, columns=None):
+    if data_format_of(path) == 'parquet':
+        require_pyarrow()
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_csv(path, usecols=columns, dtype=COLUMN_DTYPES)
+
+# Iterate over a dataset file in chunks of rows, with the same types and column selection as read_dataset
+def iter_dataset(path, columns=None, chunksize=DEFAULT_READ_CHUNKSIZE):
+    if data_format_of(path) == 'parquet':
+        parquet_file = require_pyarrow().parquet.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=columns, dtype=COLUMN_DTYPES, chunksize=chunksize)
+
+# Write a whole dataset in the format given by the file extension
+def write_dataset(df, path, year=None):
+    if data_format_of(path) == 'parquet':
+        pa = require_pyarrow()
+        pa.parquet.write_table(arrow_table(df, year), path)
+    else:
+        df.to_csv(path, index=False)
+
+# Incremental writer: chunks are appended to one CSV or parquet file
+class DatasetWriter:
+    def __init__(self, path, year=None):
+        self.path = path
+        self.year = year
+        self.data_format = data_format_of(path)
+        self.started = False
+        self.parquet_writer = None
+        if self.data_format == 'parquet':
+            require_pyarrow()
+
+    def write(self, chunk):
+        if self.data_format == 'parquet':
+            table = arrow_table(chunk, self.year)
+            if self.parquet_writer is None:
+                self.parquet_writer = require_pyarrow().parquet.ParquetWriter(self.path, table.schema)
+            self.parquet_writer.write_table(table)
+        else:
+            chunk.to_csv(self.path, mode='a' if self.started else 'w', header=not self.started, index=False)
+        self.started = True
+
+    # Append every row of another file written by a DatasetWriter in the same format
+    # value_maps optionally replaces values of some columns on the way, {column: {old: new}}
+    def append_file(self, path, value_maps=None):
+        if self.data_format == 'parquet':
+            pa = require_pyarrow()
+            parquet_file = pa.parquet.ParquetFile(path)
+            if self.parquet_writer is None:
+                self.parquet_writer = pa.parquet.ParquetWriter(self.path, parquet_file.schema_arrow)
+            for i in range(parquet_file.num_row_groups):
+                table = parquet_file.read_row_group(i)
+                if value_maps:
+                    df = table.to_pandas()
+                    for column, values in value_maps.items():
+                        df[column] = df[column].map(lambda value: values.get(value, value))
+                    table = arrow_table(df, self.year).cast(parquet_file.schema_arrow)
+                self.parquet_writer.write_table(table)
+        elif value_maps:
+            # Values are kept as the exact strings of the part file, only the mapped ones change
+            text_maps = {column: {str(old): str(new) for old, new in values.items()}
+                         for column, values in value_maps.items()}
+            for chunk in pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=APPEND_CHUNKSIZE):
+                for column, values in text_maps.items():
+                    chunk[column] = chunk[column].map(lambda value: values.get(value, value))
+                chunk.to_csv(self.path, mode='a' if self.started else 'w', header=not self.started, index=False)
+                self.started = True
+        else:
+            with open(path, 'rb') as source, open(self.path, 'ab' if self.started else 'wb') as target:
+                header = source.readline()
+                if not self.started:
+                    target.write(header)
+                shutil.copyfileobj(source, target)
+        self.started = True
+
+    # Close the file; an empty dataset still gets its header or schema
+    def close(self, columns):
+        if not self.started:
+            self.write(pd.DataFrame(columns=columns))
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+            self.parquet_writer = None
@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import argparse
+import os
+import time
+import numpy as np
+import pandas as pd
+from inference import DEFAULT_MODEL_DIR, MODEL_INPUT_COLUMNS, MODEL_TARGETS, model_features, model_file
+from storage import DEFAULT_READ_CHUNKSIZE, dataset_columns, iter_dataset
+
+# Width of the hashed token features: the feature space is fixed up front, so nothing has to be learned or kept
+# about the vocabulary, and models keep the same size however many distinct tokens a dataset has
+DEFAULT_HASH_FEATURES = 2 ** 20
+
+# Share of the rows held out to evaluate the models, drawn row by row with a fixed seed
+DEFAULT_HOLDOUT = 0.2
+DEFAULT_RANDOM_STATE = 42
+
+# Share of the rows the in-memory baseline trains on, as the *-data-classification-model-analysis.py scripts sample
+DEFAULT_BASELINE_FRACTION = 0.05
+
+# Pandas-compatible feature pipeline: hashed tokens next to the other flag columns, always as a sparse matrix.
+# Both parts are stateless, so fitting it on any chunk only records the input columns
+def feature_pipeline(target, n_features=DEFAULT_HASH_FEATURES):
+    from sklearn.compose import ColumnTransformer
+    from sklearn.feature_extraction.text import HashingVectorizer
+    flags = [column for column in MODEL_TARGETS if column != target]
+    # Counts stay non-negative (no alternate signs) so naive Bayes can learn from them
+    tokens = HashingVectorizer(n_features=n_features, alternate_sign=False, norm='l2')
+    return ColumnTransformer([('tokens', tokens, 'tokens'), ('flags', 'passthrough', flags)], sparse_threshold=1.0)
+
+# Passive-aggressive classifier, written as the SGD configuration that replaces the deprecated class in sklearn 1.8
+def passive_aggressive(random_state):
+    import sklearn
+    if tuple(int(part) for part in sklearn.__version__.split('.')[:2]) >= (1, 8):
+        from sklearn.linear_model import SGDClassifier
+        return SGDClassifier(loss='hinge', penalty=None, learning_rate='pa1', eta0=1.0, random_state=random_state)
+    from sklearn.linear_model import PassiveAggressiveClassifier
+    return PassiveAggressiveClassifier(random_state=random_state)
+
+# Classifiers that learn a batch at a time with partial_fit, by id
+def incremental_models(random_state=DEFAULT_RANDOM_STATE):
+    from sklearn.linear_model import SGDClassifier
+    from sklearn.naive_bayes import MultinomialNB
+    return {
+        'sgd': SGDClassifier(loss='log_loss', random_state=random_state),
+        'nb': MultinomialNB(),
+        'pa': passive_aggressive(random_state),
+    }
+
+# Rows of a dataset with a known target, in chunks, with the held-out mask of each chunk.
+# The mask is drawn from a generator seeded the same way on every pass, so every pass holds out the same rows
+def labelled_chunks(path, target, chunksize=DEFAULT_READ_CHUNKSIZE, holdout=DEFAULT_HOLDOUT,
+                    random_state=DEFAULT_RANDOM_STATE):
+    columns = [column for column in MODEL_INPUT_COLUMNS if column in dataset_columns(path)]
+    rng = np.random.default_rng(random_state)
+    for chunk in iter_dataset(path, columns=columns, chunksize=chunksize):
+        held_out = rng.random(len(chunk)) < holdout
+        known = chunk[target].notna().to_numpy()
+        chunk = model_features(chunk[known], None).fillna({'tokens': ''}).fillna(0)
+        yield chunk, held_out[known]
+
+# Running confusion counts of a binary classifier over a stream
+class StreamMetrics:
+    """Accumulate the accuracy and F1 of the positive class over batches."""
+
+    def __init__(self):
+        self.tp = self.fp = self.fn = self.tn = 0
+
+    def update(self, y_true, y_pred):
+        y_true, y_pred = np.asarray(y_true, dtype=bool), np.asarray(y_pred, dtype=bool)
+        self.tp += int(np.sum(y_true & y_pred))
+        self.fp += int(np.sum(~y_true & y_pred))
+        self.fn += int(np.sum(y_true & ~y_pred))
+        self.tn += int(np.sum(~y_true & ~y_pred))
+
+    def accuracy(self):
+        total = self.tp + self.fp + self.fn + self.tn
+        return (self.tp + self.tn) / total if total else float('nan')
+
+    def f1(self):
+        return 2 * self.tp / (2 * self.tp + self.fp + self.fn) if self.tp else 0.0
+
+# Outcome of training one model, streamed or on the baseline sample
+class TrainingResult:
+    """Rows a model trained on, its time spent featurizing and fitting, and its held-out metrics."""
+
+    def __init__(self, name, mode, model):
+        self.name = name
+        self.mode = mode
+        self.model = model
+        self.rows = 0
+        self.seconds = 0.0
+        self.metrics = StreamMetrics()
+
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else float('nan')
+
+# Peak resident memory of the process in MB, None where the platform doesn't report it
+def peak_memory_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Linux reports kilobytes, macOS bytes
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if os.uname().sysname == 'Darwin' else peak / 2 ** 10
+
+# Train incremental models on a dataset out of core, in two passes over it:
+#  1. every row outside the holdout is learned with partial_fit, a chunk at a time; a sample of them is kept
+#     for the baseline models, which are fitted on it in memory at the end of the pass
+#  2. the held-out rows are scored by every model, then learned by the streamed ones (finalize), so those have
+#     seen all of the data while none was scored after being learned
+# Memory stays bounded by the chunk size and the hashed feature width (plus the baseline sample, if any)
+def train_streaming(path, target='error', chunksize=DEFAULT_READ_CHUNKSIZE, holdout=DEFAULT_HOLDOUT,
+                    baseline_fraction=DEFAULT_BASELINE_FRACTION, n_features=DEFAULT_HASH_FEATURES,
+                    finalize=True, random_state=DEFAULT_RANDOM_STATE):
+    features = None
+    streamed = [TrainingResult(name, 'stream', model) for name, model in incremental_models(random_state).items()]
+    baseline = [TrainingResult(name, f"{baseline_fraction:.0%} sample", model)
+                for name, model in incremental_models(random_state).items()] if baseline_fraction else []
+    samples = []
+    sample_rng = np.random.default_rng(random_state + 1)
+    classes = np.array([0, 1])
+
+    for chunk, held_out in labelled_chunks(path, target, chunksize, holdout, random_state):
+        if features is None:
+            features = feature_pipeline(target, n_features).fit(chunk.drop(columns=[target]))
+        train = chunk[~held_out]
+        if baseline:
+            samples.append(train[sample_rng.random(len(train)) < baseline_fraction])
+        if train.empty:
+            continue
+        start = time.perf_counter()
+        X = features.transform(train)
+        featurize_seconds = time.perf_counter() - start
+        y = train[target].to_numpy(dtype=int)
+        for result in streamed:
+            start = time.perf_counter()
+            result.model.partial_fit(X, y, classes=classes)
+            result.seconds += featurize_seconds + time.perf_counter() - start
+            result.rows += len(train)
+
+    if features is None:
+        raise ValueError(f"{path} has no rows with a known {target}")
+    if baseline:
+        sample = pd.concat(samples, ignore_index=True)
+        start = time.perf_counter()
+        X = features.transform(sample)
+        featurize_seconds = time.perf_counter() - start
+        for result in baseline:
+            start = time.perf_counter()
+            result.model.fit(X, sample[target].to_numpy(dtype=int))
+            result.seconds = featurize_seconds + time.perf_counter() - start
+            result.rows = len(sample)
+        del samples, sample, X
+
+    for chunk, held_out in labelled_chunks(path, target, chunksize, holdout, random_state):
+        test = chunk[held_out]
+        if test.empty:
+            continue
+        X = features.transform(test)
+        y = test[target].to_numpy(dtype=int)
+        for result in streamed + baseline:
+            result.metrics.update(y, result.model.predict(X))
+        if finalize:
+            for result in streamed:
+                result.model.partial_fit(X, y, classes=classes)
+    return features, streamed + baseline
+
+# Table of training results
+def format_training_results(results):
+    lines = [f"{'model':<6} {'trained on':<11} {'rows':>10} {'rows/sec':>11} {'accuracy':>9} {'F1':>7}"]
+    lines += [f"{result.name:<6} {result.mode:<11} {result.rows:>10} {result.rows_per_second():>11,.0f} "
+              f"{result.metrics.accuracy():>9.4f} {result.metrics.f1():>7.4f}" for result in results]
+    return '\n'.join(lines)
+
+# Save a streamed model with its feature pipeline, so the trigger service can score rows with it (--model-dir)
+def save_streaming_model(features, model, path):
+    import joblib
+    from sklearn.pipeline import Pipeline
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    joblib.dump(Pipeline([('features', features), ('model', model)]), path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train incremental classifiers on a whole dataset out of core")
+    parser.add_argument('dataset', nargs='?',
+                        default='dataset/system-logs/multiple-system-log-dataset/preprocessed-data/Windows_preprocessed.csv',
+                        help="preprocessed dataset (default: %(default)s)")
+    parser.add_argument('--target', choices=MODEL_TARGETS, default='error')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_READ_CHUNKSIZE, help="rows read at a time")
+    parser.add_argument('--holdout', type=float, default=DEFAULT_HOLDOUT, help="share of the rows held out")
+    parser.add_argument('--baseline-fraction', type=float, default=DEFAULT_BASELINE_FRACTION,
+                        help="share of the rows the in-memory baseline trains on, 0 to skip it")
+    parser.add_argument('--hash-features', type=int, default=DEFAULT_HASH_FEATURES)
+    parser.add_argument('--no-finalize', action='store_true', help="don't learn the held-out rows after scoring them")
+    parser.add_argument('--save-model-dir', default=None,
+                        help=f"save the best streamed model that predicts probabilities, e.g. {DEFAULT_MODEL_DIR}")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    features, results = train_streaming(args.dataset, args.target, args.chunksize, args.holdout,
+                                        args.baseline_fraction, args.hash_features, not args.no_finalize)
+    peak = peak_memory_mb()
+    print(f"{args.dataset}: trained in {time.perf_counter() - start:.1f} s"
+          + (f", peak memory {peak:,.0f} MB" if peak is not None else ""))
+    print(format_training_results(results))
+
+    if args.save_model_dir:
+        system_name = os.path.basename(args.dataset).split('_')[0]
+        candidates = [result for result in results if result.mode == 'stream' and hasattr(result.model, 'predict_proba')]
+        best = max(candidates, key=lambda result: result.metrics.f1())
+        path = model_file(args.save_model_dir, system_name, args.target)
+        save_streaming_model(features, best.model, path)
+        print(f"Saved the {best.name} model to {path}")
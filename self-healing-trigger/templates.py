@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import json
+import os
+import re
+
+# Placeholder of the variable positions of a template
+WILDCARD = '<*>'
+
+# Tokens holding a digit (ids, counters, addresses, times) are treated as parameters up front
+PARAMETER_TOKEN_REGEX = re.compile(r'\d')
+
+# Defaults of the parse tree, as in the Drain paper
+DEFAULT_DEPTH = 4
+DEFAULT_SIMILARITY = 0.4
+DEFAULT_MAX_CHILDREN = 100
+
+# Template table kept next to an extracted dataset, e.g. Mac_extracted.templates.json
+def template_file_for(output_file_name):
+    return f"{os.path.splitext(output_file_name)[0]}.templates.json"
+
+# Replace the tokens that look like parameters by the wildcard
+def mask_tokens(tokens):
+    return [WILDCARD if PARAMETER_TOKEN_REGEX.search(token) else token for token in tokens]
+
+# Online log template miner in the style of Drain (He et al., ICWS 2017)
+class TemplateMiner:
+    """Group token lists into templates with a fixed-depth parse tree.
+
+    Lines are routed by their token count and their first depth - 2 tokens
+    to a small list of templates and join the most similar one, or start a
+    new template when none shares enough tokens. Positions where the lines
+    of a template differ become wildcards and their tokens are returned as
+    the parameters of each line. Template IDs never change once assigned, so
+    the table can be saved and extended by later runs.
+    """
+
+    def __init__(self, depth=DEFAULT_DEPTH, similarity=DEFAULT_SIMILARITY, max_children=DEFAULT_MAX_CHILDREN):
+        self.prefix_depth = max(depth - 2, 0)
+        self.similarity = similarity
+        self.max_children = max_children
+        self.templates = {}
+        self.counts = {}
+        self.tree = {}
+
+    # Leaf list of template ids for a masked token list, created on the way
+    def leaf(self, masked):
+        node = self.tree.setdefault(len(masked), {})
+        for token in masked[:self.prefix_depth]:
+            # Keep the fan-out bounded: once a node is full, new tokens share the wildcard branch
+            if token not in node and len(node) >= self.max_children - 1:
+                token = WILDCARD
+            node = node.setdefault(token, {})
+        return node.setdefault(None, [])
+
+    # Best matching template id in a leaf, or None when none is similar enough
+    def best_match(self, leaf, masked):
+        best_id, best_key = None, None
+        for template_id in leaf:
+            template = self.templates[template_id]
+            same = sum(1 for a, b in zip(template, masked) if a == b and a != WILDCARD)
+            key = (same / len(masked) if masked else 1.0, template.count(WILDCARD))
+            if best_key is None or key > best_key:
+                best_id, best_key = template_id, key
+        if best_key is not None and best_key[0] >= self.similarity:
+            return best_id
+        return None
+
+    # Add a masked token list (or another template) and return its template id
+    def add_masked(self, masked, count=1):
+        leaf = self.leaf(masked)
+        template_id = self.best_match(leaf, masked)
+        if template_id is None:
+            template_id = len(self.templates)
+            self.templates[template_id] = list(masked)
+            self.counts[template_id] = 0
+            leaf.append(template_id)
+        else:
+            self.generalize(template_id, masked)
+        self.counts[template_id] += count
+        return template_id
+
+    # Turn the positions where a template and a token list differ into wildcards
+    def generalize(self, template_id, masked):
+        template = self.templates[template_id]
+        for i, (a, b) in enumerate(zip(template, masked)):
+            if a != b:
+                template[i] = WILDCARD
+
+    # Return (template id, parameters) of one line
+    def add(self, tokens):
+        tokens = list(tokens)
+        template_id = self.add_masked(mask_tokens(tokens))
+        template = self.templates[template_id]
+        return template_id, [token for token, part in zip(tokens, template) if part == WILDCARD]
+
+    # Template ids and parameters of a series of token lists
+    def add_all(self, token_lists):
+        template_ids, parameters = [], []
+        for tokens in token_lists:
+            template_id, params = self.add(tokens)
+            template_ids.append(template_id)
+            parameters.append(params)
+        return template_ids, parameters
+
+    # Template text of an id
+    def template(self, template_id):
+        return ' '.join(self.templates[template_id])
+
+    # Fold the templates of another miner into this one, e.g. a shard that started from the
+    # first `known` templates of this table: those keep their ids, the others are matched like lines
+    # Returns the ids that changed, {other id: id in this miner}
+    def merge(self, other, known=0):
+        id_map = {}
+        for template_id in sorted(other.templates):
+            template, count = other.templates[template_id], other.counts[template_id]
+            if template_id < known:
+                self.generalize(template_id, template)
+                self.counts[template_id] += count
+                continue
+            merged_id = self.add_masked(template, count)
+            if merged_id != template_id:
+                id_map[template_id] = merged_id
+        return id_map
+
+    # Forget the line counts, e.g. in a shard that only reports the lines it added
+    def reset_counts(self):
+        self.counts = dict.fromkeys(self.templates, 0)
+
+    def to_dict(self):
+        return {
+            'depth': self.prefix_depth + 2,
+            'similarity': self.similarity,
+            'max_children': self.max_children,
+            'templates': [{'id': template_id, 'template': self.templates[template_id], 'count': self.counts[template_id]}
+                          for template_id in sorted(self.templates)],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        miner = cls(data['depth'], data['similarity'], data['max_children'])
+        for entry in data['templates']:
+            template_id = entry['id']
+            miner.templates[template_id] = list(entry['template'])
+            miner.counts[template_id] = entry['count']
+            miner.leaf(miner.templates[template_id]).append(template_id)
+        return miner
+
+    # Load a saved template table, or start an empty one
+    @classmethod
+    def load(cls, template_file):
+        if template_file is None or not os.path.exists(template_file):
+            return cls()
+        with open(template_file, 'r', encoding='utf8') as f:
+            return cls.from_dict(json.load(f))
+
+    # Save the template table atomically
+    def save(self, template_file):
+        temp_file = f"{template_file}.tmp"
+        with open(temp_file, 'w', encoding='utf8') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(temp_file, template_file)
@@ -0,0 +1,5 @@
+# The modules of the trigger live next to its scripts rather than in a package
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,74 @@
+import os
+import pandas as pd
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+
+from dataset_follow import iter_appended_rows, iter_parquet_rows, skip_appended_rows
+
+
+# A parquet dataset of num_rows numbered rows, in row groups of row_group_size
+def write_rows(path, num_rows, row_group_size=1000):
+    df = pd.DataFrame({'error': [i % 2 for i in range(num_rows)], 'warning': [0] * num_rows,
+                       'row': range(num_rows)})
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), path,
+                   row_group_size=row_group_size)
+
+
+# The same rows as a CSV file when the path says so, written by appending to what is already there
+def write_dataset(path, num_rows):
+    if path.endswith('.parquet'):
+        write_rows(path, num_rows)
+        return
+    df = pd.DataFrame({'error': [i % 2 for i in range(num_rows)], 'warning': [0] * num_rows,
+                       'row': range(num_rows)})
+    if os.path.exists(path):
+        df.iloc[len(pd.read_csv(path)):].to_csv(path, mode='a', header=False, index=False)
+    else:
+        df.to_csv(path, index=False)
+
+
+def test_skip_inside_a_multi_batch_row_group(tmp_path):
+    path = str(tmp_path / 'Linux_preprocessed.parquet')
+    write_rows(path, 1000)
+    chunks = list(iter_parquet_rows(path, 350, None, 100))
+    assert all(len(chunk) for chunk in chunks)
+    assert pd.concat(chunks)['row'].tolist() == list(range(350, 1000))
+
+
+def test_rows_appended_to_a_rewritten_file_are_counted_once(tmp_path):
+    path = str(tmp_path / 'Linux_preprocessed.parquet')
+    checkpoints = {}
+    write_rows(path, 350)
+    assert sum(len(chunk) for chunk in iter_appended_rows(path, checkpoints, chunksize=100)) == 350
+    write_rows(path, 1000)
+    chunks = list(iter_appended_rows(path, checkpoints, chunksize=100))
+    assert pd.concat(chunks)['row'].tolist() == list(range(350, 1000))
+    assert checkpoints[path]['rows'] == 1000
+
+
+@pytest.mark.parametrize('extension', ['csv', 'parquet'])
+def test_skipped_rows_are_not_read_again(tmp_path, extension):
+    path = str(tmp_path / f'Linux_preprocessed.{extension}')
+    checkpoints = {}
+    write_dataset(path, 350)
+    skip_appended_rows(path, checkpoints)
+    assert checkpoints[path]['rows'] == 350
+    write_dataset(path, 1000)
+    chunks = list(iter_appended_rows(path, checkpoints, chunksize=100))
+    assert pd.concat(chunks)['row'].tolist() == list(range(350, 1000))
+    assert checkpoints[path]['rows'] == 1000
+
+
+@pytest.mark.parametrize('extension', ['csv', 'parquet'])
+def test_a_replaced_dataset_is_reported_before_it_is_read_again(tmp_path, extension):
+    path = str(tmp_path / f'Linux_preprocessed.{extension}')
+    checkpoints, resets = {}, []
+    write_dataset(path, 350)
+    assert sum(len(chunk) for chunk in iter_appended_rows(path, checkpoints, on_reset=lambda: resets.append(path))) == 350
+    assert not resets
+    os.remove(path)
+    write_dataset(path, 100)
+    assert sum(len(chunk) for chunk in iter_appended_rows(path, checkpoints, on_reset=lambda: resets.append(path))) == 100
+    assert resets == [path]
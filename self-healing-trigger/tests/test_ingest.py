@@ -0,0 +1,20 @@
+import pytest
+
+pytest.importorskip('prometheus_client')
+
+from ingest import MicroBatcher
+
+
+def test_a_request_is_queued_for_all_of_its_systems_or_none():
+    batcher = MicroBatcher(lambda *counts: None, max_pending_lines=10)
+    assert batcher.submit({'Mac': ['line'] * 4})
+    assert not batcher.submit({'Windows': ['line'] * 3, 'Linux': ['line'] * 4})
+    assert batcher.num_pending == 4
+    assert set(batcher.batches) <= {'Mac'}
+    assert batcher.join(10)
+
+
+def test_a_request_larger_than_the_queue_never_fits():
+    batcher = MicroBatcher(lambda *counts: None, max_pending_lines=10)
+    assert batcher.fits(10)
+    assert not batcher.fits(11)
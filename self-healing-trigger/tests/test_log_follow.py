@@ -0,0 +1,30 @@
+import os
+
+from log_follow import iter_appended_chunks
+
+
+# Marker-format lines of a Windows-style log, numbered in their message
+def log_lines(first, last):
+    return ''.join(f"2016-09-28 04:{i:02d}:00, Info  CBS  line {i} ERROR\n" for i in range(first, last))
+
+
+def read_appended(log_file, checkpoints):
+    return [line for chunk in iter_appended_chunks(log_file, checkpoints, year=2016)
+            for line in chunk['tokens'].map(lambda tokens: int(tokens[tokens.index('line') + 1]))]
+
+
+def test_lines_written_before_a_rotation_are_read_from_the_rotated_segment(tmp_path):
+    log_file = str(tmp_path / 'Windows.log')
+    checkpoints = {}
+    with open(log_file, 'w') as f:
+        f.write(log_lines(0, 3))
+    assert read_appended(log_file, checkpoints) == [0, 1, 2]
+
+    # Lines appended after the checkpoint, then the log is rotated by renaming and a new one started
+    with open(log_file, 'a') as f:
+        f.write(log_lines(3, 5))
+    os.rename(log_file, f"{log_file}.1")
+    with open(log_file, 'w') as f:
+        f.write(log_lines(5, 7))
+    assert read_appended(log_file, checkpoints) == [3, 4, 5, 6]
+    assert read_appended(log_file, checkpoints) == []
@@ -0,0 +1,10 @@
+from rate_limit import RemediationLimiter
+
+
+def test_a_refunded_run_does_not_start_a_cooldown(tmp_path):
+    limiter = RemediationLimiter(str(tmp_path / 'state.json'), cooldown_seconds=900, bucket_capacity=1)
+    assert limiter.acquire('Mac', 'remedial_actions_mac', now=1000) is None
+    limiter.refund('Mac', 'remedial_actions_mac')
+    assert limiter.acquire('Mac', 'remedial_actions_mac', now=1001) is None
+    assert limiter.acquire('Mac', 'remedial_actions_mac', now=1002) == 'cooldown'
+    assert RemediationLimiter(str(tmp_path / 'state.json')).state == limiter.state
@@ -0,0 +1,33 @@
+import random
+import re
+
+from severity import SEVERITY_LEVELS, SeverityMatcher
+
+# Fragments that build messages around the edges of the severity table: keywords and their prefixes, case
+# variants, word boundaries and non-ASCII characters whose upper or lower case changes length
+FRAGMENTS = ['é', 'ß', 'ı', 'alert ', 'ALERT ', 'ALERT', 'alert', 'Alert', 'aLeRt', 'NOTIC', 'EMERG', 'E', 'x',
+             'ERR', 'WARN', 'ING', ' ', 'CRIT', 'PANIC', 'INFO', 'DEBUG', 'FAILED', ':', '-', 'ICAL', 'RMATIONAL',
+             'noticemerg']
+
+
+# The per-pattern loop the matcher replaced: the first pattern found decides, and an exact ALERT token warns
+def classify_with_loop(message):
+    error = warning = 0
+    for pattern, label in SEVERITY_LEVELS.items():
+        if re.search(pattern, message, re.IGNORECASE):
+            if label in ['error', 'emergency', 'critical']:
+                error = 1
+            elif label in ('warning', 'alert'):
+                warning = 1
+            break
+    if 'ALERT' in message.split():
+        warning = 1
+    return error, warning
+
+
+def test_matcher_flags_random_messages_like_the_pattern_loop():
+    matcher = SeverityMatcher()
+    generator = random.Random(3)
+    for _ in range(300000):
+        message = ''.join(generator.choice(FRAGMENTS) for _ in range(generator.randint(0, 8)))
+        assert matcher.classify(message) == classify_with_loop(message), message
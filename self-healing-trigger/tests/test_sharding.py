@@ -0,0 +1,22 @@
+import pytest
+
+pytest.importorskip('prometheus_client')
+
+from sharding import CoordinationBackend, SQLiteBackend
+
+
+def test_a_backend_missing_a_method_fails_when_it_is_created():
+    class HeartbeatOnlyBackend(CoordinationBackend):
+        def heartbeat(self, replica_id, now):
+            pass
+
+    with pytest.raises(TypeError):
+        HeartbeatOnlyBackend()
+
+
+def test_the_sqlite_backend_implements_every_method(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'shards.sqlite'))
+    backend.heartbeat('replica-1', 100)
+    assert backend.live_replicas(110, 30) == ['replica-1']
+    assert backend.claim('remediation/Mac', 'replica-1', 110, 900)
+    assert not backend.claim('remediation/Mac', 'replica-2', 120, 900)
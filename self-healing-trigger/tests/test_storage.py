@@ -0,0 +1,13 @@
+import pandas as pd
+
+from storage import matching_columns, read_dataset
+
+
+def test_columns_are_matched_whatever_the_case_of_their_headers(tmp_path):
+    path = str(tmp_path / 'Mac_preprocessed.csv')
+    pd.DataFrame({'Timestamp': ['2023-01-01'], 'Error': [1], 'WARNING': [0]}).to_csv(path, index=False)
+    columns = matching_columns(path, ['error', 'warning', 'epoch'])
+    assert columns == ['Error', 'WARNING']
+    df = read_dataset(path, columns=columns)
+    df.columns = df.columns.str.lower()
+    assert df[['error', 'warning']].values.tolist() == [[1, 0]]
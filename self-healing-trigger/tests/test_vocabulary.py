@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('sklearn')
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+from extraction import extract_log_file
+from sparse_training import normalize_tokens
+from storage import read_dataset
+from vocabulary import load_token_index, tfidf_features
+
+# Messages whose tokens differ only once normalized: case, attached punctuation, quotes, backslashes,
+# one-letter words and non-ASCII words
+LOG_LINES = [
+    "2016-09-28 04:00:00, Info  CBS  ERROR: Failed to open C:\\Windows\\logs it's gone",
+    "2016-09-28 04:01:03, Info  CBS  error ERROR failed-to-open a b_c WARNING",
+    "2016-09-28 04:02:06, Info  CBS  WARNING \"quoted\" Straße straße 0x1F (pid=42)",
+    "2016-09-28 04:03:09, Info  CBS  ERROR",
+]
+
+
+def test_tfidf_from_token_ids_matches_vectorized_tokens(tmp_path):
+    log_file = tmp_path / 'Windows.log'
+    log_file.write_text('\n'.join(LOG_LINES) + '\n', encoding='utf8')
+    output_file = str(tmp_path / 'Windows_extracted.csv')
+    extract_log_file(str(log_file), output_file, log_format='marker', year=2016, index_tokens=True)
+
+    from_ids = tfidf_features(*load_token_index(output_file))
+    from_text = TfidfVectorizer().fit_transform(read_dataset(output_file, columns=['tokens'])['tokens']
+                                                .map(normalize_tokens))
+    assert from_ids.shape == from_text.shape
+    assert np.allclose(from_ids.toarray(), from_text.toarray())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import pandas as pd
+import re
+from datetime import datetime
+
+# The three timestamp layouts found in the logs: (strptime format, full-match regex, carries a year)
+TIMESTAMP_FORMATS = {
+    'iso': ('%Y-%m-%d %H:%M:%S', re.compile(r'\d{4}-\d{2}-\d{2}\s\d{2}:\d{2}:\d{2}'), True),
+    'syslog': ('%b %d %H:%M:%S', re.compile(r'\w{3}\s+\d{1,2}\s\d{2}:\d{2}:\d{2}'), False),
+    'android': ('%m-%d %H:%M:%S.%f', re.compile(r'\d{2}-\d{2}\s\d{2}:\d{2}:\d{2}\.\d{3}'), False),
+}
+
+# Number of values looked at when detecting the format of a source
+DETECTION_SAMPLE_SIZE = 100
+
+# Second-resolution strings remembered by a parser before its cache is reset
+MAX_CACHE_SIZE = 1000000
+
+# Detect which of the known formats a series of timestamp strings uses, or None
+def detect_timestamp_format(timestamps):
+    sample = timestamps.dropna().astype(str).head(DETECTION_SAMPLE_SIZE)
+    counts = {name: sum(1 for value in sample if regex.fullmatch(value))
+              for name, (_, regex, _) in TIMESTAMP_FORMATS.items()}
+    best = max(counts, key=counts.get)
+    return best if counts[best] else None
+
+# Timestamp normalization: explicit-format, vectorized parsing to epoch seconds with a per-second cache
+class TimestampParser:
+    """Parse the timestamps of one source into epoch seconds.
+
+    The format is detected once from the first values and then applied
+    explicitly. Logs are bursty, so the second-resolution part of each value
+    is parsed once and remembered; milliseconds are added back arithmetically.
+    Syslog and Android timestamps carry no year, so `year` (default: the
+    current year) is assumed for them. Naive times are treated as UTC.
+    """
+
+    def __init__(self, year=None, timestamp_format=None):
+        self.year = datetime.now().year if year is None else year
+        self.timestamp_format = timestamp_format
+        self.cache = {}
+
+    # Parse distinct second-resolution strings of one format into epoch seconds
+    def parse_seconds(self, values, timestamp_format):
+        strptime_format, _, has_year = TIMESTAMP_FORMATS[timestamp_format]
+        strptime_format = strptime_format.replace('.%f', '')
+        index = pd.Index(values, dtype=object)
+        if not has_year:
+            index, strptime_format = f"{self.year} " + index.astype(str), f"%Y {strptime_format}"
+        parsed = pd.to_datetime(index, format=strptime_format, errors='coerce')
+        return (parsed - pd.Timestamp(0)) / pd.Timedelta(seconds=1)
+
+    # Epoch seconds of timestamps in one format, NaN where they don't match it
+    def epochs_in_format(self, timestamps, timestamp_format):
+        if timestamp_format == 'android':
+            seconds, millis = timestamps.str[:-4], pd.to_numeric(timestamps.str[-3:], errors='coerce') / 1000
+        else:
+            seconds, millis = timestamps, 0.0
+
+        cache = self.cache.setdefault(timestamp_format, {})
+        missing = [value for value in seconds.dropna().unique() if value not in cache]
+        if missing:
+            if len(cache) + len(missing) > MAX_CACHE_SIZE:
+                cache.clear()
+            cache.update(zip(missing, self.parse_seconds(missing, timestamp_format)))
+        return seconds.map(cache).astype('float64') + millis
+
+    # Epoch seconds (float64, NaN when unparseable) of a series of timestamp strings
+    def epochs(self, timestamps):
+        timestamps = timestamps.astype(object).where(timestamps.notna())
+        if self.timestamp_format is None:
+            self.timestamp_format = detect_timestamp_format(timestamps)
+        if self.timestamp_format is None:
+            return pd.Series(float('nan'), index=timestamps.index)
+
+        epochs = self.epochs_in_format(timestamps, self.timestamp_format)
+
+        # Values in another layout than the one detected are rare, parse them separately
+        leftover = epochs.isna() & timestamps.notna()
+        for timestamp_format in TIMESTAMP_FORMATS:
+            if not leftover.any():
+                break
+            if timestamp_format != self.timestamp_format:
+                epochs[leftover] = self.epochs_in_format(timestamps[leftover], timestamp_format).to_numpy()
+                leftover = epochs.isna() & timestamps.notna()
+        return epochs
+
+    # Timestamps as datetime64 values
+    def datetimes(self, timestamps):
+        return epochs_to_datetimes(self.epochs(timestamps))
+
+# Convert epoch seconds to datetime64 values
+def epochs_to_datetimes(epochs):
+    return pd.to_datetime((epochs * 1000).round(), unit='ms').astype('datetime64[us]')
+
+# Parse a series of timestamp strings from one source into datetime64 values
+def parse_timestamps(timestamps, year=None):
+    return TimestampParser(year).datetimes(timestamps)
+
+# Datetimes of a dataset, taken from the stored epoch column when there is one
+def dataset_datetimes(df, year=None):
+    if 'epoch' in df:
+        return epochs_to_datetimes(df['epoch'])
+    return parse_timestamps(df['timestamp'], year)
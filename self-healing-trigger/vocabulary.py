@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import json
+from array import array
+import numpy as np
+import os
+
+# Sidecar files of a dataset's token index, e.g. Mac_extracted.tokens.npz and Mac_extracted.vocabulary.json
+def token_index_files(output_file_name):
+    base = os.path.splitext(output_file_name)[0]
+    return f"{base}.tokens.npz", f"{base}.vocabulary.json"
+
+# Interned token vocabulary: every distinct token is stored once and referred to by an int32 id
+class TokenVocabulary:
+    def __init__(self, tokens=()):
+        self.tokens = []
+        self.ids = {}
+        for token in tokens:
+            self.id(token)
+
+    def __len__(self):
+        return len(self.tokens)
+
+    # Id of a token, added to the vocabulary when it is new
+    def id(self, token):
+        token_id = self.ids.get(token)
+        if token_id is None:
+            token_id = self.ids[token] = len(self.tokens)
+            self.tokens.append(token)
+        return token_id
+
+    # Encode the whitespace-separated tokens of a series of texts into CSR token arrays. Ids go straight into
+    # flat int buffers, so no token list outlives the text it was split from. When token_strings is given, the
+    # string form of each text's token list, as stored in CSV files, is appended to it from the same split
+    def encode_texts(self, texts, token_strings=None):
+        ids, add = self.ids, self.id
+        indices, ends = array('i'), array('q', [0])
+        for text in texts:
+            tokens = text.split()
+            indices.extend([ids[token] if token in ids else add(token) for token in tokens])
+            ends.append(len(indices))
+            if token_strings is not None:
+                token_strings.append(str(tokens))
+        return TokenArrays(np.frombuffer(ends, dtype=np.int64).copy(), np.frombuffer(indices, dtype=np.int32).copy())
+
+    # Ids in this vocabulary of every token of another one, as a lookup array
+    def mapping(self, other):
+        return np.fromiter((self.id(token) for token in other.tokens), dtype=np.int32, count=len(other))
+
+    # Load a saved vocabulary, or start an empty one
+    @classmethod
+    def load(cls, vocabulary_file):
+        if vocabulary_file is None or not os.path.exists(vocabulary_file):
+            return cls()
+        with open(vocabulary_file, 'r', encoding='utf8') as f:
+            return cls(json.load(f))
+
+    # Save the vocabulary atomically; a token's id is its position in the list
+    def save(self, vocabulary_file):
+        temp_file = f"{vocabulary_file}.tmp"
+        with open(temp_file, 'w', encoding='utf8') as f:
+            json.dump(self.tokens, f)
+        os.replace(temp_file, vocabulary_file)
+
+# Token ids of many rows in two flat arrays (CSR layout):
+# the ids of row i are indices[indptr[i]:indptr[i + 1]]
+class TokenArrays:
+    def __init__(self, indptr=None, indices=None):
+        self.indptr = np.zeros(1, dtype=np.int64) if indptr is None else indptr
+        self.indices = np.zeros(0, dtype=np.int32) if indices is None else indices
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    # Token ids of one row
+    def row(self, i):
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    # Tokens of one row as strings
+    def decode(self, vocabulary, i):
+        return [vocabulary.tokens[token_id] for token_id in self.row(i)]
+
+    # Same rows with every id replaced through a lookup array
+    def remap(self, mapping):
+        return TokenArrays(self.indptr, mapping[self.indices])
+
+    # Rows of several arrays one after the other
+    @classmethod
+    def concatenate(cls, parts):
+        parts = list(parts)
+        if not parts:
+            return cls()
+        offsets = np.cumsum([0] + [len(part.indices) for part in parts[:-1]])
+        indptr = np.concatenate([parts[0].indptr[:1]] + [part.indptr[1:] + offset
+                                                         for part, offset in zip(parts, offsets)])
+        return cls(indptr, np.concatenate([part.indices for part in parts]))
+
+    # Sparse (rows x vocabulary) matrix of token counts, ready for e.g. sklearn's TfidfTransformer
+    def count_matrix(self, num_tokens):
+        from scipy.sparse import csr_matrix
+        data = np.ones(len(self.indices), dtype=np.float64)
+        matrix = csr_matrix((data, self.indices, self.indptr), shape=(len(self), num_tokens))
+        matrix.sum_duplicates()
+        return matrix
+
+    @classmethod
+    def load(cls, tokens_file):
+        with np.load(tokens_file) as arrays:
+            return cls(arrays['indptr'], arrays['indices'])
+
+    def save(self, tokens_file):
+        # np.savez adds .npz to names without it, so write to a temporary name that has it
+        temp_file = f"{tokens_file}.tmp.npz"
+        np.savez(temp_file, indptr=self.indptr, indices=self.indices)
+        os.replace(temp_file, tokens_file)
+
+# Token arrays and vocabulary saved alongside a dataset
+def load_token_index(output_file_name):
+    tokens_file, vocabulary_file = token_index_files(output_file_name)
+    return TokenArrays.load(tokens_file), TokenVocabulary.load(vocabulary_file)
+
+# Token indexes of several datasets in one vocabulary, their rows one after the other; None unless every
+# dataset has an index with exactly its number of rows (rows appended by --follow are not covered)
+def merged_token_index(output_file_names, row_counts):
+    vocabulary, parts = TokenVocabulary(), []
+    for output_file_name, num_rows in zip(output_file_names, row_counts):
+        if not os.path.exists(token_index_files(output_file_name)[0]):
+            return None
+        token_arrays, dataset_vocabulary = load_token_index(output_file_name)
+        if len(token_arrays) != num_rows:
+            return None
+        parts.append(token_arrays.remap(vocabulary.mapping(dataset_vocabulary)))
+    return TokenArrays.concatenate(parts), vocabulary
+
+# Save the token arrays and vocabulary of a dataset next to it
+def save_token_index(output_file_name, token_arrays, vocabulary):
+    tokens_file, vocabulary_file = token_index_files(output_file_name)
+    token_arrays.save(tokens_file)
+    vocabulary.save(vocabulary_file)
+
+# Sparse (vocabulary x terms) matrix of how often each term occurs in each token, and the sorted terms.
+# Terms are the words TfidfVectorizer finds in a row's token list once normalized (sparse_training.normalize_tokens);
+# tokens are quoted and separated by non-word characters in that text, so a row's terms are those of its tokens
+def term_matrix(vocabulary):
+    from scipy.sparse import csr_matrix
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sparse_training import normalize_tokens
+    analyze = TfidfVectorizer().build_analyzer()
+    token_terms = [analyze(normalize_tokens(repr(token))) for token in vocabulary.tokens]
+    terms = sorted({term for terms in token_terms for term in terms})
+    term_ids = {term: i for i, term in enumerate(terms)}
+    indptr = np.cumsum([0] + [len(terms) for terms in token_terms], dtype=np.int64)
+    indices = np.fromiter((term_ids[term] for terms in token_terms for term in terms), dtype=np.int32,
+                          count=int(indptr[-1]))
+    matrix = csr_matrix((np.ones(len(indices)), indices, indptr), shape=(len(vocabulary), len(terms)))
+    matrix.sum_duplicates()
+    return matrix, terms
+
+# TF-IDF features computed from the token ids, without rebuilding any strings. They are the features
+# TfidfVectorizer builds from the normalized token column: the token counts are mapped onto the terms first
+def tfidf_features(token_arrays, vocabulary):
+    from sklearn.feature_extraction.text import TfidfTransformer
+    terms, _ = term_matrix(vocabulary)
+    return TfidfTransformer().fit_transform(token_arrays.count_matrix(len(vocabulary)) @ terms)
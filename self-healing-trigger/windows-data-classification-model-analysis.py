@@ -4,19 +4,23 @@
 # In[1]:
 
 
-import pandas as pd
-from pycaret.classification import setup, compare_models, finalize_model, predict_model, pull
+import os
+from inference import DEFAULT_MODEL_DIR, MODEL_INPUT_COLUMNS, model_name
+from storage import read_dataset
+from pycaret.classification import setup, compare_models, finalize_model, predict_model, pull, save_model
 import gc
 
 # Function to free up memory
 def free_memory():
     gc.collect()
 
-# Load Windows dataset
+# Load Windows dataset: only the columns the trigger service has in every mode, so the saved model can score
+# rows from daemon mode and /ingest too
 file_path = 'dataset/system-logs/multiple-system-log-dataset/preprocessed-data/Windows_preprocessed.csv'
-df = pd.read_csv(file_path)
+df = read_dataset(file_path, columns=list(MODEL_INPUT_COLUMNS))
 
 # Reduce the dataset size significantly for faster processing (if necessary)
+# To train on all of it instead, out of core: python3 streaming_training.py (see the README)
 df = df.sample(frac=0.05, random_state=42)  # Use 5% of the data
 
 # Check class distribution
@@ -43,6 +47,11 @@ for model in best_models:
         # Finalize the model
         final_model = finalize_model(model)
 
+        # Persist the best of them, so the trigger service can score rows with it (--model-dir models)
+        if model is best_models[0]:
+            os.makedirs(DEFAULT_MODEL_DIR, exist_ok=True)
+            save_model(final_model, model_name(DEFAULT_MODEL_DIR, 'Windows', 'error'))
+
         # Free memory before making predictions
         free_memory()
 